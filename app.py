@@ -1,21 +1,15 @@
-from flask_migrate import Migrate
-from stockapp import create_app, db
-from stockapp.models import StockItem
-from sqlalchemy import text
+"""
+Development entry point (`python app.py`) and the app `flask` loads.
+
+Importing this module only builds the app: it opens no database
+connection and does not import Flask-Migrate. `flask db ...` loads the
+migrations on use (see stockapp/commands.py), and database connectivity
+is reported by the /readyz probe. Under gunicorn --preload use wsgi.py.
+"""
+from stockapp import create_app
 
 # Create the Flask app
 app = create_app()
 
-# Initialize Flask-Migrate
-migrate = Migrate(app, db)
-
-# Optional: quick connection test
-with app.app_context():
-    try:
-        db.session.execute(text("SELECT 1"))
-        print("✅ Database connected successfully!")
-    except Exception as e:
-        print("❌ Database connection failed:", e)
-
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,14 @@
+"""
+ASGI entry point: the read API on an async database driver.
+
+    uvicorn asgi:app --workers 2
+
+/api/inventory, /api/item/<id> and /api/dashboard-metrics run natively
+async (see stockapp/async_api.py); every other route is served by the
+same Flask app as app.py. Needs an ASGI server and the async driver for
+the database (e.g. `pip install uvicorn aiomysql`).
+"""
+from stockapp import create_app
+from stockapp.async_api import create_asgi_app
+
+app = create_asgi_app(create_app())
@@ -0,0 +1,381 @@
+"""
+Benchmark / load-test harness for the stock API.
+
+Seeds a reproducible dataset (randomDataGenerator.generate_items with a
+seed), drives each endpoint at a given concurrency and prints - or writes
+with --output - a JSON report of latency percentiles and throughput per
+scenario. --baseline compares against an earlier report and exits 1 when
+a scenario's p95 latency or throughput regressed by more than --tolerance.
+
+    python benchmark.py --rows 10000 --concurrency 8 --output run.json
+    python benchmark.py --rows 100000 --scenarios inventory_search,metrics
+    python benchmark.py --target http://127.0.0.1:5000 --rows 10000
+    python benchmark.py --output new.json --baseline run.json --tolerance 0.2
+
+The default target is the Flask test client on a fresh SQLite file
+(--db), seeded in-process through the bulk importer; with --target URL
+the rows are POSTed to /api/add of a running server instead. Latencies
+are measured client-side and include the test client's own overhead.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from randomDataGenerator import generate_item, generate_items
+
+SCENARIOS = (
+    "add_single", "add_bulk", "inventory_page", "inventory_cursor", "inventory_search",
+    "inventory_filter", "metrics", "get_item", "update", "delete",
+)
+# Rows per POST /api/add while seeding a server target
+SEED_BATCH = 1000
+
+
+# -------------------------------
+# Transports: request(method, path, body) -> (status, response bytes)
+# -------------------------------
+class TestClientTransport:
+    """In-process Flask test client; one client per worker thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HTTPTransport:
+    """Keep-alive HTTP connection per worker thread to a running server."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+# -------------------------------
+# Dataset
+# -------------------------------
+def make_test_app(db_path, cache):
+    """Flask app on a SQLite file, configured before create_app() reads Config."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(db_path)}"
+    os.environ["CACHE_ENABLED"] = "1" if cache else "0"
+    import config
+
+    config.Config.SQLALCHEMY_DATABASE_URI = os.environ["DATABASE_URL"]
+    config.Config.CACHE_ENABLED = cache
+    # one process: its memory backend sees every invalidation
+    config.Config.CACHE_BACKEND = "memory" if cache else ""
+    # concurrent writers wait for SQLite's lock instead of failing at once
+    config.Config.SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 60}}
+
+    from stockapp import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all(bind_key=None)
+    return app
+
+
+def seed_in_process(app, rows, seed):
+    from stockapp import bulk
+
+    with app.app_context():
+        importer = bulk.BulkImporter(chunk_size=app.config.get("BULK_CHUNK_SIZE", 1000))
+        importer.run(generate_items(rows, seed=seed))
+        return importer.counts["inserted"]
+
+
+def seed_over_http(transport, rows, seed, concurrency):
+    items = generate_items(rows, seed=seed)
+
+    def batches():
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == SEED_BATCH:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def send(batch):
+        status, body = transport.request("POST", "/api/add", batch)
+        return json.loads(body).get("inserted", 0) if status in (200, 201) else 0
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return sum(pool.map(send, batches()))
+
+
+# -------------------------------
+# Scenarios: each returns a callable(rng) -> (method, path, body)
+# -------------------------------
+class Workload:
+    """Request builders for every scenario, over ids 1..rows of the seeded data."""
+
+    def __init__(self, rows, seed):
+        self.rows = rows
+        self._next_code = rows
+        self._delete_ids = list(range(1, rows + 1))
+        random.Random(seed).shuffle(self._delete_ids)
+        self._lock = threading.Lock()
+
+    def _new_index(self):
+        with self._lock:
+            self._next_code += 1
+            return self._next_code
+
+    def _random_id(self, rng):
+        return rng.randint(1, self.rows)
+
+    def add_single(self, rng):
+        return "POST", "/api/add", generate_item(self._new_index(), rng)
+
+    def add_bulk(self, rng):
+        return "POST", "/api/add", [generate_item(self._new_index(), rng) for _ in range(100)]
+
+    def inventory_page(self, rng):
+        pages = max(1, min(self.rows // 50, 200))
+        return "GET", f"/api/inventory?page={rng.randint(1, pages)}&limit=50", None
+
+    def inventory_cursor(self, rng):
+        return "GET", "/api/inventory?cursor=&limit=50", None
+
+    def inventory_search(self, rng):
+        term = f"{chr(65 + rng.randrange(26))}{rng.randint(1, 99)}"
+        return "GET", f"/api/inventory?search={term}&limit=50", None
+
+    def inventory_filter(self, rng):
+        status = rng.choice(["normal", "low", "critical"])
+        return "GET", f"/api/inventory?status={status}&inward_qty_min={rng.randint(20, 400)}&limit=50", None
+
+    def metrics(self, rng):
+        return "GET", "/api/dashboard-metrics", None
+
+    def get_item(self, rng):
+        return "GET", f"/api/item/{self._random_id(rng)}", None
+
+    def update(self, rng):
+        return "PUT", f"/api/update/{self._random_id(rng)}", {"outward_qty": rng.randint(0, 19)}
+
+    def delete(self, rng):
+        with self._lock:
+            item_id = self._delete_ids.pop() if self._delete_ids else self._random_id(rng)
+        return "DELETE", f"/api/delete/{item_id}", None
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def run_scenario(transport, build, requests, concurrency, seed, warmup):
+    """Fire `requests` requests from `concurrency` threads; return the stats dict."""
+    latencies, statuses, errors = [], {}, 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(worker_id):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + worker_id)
+        for _ in range(warmup):
+            try:
+                transport.request(*build(rng))
+            except Exception:
+                pass
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            method, path, body = build(rng)
+            started = time.perf_counter()
+            try:
+                status, _ = transport.request(method, path, body)
+            except Exception:
+                status = "exception"
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status == "exception" or status >= 400:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": statuses,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "latency_ms": {
+            "p50": _ms(percentile(latencies, 0.50)),
+            "p95": _ms(percentile(latencies, 0.95)),
+            "p99": _ms(percentile(latencies, 0.99)),
+            "mean": _ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": _ms(latencies[-1] if latencies else None),
+        },
+    }
+
+
+# -------------------------------
+# Reporting
+# -------------------------------
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Scenarios whose p95 grew or throughput shrank by more than `tolerance`."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        old_p95, new_p95 = previous["latency_ms"]["p95"], current["latency_ms"]["p95"]
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1 + tolerance):
+            regressions.append(f"{name}: p95 {old_p95} ms -> {new_p95} ms")
+        old_rps, new_rps = previous["throughput_rps"], current["throughput_rps"]
+        if old_rps and new_rps < old_rps * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old_rps} -> {new_rps} req/s")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="dataset size (10k .. 10M)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--target", default="testclient", help="'testclient' or a server URL")
+    parser.add_argument("--db", default=None, help="SQLite file for the test client (default: a temp file)")
+    parser.add_argument("--reuse-db", action="store_true", help="skip seeding if --db already holds data")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache (test client)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per worker")
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    started = time.perf_counter()
+    if args.target == "testclient":
+        db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="stockapp-bench-"), "bench.db")
+        reuse = args.reuse_db and os.path.exists(db_path)
+        if not reuse and os.path.exists(db_path):
+            os.remove(db_path)
+        app = make_test_app(db_path, cache=not args.no_cache)
+        transport = TestClientTransport(app)
+        seeded = 0 if reuse else seed_in_process(app, args.rows, args.seed)
+    else:
+        transport = HTTPTransport(args.target)
+        seeded = seed_over_http(transport, args.rows, args.seed, args.concurrency)
+    seed_seconds = time.perf_counter() - started
+    print(f"Seeded {seeded} rows in {seed_seconds:.1f}s", file=sys.stderr)
+
+    workload = Workload(args.rows, args.seed)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "target": args.target,
+            "rows": args.rows,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "cache": not args.no_cache,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "seed": {
+            "rows": seeded,
+            "seconds": round(seed_seconds, 3),
+            "rows_per_second": round(seeded / seed_seconds, 1) if seed_seconds and seeded else None,
+        },
+        "scenarios": {},
+    }
+    for name in scenarios:
+        stats = run_scenario(
+            transport, getattr(workload, name), args.requests, args.concurrency, args.seed, args.warmup
+        )
+        report["scenarios"][name] = stats
+        print(
+            f"{name:<18} {stats['throughput_rps']:>9} req/s  p50 {stats['latency_ms']['p50']} ms  "
+            f"p95 {stats['latency_ms']['p95']} ms  p99 {stats['latency_ms']['p99']} ms  errors {stats['errors']}",
+            file=sys.stderr,
+        )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(report, json.load(handle), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
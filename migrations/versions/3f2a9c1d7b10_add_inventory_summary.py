@@ -0,0 +1,33 @@
+"""add inventory_summary table for dashboard metrics
+
+Revision ID: 3f2a9c1d7b10
+Revises: 
+Create Date: 2026-10-17 09:12:04.118503
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'inventory_summary',
+        sa.Column('slot', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('total_items', sa.Integer(), nullable=False),
+        sa.Column('normal_stock', sa.Integer(), nullable=False),
+        sa.Column('low_stock', sa.Integer(), nullable=False),
+        sa.Column('critical_stock', sa.Integer(), nullable=False),
+        sa.Column('total_value', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('slot')
+    )
+
+
+def downgrade():
+    op.drop_table('inventory_summary')
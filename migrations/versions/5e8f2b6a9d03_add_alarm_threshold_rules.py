@@ -0,0 +1,46 @@
+"""add alarm_thresholds rules and stock_items.category
+
+Revision ID: 5e8f2b6a9d03
+Revises: c7d3e91a4f26
+Create Date: 2026-10-17 12:41:09.730264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8f2b6a9d03'
+down_revision = 'c7d3e91a4f26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'alarm_thresholds',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(length=20), nullable=False),
+        sa.Column('match_value', sa.String(length=100), nullable=True),
+        sa.Column('critical_ratio', sa.Float(), nullable=True),
+        sa.Column('low_ratio', sa.Float(), nullable=True),
+        sa.Column('critical_qty', sa.Float(), nullable=True),
+        sa.Column('low_qty', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('scope', 'match_value', name='uq_alarm_threshold_scope')
+    )
+
+    with op.batch_alter_table('stock_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('category', sa.String(length=50), nullable=True))
+        batch_op.create_index(batch_op.f('ix_stock_items_category'), ['category'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stock_items_uom'), ['uom'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_items_uom'))
+        batch_op.drop_index(batch_op.f('ix_stock_items_category'))
+        batch_op.drop_column('category')
+
+    op.drop_table('alarm_thresholds')
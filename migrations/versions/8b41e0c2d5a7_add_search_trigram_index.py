@@ -0,0 +1,79 @@
+"""add stock_search_trigrams inverted index
+
+Revision ID: 8b41e0c2d5a7
+Revises: 3f2a9c1d7b10
+Create Date: 2026-10-17 10:03:51.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41e0c2d5a7'
+down_revision = '3f2a9c1d7b10'
+branch_labels = None
+depends_on = None
+
+# Same columns and grams as stockapp/search.py at this revision
+SEARCH_COLUMNS = (
+    'item_code', 'item_description', 'inward_invoice_no', 'uom', 'alarm_status',
+    'outward_invoice_no', 'eway_bill_number', 'vehicle_number', 'po_number',
+)
+PAD = '  '
+CHUNK_SIZE = 1000
+
+
+def _item_trigrams(row):
+    grams = set()
+    for value in row:
+        text = (str(value) if value is not None else '').lower()
+        if text:
+            text += PAD
+            grams.update(text[i:i + 3] for i in range(len(text) - 2))
+    return grams
+
+
+def _backfill(trigrams):
+    """Index the existing items in id order, CHUNK_SIZE at a time."""
+    bind = op.get_bind()
+    query = sa.text(
+        f"SELECT id, {', '.join(SEARCH_COLUMNS)} FROM stock_items "
+        "WHERE id > :last_id ORDER BY id LIMIT :limit"
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(query, {'last_id': last_id, 'limit': CHUNK_SIZE}).all()
+        if not rows:
+            break
+        postings = [
+            {'gram': gram, 'item_id': row[0]}
+            for row in rows
+            for gram in _item_trigrams(row[1:])
+        ]
+        if postings:
+            op.bulk_insert(trigrams, postings)
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    trigrams = op.create_table(
+        'stock_search_trigrams',
+        sa.Column('gram', sa.String(length=3).with_variant(mysql.VARCHAR(length=3, collation='utf8mb4_bin'), 'mysql'), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('gram', 'item_id')
+    )
+    with op.batch_alter_table('stock_search_trigrams', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_search_trigrams_item_id'), ['item_id'], unique=False)
+
+    # Index the existing rows (searches intersect these postings)
+    _backfill(trigrams)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_search_trigrams', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_search_trigrams_item_id'))
+
+    op.drop_table('stock_search_trigrams')
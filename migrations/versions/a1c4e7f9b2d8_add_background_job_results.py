@@ -0,0 +1,26 @@
+"""add background_jobs.results for per-row job outcomes
+
+Revision ID: a1c4e7f9b2d8
+Revises: 5e8f2b6a9d03
+Create Date: 2026-10-17 14:05:37.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c4e7f9b2d8'
+down_revision = '5e8f2b6a9d03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('background_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('results', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('background_jobs', schema=None) as batch_op:
+        batch_op.drop_column('results')
@@ -0,0 +1,30 @@
+"""add alarm_threshold_version (rules version shared by every process)
+
+Revision ID: a7e3c5d9f214
+Revises: d9f1b6c4e820
+Create Date: 2026-10-17 22:14:37.509126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e3c5d9f214'
+down_revision = 'd9f1b6c4e820'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    version = op.create_table(
+        'alarm_threshold_version',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(version, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('alarm_threshold_version')
@@ -0,0 +1,75 @@
+"""add stock_rollups (daily/weekly/monthly ledger analytics)
+
+Revision ID: b8e5d1c3f702
+Revises: e2c9f4a7b031
+Create Date: 2026-10-17 17:31:05.218334
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e5d1c3f702'
+down_revision = 'e2c9f4a7b031'
+branch_labels = None
+depends_on = None
+
+
+def _period_starts(day):
+    if isinstance(day, str):
+        day = datetime.strptime(day[:10], "%Y-%m-%d").date()
+    elif isinstance(day, datetime):
+        day = day.date()
+    return {
+        "day": day,
+        "week": day - timedelta(days=day.weekday()),
+        "month": day.replace(day=1),
+    }
+
+
+def upgrade():
+    rollups = op.create_table(
+        'stock_rollups',
+        sa.Column('period', sa.String(length=5), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('slot', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('inward_qty', sa.Float(), nullable=False),
+        sa.Column('inward_value', sa.Float(), nullable=False),
+        sa.Column('outward_qty', sa.Float(), nullable=False),
+        sa.Column('outward_value', sa.Float(), nullable=False),
+        sa.Column('movements', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('period', 'period_start', 'slot')
+    )
+
+    # Backfill from the existing ledger (same sums as analytics.rebuild_rollups)
+    daily = op.get_bind().execute(sa.text(
+        "SELECT movement_date, direction, SUM(qty), SUM(qty * COALESCE(unit_price, 0)), COUNT(id) "
+        "FROM stock_movements GROUP BY movement_date, direction"
+    )).all()
+    totals = {}
+    for day, direction, qty, value, count in daily:
+        measures = (
+            (float(qty or 0), float(value or 0), 0.0, 0.0) if direction == 'in'
+            else (0.0, 0.0, float(qty or 0), float(value or 0))
+        )
+        for period, start in _period_starts(day).items():
+            total = totals.setdefault((period, start), [0.0, 0.0, 0.0, 0.0, 0])
+            for index, amount in enumerate(measures):
+                total[index] += amount
+            total[4] += int(count)
+    if totals:
+        op.bulk_insert(rollups, [
+            {
+                'period': period, 'period_start': start, 'slot': 0,
+                'inward_qty': total[0], 'inward_value': total[1],
+                'outward_qty': total[2], 'outward_value': total[3], 'movements': total[4],
+            }
+            for (period, start), total in sorted(totals.items())
+        ])
+
+
+def downgrade():
+    op.drop_table('stock_rollups')
@@ -0,0 +1,179 @@
+"""add warehouse to stock items, movements, summary and rollups
+
+Revision ID: c3e7a9d2f415
+Revises: f6a2c8e4d913
+Create Date: 2026-10-17 19:04:27.516309
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e7a9d2f415'
+down_revision = 'f6a2c8e4d913'
+branch_labels = None
+depends_on = None
+
+# Names SQLite's unnamed UNIQUE(item_code) gets in batch mode, so it can be dropped
+NAMING_CONVENTION = {"uq": "uq_%(table_name)s_%(column_0_name)s"}
+
+
+def _item_code_uniques():
+    """(constraint names, index names) enforcing a unique item_code on its own."""
+    inspector = sa.inspect(op.get_bind())
+    constraints = {
+        unique['name'] or 'uq_stock_items_item_code'
+        for unique in inspector.get_unique_constraints('stock_items')
+        if unique['column_names'] == ['item_code']
+    }
+    indexes = {
+        index['name']
+        for index in inspector.get_indexes('stock_items')
+        if index['unique'] and index['column_names'] == ['item_code'] and index['name'] not in constraints
+    }
+    return sorted(constraints), sorted(indexes)
+
+
+def _period_starts(day):
+    if isinstance(day, str):
+        day = datetime.strptime(day[:10], "%Y-%m-%d").date()
+    elif isinstance(day, datetime):
+        day = day.date()
+    return {
+        "day": day,
+        "week": day - timedelta(days=day.weekday()),
+        "month": day.replace(day=1),
+    }
+
+
+def _rollup_rows(by_warehouse):
+    """stock_rollups rows rebuilt from the ledger (same sums as analytics.rebuild_rollups)."""
+    keys = "warehouse, movement_date, direction" if by_warehouse else "movement_date, direction"
+    daily = op.get_bind().execute(sa.text(
+        f"SELECT {keys}, SUM(qty), SUM(qty * COALESCE(unit_price, 0)), COUNT(id) "
+        f"FROM stock_movements GROUP BY {keys}"
+    )).all()
+    totals = {}
+    for row in daily:
+        code = row[0] if by_warehouse else None
+        day, direction, qty, value, count = row[-5:]
+        measures = (
+            (float(qty or 0), float(value or 0), 0.0, 0.0) if direction == 'in'
+            else (0.0, 0.0, float(qty or 0), float(value or 0))
+        )
+        for period, start in _period_starts(day).items():
+            total = totals.setdefault((code, period, start), [0.0, 0.0, 0.0, 0.0, 0])
+            for index, amount in enumerate(measures):
+                total[index] += amount
+            total[4] += int(count)
+
+    rows = []
+    for (code, period, start), total in sorted(totals.items(), key=lambda entry: entry[0][1:]):
+        row = {
+            'period': period, 'period_start': start, 'slot': 0,
+            'inward_qty': total[0], 'inward_value': total[1],
+            'outward_qty': total[2], 'outward_value': total[3], 'movements': total[4],
+        }
+        if by_warehouse:
+            row['warehouse'] = code
+        rows.append(row)
+    return rows
+
+
+def _rollup_columns():
+    return [
+        sa.Column('period', sa.String(length=5), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('slot', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('inward_qty', sa.Float(), nullable=False),
+        sa.Column('inward_value', sa.Float(), nullable=False),
+        sa.Column('outward_qty', sa.Float(), nullable=False),
+        sa.Column('outward_value', sa.Float(), nullable=False),
+        sa.Column('movements', sa.Integer(), nullable=False),
+    ]
+
+
+def _summary_columns():
+    return [
+        sa.Column('slot', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('total_items', sa.Integer(), nullable=False),
+        sa.Column('normal_stock', sa.Integer(), nullable=False),
+        sa.Column('low_stock', sa.Integer(), nullable=False),
+        sa.Column('critical_stock', sa.Integer(), nullable=False),
+        sa.Column('total_value', sa.Float(), nullable=False),
+    ]
+
+
+def upgrade():
+    # Existing rows all belong to the default warehouse
+    constraints, indexes = _item_code_uniques()
+    with op.batch_alter_table('stock_items', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.add_column(sa.Column('warehouse', sa.String(length=20), server_default='main', nullable=False))
+        for name in constraints:
+            batch_op.drop_constraint(name, type_='unique')
+        for name in indexes:
+            batch_op.drop_index(name)
+        batch_op.create_unique_constraint('uq_stock_item_warehouse_code', ['warehouse', 'item_code'])
+        batch_op.create_index('ix_stock_items_warehouse_id', ['warehouse', 'id'], unique=False)
+        batch_op.create_index('ix_stock_items_warehouse_alarm', ['warehouse', 'alarm_status'], unique=False)
+
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('warehouse', sa.String(length=20), server_default='main', nullable=False))
+        batch_op.create_index('ix_stock_movements_warehouse_date', ['warehouse', 'movement_date'], unique=False)
+
+    # Derived tables: the summary rebuilds itself on the next read, the
+    # rollups are rebuilt from the ledger here
+    op.drop_table('inventory_summary')
+    op.create_table(
+        'inventory_summary',
+        sa.Column('warehouse', sa.String(length=20), nullable=False),
+        *_summary_columns(),
+        sa.PrimaryKeyConstraint('warehouse', 'slot')
+    )
+
+    op.drop_table('stock_rollups')
+    rollups = op.create_table(
+        'stock_rollups',
+        sa.Column('warehouse', sa.String(length=20), nullable=False),
+        *_rollup_columns(),
+        sa.PrimaryKeyConstraint('warehouse', 'period', 'period_start', 'slot')
+    )
+    with op.batch_alter_table('stock_rollups', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_rollups_period_start', ['period', 'period_start'], unique=False)
+    rows = _rollup_rows(by_warehouse=True)
+    if rows:
+        op.bulk_insert(rollups, rows)
+
+
+def downgrade():
+    op.drop_table('stock_rollups')
+    rollups = op.create_table(
+        'stock_rollups',
+        *_rollup_columns(),
+        sa.PrimaryKeyConstraint('period', 'period_start', 'slot')
+    )
+    rows = _rollup_rows(by_warehouse=False)
+    if rows:
+        op.bulk_insert(rollups, rows)
+
+    op.drop_table('inventory_summary')
+    op.create_table(
+        'inventory_summary',
+        *_summary_columns(),
+        sa.PrimaryKeyConstraint('slot')
+    )
+
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_movements_warehouse_date')
+        batch_op.drop_column('warehouse')
+
+    # Fails if an item_code is now used in more than one warehouse
+    with op.batch_alter_table('stock_items', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_items_warehouse_alarm')
+        batch_op.drop_index('ix_stock_items_warehouse_id')
+        batch_op.drop_constraint('uq_stock_item_warehouse_code', type_='unique')
+        batch_op.drop_column('warehouse')
+        batch_op.create_unique_constraint('uq_stock_item_code', ['item_code'])
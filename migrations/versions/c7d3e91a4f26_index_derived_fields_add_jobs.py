@@ -0,0 +1,47 @@
+"""index alarm_status/balance_stock_qty, add background_jobs
+
+Revision ID: c7d3e91a4f26
+Revises: 8b41e0c2d5a7
+Create Date: 2026-10-17 11:27:40.553190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d3e91a4f26'
+down_revision = '8b41e0c2d5a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock_items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_items_alarm_status'), ['alarm_status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stock_items_balance_stock_qty'), ['balance_stock_qty'], unique=False)
+
+    op.create_table(
+        'background_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('processed', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('changed', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Backfill rows whose derived fields have drifted with: flask recompute-derived
+
+
+def downgrade():
+    op.drop_table('background_jobs')
+
+    with op.batch_alter_table('stock_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_items_balance_stock_qty'))
+        batch_op.drop_index(batch_op.f('ix_stock_items_alarm_status'))
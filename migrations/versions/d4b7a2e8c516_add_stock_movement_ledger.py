@@ -0,0 +1,80 @@
+"""add stock_movements ledger and stock_balance_snapshots
+
+Revision ID: d4b7a2e8c516
+Revises: a1c4e7f9b2d8
+Create Date: 2026-10-17 15:22:48.604917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b7a2e8c516'
+down_revision = 'a1c4e7f9b2d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stock_movements',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('direction', sa.String(length=3), nullable=False),
+        sa.Column('qty', sa.Float(), nullable=False),
+        sa.Column('unit_price', sa.Float(), nullable=True),
+        sa.Column('movement_date', sa.Date(), nullable=False),
+        sa.Column('source', sa.String(length=20), nullable=False),
+        sa.Column('invoice_no', sa.String(length=100), nullable=True),
+        sa.Column('eway_bill_number', sa.String(length=100), nullable=True),
+        sa.Column('vehicle_number', sa.String(length=50), nullable=True),
+        sa.Column('po_number', sa.String(length=100), nullable=True),
+        sa.Column('balance_after', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_movements_item_date', ['item_id', 'movement_date'], unique=False)
+
+    op.create_table(
+        'stock_balance_snapshots',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('as_of', sa.Date(), nullable=False),
+        sa.Column('inward_qty', sa.Float(), nullable=False),
+        sa.Column('outward_qty', sa.Float(), nullable=False),
+        sa.Column('inward_value', sa.Float(), nullable=False),
+        sa.Column('outward_value', sa.Float(), nullable=False),
+        sa.Column('last_movement_id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=True),
+        sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('item_id', 'as_of')
+    )
+
+    # Open the ledger with each existing item's current inward/outward figures
+    op.execute(
+        "INSERT INTO stock_movements (item_id, direction, qty, unit_price, movement_date, "
+        "source, invoice_no, po_number, balance_after, created_at) "
+        "SELECT id, 'in', inward_qty, COALESCE(inward_unit_price, 0), "
+        "COALESCE(inward_date, CURRENT_DATE), 'opening', inward_invoice_no, po_number, "
+        "inward_qty, CURRENT_TIMESTAMP "
+        "FROM stock_items WHERE COALESCE(inward_qty, 0) <> 0"
+    )
+    op.execute(
+        "INSERT INTO stock_movements (item_id, direction, qty, unit_price, movement_date, "
+        "source, invoice_no, eway_bill_number, vehicle_number, po_number, balance_after, created_at) "
+        "SELECT id, 'out', outward_qty, COALESCE(outward_unit_price, 0), "
+        "COALESCE(outward_date, inward_date, CURRENT_DATE), 'opening', outward_invoice_no, "
+        "eway_bill_number, vehicle_number, po_number, "
+        "COALESCE(inward_qty, 0) - outward_qty, CURRENT_TIMESTAMP "
+        "FROM stock_items WHERE COALESCE(outward_qty, 0) <> 0"
+    )
+
+
+def downgrade():
+    op.drop_table('stock_balance_snapshots')
+
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_movements_item_date')
+
+    op.drop_table('stock_movements')
@@ -0,0 +1,67 @@
+"""add sync journal, bases, receipts and state (offline terminals)
+
+Revision ID: d9f1b6c4e820
+Revises: c3e7a9d2f415
+Create Date: 2026-10-17 20:21:53.104872
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f1b6c4e820'
+down_revision = 'c3e7a9d2f415'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Not backfilled: on a central server that already has items run
+    # `flask compact-sync-journal --backfill` before terminals first pull
+    op.create_table(
+        'sync_journal',
+        sa.Column('seq', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('sync_journal', schema=None) as batch_op:
+        batch_op.create_index('ix_sync_journal_item_seq', ['item_id', 'seq'], unique=False)
+
+    op.create_table(
+        'sync_base',
+        sa.Column('item_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('central_id', sa.Integer(), nullable=False),
+        sa.Column('warehouse', sa.String(length=20), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('inward_qty', sa.Float(), nullable=False),
+        sa.Column('outward_qty', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('item_id'),
+        sa.UniqueConstraint('central_id')
+    )
+    op.create_table(
+        'sync_receipts',
+        sa.Column('terminal', sa.String(length=64), nullable=False),
+        sa.Column('item_ref', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('seq', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('central_id', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('terminal', 'item_ref')
+    )
+    op.create_table(
+        'sync_state',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('sync_state')
+    op.drop_table('sync_receipts')
+    op.drop_table('sync_base')
+    with op.batch_alter_table('sync_journal', schema=None) as batch_op:
+        batch_op.drop_index('ix_sync_journal_item_seq')
+
+    op.drop_table('sync_journal')
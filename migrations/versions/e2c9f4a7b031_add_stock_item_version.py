@@ -0,0 +1,26 @@
+"""add stock_items.version for optimistic concurrency control
+
+Revision ID: e2c9f4a7b031
+Revises: d4b7a2e8c516
+Create Date: 2026-10-17 16:48:12.530276
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c9f4a7b031'
+down_revision = 'd4b7a2e8c516'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('stock_items', schema=None) as batch_op:
+        batch_op.drop_column('version')
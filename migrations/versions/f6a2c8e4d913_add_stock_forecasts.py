@@ -0,0 +1,39 @@
+"""add stock_forecasts (reorder forecasting)
+
+Revision ID: f6a2c8e4d913
+Revises: b8e5d1c3f702
+Create Date: 2026-10-17 18:12:40.771905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a2c8e4d913'
+down_revision = 'b8e5d1c3f702'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by `flask forecast-stock` (run it once after upgrading, then daily)
+    op.create_table(
+        'stock_forecasts',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('daily_usage', sa.Float(), nullable=False),
+        sa.Column('days_to_stockout', sa.Float(), nullable=True),
+        sa.Column('stockout_risk', sa.String(length=8), nullable=False),
+        sa.Column('computed_on', sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('item_id')
+    )
+    with op.batch_alter_table('stock_forecasts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_forecasts_days_to_stockout'), ['days_to_stockout'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_forecasts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_forecasts_days_to_stockout'))
+
+    op.drop_table('stock_forecasts')
@@ -1,4 +1,3 @@
-import requests
 import random
 import json
 from datetime import datetime, timedelta
@@ -9,25 +8,31 @@ API_URL = "http://127.0.0.1:5000/api/add"  # ✅ matches your Flask route
 TOTAL_ITEMS = 2000
 BATCH_SIZE = 100
 RETRY_LIMIT = 3
+SEED = None  # set an int for a reproducible dataset
 # ----------------------------------------
 
-def generate_item(index):
-    """Generate one fake stock item."""
+CATEGORIES = ["Fasteners", "Electrical", "Packaging", "Hardware", "Consumables"]
+UOMS = ["Nos", "Nos", "Nos", "Kg", "Mtr", "Box"]
+
+
+def generate_item(index, rng=random):
+    """Generate one fake stock item (pass a seeded random.Random for reproducible data)."""
     base_date = datetime(2025, 11, 1)
-    inward_date = base_date + timedelta(days=random.randint(0, 15))
-    outward_date = inward_date + timedelta(days=random.randint(1, 6))
+    inward_date = base_date + timedelta(days=rng.randint(0, 15))
+    outward_date = inward_date + timedelta(days=rng.randint(1, 6))
 
-    inward_qty = random.randint(20, 500)
-    outward_qty = random.randint(0, max(inward_qty - 1, 1))
-    inward_unit_price = round(random.uniform(25, 90), 2)
-    outward_unit_price = round(inward_unit_price * random.uniform(1.05, 1.25), 2)
+    inward_qty = rng.randint(20, 500)
+    outward_qty = rng.randint(0, max(inward_qty - 1, 1))
+    inward_unit_price = round(rng.uniform(25, 90), 2)
+    outward_unit_price = round(inward_unit_price * rng.uniform(1.05, 1.25), 2)
 
     return {
         "item_code": f"ITM{index:05d}",
         "item_description": f"Widget {chr(65 + (index % 26))}{index}",
         "inward_invoice_no": f"INV{1000 + index}",
         "inward_date": inward_date.strftime("%Y-%m-%d"),
-        "uom": "Nos",
+        "uom": rng.choice(UOMS),
+        "category": rng.choice(CATEGORIES),
         "inward_qty": inward_qty,
         "inward_unit_price": inward_unit_price,
         "outward_qty": outward_qty,
@@ -40,8 +45,17 @@ def generate_item(index):
     }
 
 
+def generate_items(total, seed=None, start=1):
+    """Yield `total` items lazily; the same seed always gives the same rows."""
+    rng = random.Random(seed)
+    for index in range(start, start + total):
+        yield generate_item(index, rng)
+
+
 def send_batch(batch_data, attempt=1):
     """Send one batch safely with retries."""
+    import requests
+
     try:
         response = requests.post(API_URL, json=batch_data, timeout=30)
         if response.status_code == 201:
@@ -58,7 +72,7 @@ def send_batch(batch_data, attempt=1):
 
 
 def main():
-    all_items = [generate_item(i) for i in range(1, TOTAL_ITEMS + 1)]
+    all_items = list(generate_items(TOTAL_ITEMS, seed=SEED))
     total_batches = (TOTAL_ITEMS // BATCH_SIZE) + (1 if TOTAL_ITEMS % BATCH_SIZE else 0)
 
     print(f"🚀 Starting upload of {TOTAL_ITEMS} inventory records ({total_batches} batches)...")
@@ -1,21 +1,48 @@
+import time
+
+# import-to-ready is measured from here (see startup.mark_ready)
+_IMPORTED_AT = time.perf_counter()
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from config import Config
+from .session import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 def create_app():
     app = Flask(__name__, template_folder="../templates", static_folder="../static")
     app.config.from_object(Config)
+
+    from . import engines
+    engines.configure(app)
     db.init_app(app)
     CORS(app)
 
+    from . import changes, events, instrumentation, sync
+    from .cache import ResponseCache
+    changes.init_app(app)
+    engines.init_app(app)
+    ResponseCache(app)
+    events.init_app(app)
+    instrumentation.init_app(app)
+    sync.init_app(app)
+
     # ✅ Import models here so Alembic can detect them
-    from .models import StockItem
+    from .models import (
+        StockItem, InventorySummary, SearchTrigram, BackgroundJob, AlarmThreshold, AlarmThresholdVersion,
+        StockMovement, BalanceSnapshot, StockRollup, StockForecast,
+        SyncJournal, SyncBase, SyncReceipt, SyncState,
+    )
 
     # Register routes (blueprint)
     from .routes import main
     app.register_blueprint(main)
 
+    from .commands import register_commands
+    register_commands(app)
+
+    from .startup import mark_ready
+    mark_ready(app, _IMPORTED_AT)
     return app
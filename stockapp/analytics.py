@@ -0,0 +1,296 @@
+"""
+Time-series analytics over the stock movement ledger.
+
+`stock_rollups` holds the inward and outward quantity, value (qty x unit
+price) and movement count per warehouse and day, ISO week (starting
+Monday) and month, bucketed by movement_date (the item's dates for its
+opening movements, the posting day for later ones). The ledger keeps it
+current:
+each batch of movements it appends adds its totals to the periods it
+falls in (relative upserts in the same transaction). Deleting items
+leaves every period alone: their past movements stay counted, and the
+stock they still held is not booked as outward (it was not issued, so
+it must not show up as sales or margin). A year of daily points is a
+range scan of a few hundred small rows, not a pass over stock_items or
+the ledger; the cross-warehouse series (warehouse=*) adds up the same
+rows of every warehouse.
+
+margin is outward_value - inward_value for the period.
+
+With ANALYTICS_ROLLUPS_ENABLED off the table is not maintained and reads
+aggregate stock_movements instead; `flask rebuild-analytics` rebuilds
+it from the ledger (e.g. after turning it back on). Both only see the
+ledger of items that still exist, so they drop the history of deleted
+ones.
+"""
+import random
+from collections.abc import Mapping
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+
+from . import db
+from .models import StockMovement, StockRollup
+
+PERIODS = ("day", "week", "month")
+MEASURES = ("inward_qty", "inward_value", "outward_qty", "outward_value", "movements")
+
+# Upper bound on the points one range query returns (ten years of days)
+MAX_POINTS = 3660
+
+
+def rollups_enabled():
+    return current_app.config.get("ANALYTICS_ROLLUPS_ENABLED", True)
+
+
+def _value(row, key):
+    if isinstance(row, Mapping):
+        return row.get(key)
+    return getattr(row, key, None)
+
+
+def period_start(day, period):
+    """First day of the `period` ("day", "week", "month") containing `day`."""
+    if isinstance(day, datetime):
+        day = day.date()
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_start(start, period):
+    if period == "week":
+        return start + timedelta(days=7)
+    if period == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+# -------------------------------
+# Incremental maintenance
+# -------------------------------
+def _add(deltas, warehouse, day, direction, qty, value, count, sign=1):
+    """Add one warehouse's in/out totals of a day to every period's bucket in `deltas`."""
+    qty, value = float(qty or 0) * sign, float(value or 0) * sign
+    measures = (qty, value, 0.0, 0.0) if direction == "in" else (0.0, 0.0, qty, value)
+    for period in PERIODS:
+        total = deltas.setdefault(
+            (warehouse, period, period_start(day, period)), [0.0, 0.0, 0.0, 0.0, 0]
+        )
+        for index, amount in enumerate(measures):
+            total[index] += amount
+        total[4] += count * sign
+
+
+def rollup_deltas(movements):
+    """{(warehouse, period, period_start): [measures]} for ledger rows (dicts or StockMovement)."""
+    deltas = {}
+    for movement in movements:
+        qty = float(_value(movement, "qty") or 0)
+        _add(
+            deltas, _value(movement, "warehouse"),
+            _value(movement, "movement_date") or date.today(), _value(movement, "direction"),
+            qty, qty * float(_value(movement, "unit_price") or 0), 1,
+        )
+    return deltas
+
+
+def _upsert_statement(dialect_name):
+    """INSERT that adds onto an existing (warehouse, period, period_start, slot) row, or None."""
+    table = StockRollup.__table__
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+
+    stmt = dialect_insert(table)
+    incoming = stmt.inserted if dialect_name == "mysql" else stmt.excluded
+    values = {name: table.c[name] + incoming[name] for name in MEASURES}
+    if dialect_name == "mysql":
+        return stmt.on_duplicate_key_update(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=["warehouse", "period", "period_start", "slot"], set_=values
+    )
+
+
+def apply_deltas(deltas):
+    """Add `deltas` to one random slot of each period row, inside the current transaction."""
+    if not deltas or not rollups_enabled():
+        return
+    slot = random.randrange(current_app.config.get("ANALYTICS_SLOTS", 8))
+    # sorted, so concurrent writers lock the rows in the same order
+    rows = [
+        {
+            "warehouse": warehouse, "period": period, "period_start": start, "slot": slot,
+            **dict(zip(MEASURES, measures)),
+        }
+        for (warehouse, period, start), measures in sorted(deltas.items())
+        if any(measures)
+    ]
+    if not rows:
+        return
+
+    statement = _upsert_statement(db.session.get_bind(mapper=StockRollup).dialect.name)
+    if statement is not None:
+        db.session.execute(statement, rows)
+        return
+    table = StockRollup.__table__
+    for row in rows:
+        result = db.session.execute(
+            update(table)
+            .where(table.c.warehouse == row["warehouse"], table.c.period == row["period"],
+                   table.c.period_start == row["period_start"], table.c.slot == slot)
+            .values(**{name: table.c[name] + row[name] for name in MEASURES})
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(table), [row])
+
+
+def record_movements(movements):
+    """Add newly appended ledger rows to the rollups."""
+    apply_deltas(rollup_deltas(movements))
+
+
+def _daily_totals(where=()):
+    """Ledger totals per warehouse, movement_date and direction.
+
+    Rows are (warehouse, day, direction, qty, value, count).
+    """
+    movement = StockMovement
+    return db.session.execute(
+        select(
+            movement.warehouse,
+            movement.movement_date,
+            movement.direction,
+            func.sum(movement.qty),
+            func.sum(movement.qty * func.coalesce(movement.unit_price, 0)),
+            func.count(movement.id),
+        )
+        .where(*where)
+        .group_by(movement.warehouse, movement.movement_date, movement.direction)
+    ).all()
+
+
+def rebuild_rollups():
+    """Recompute stock_rollups from the whole ledger and commit; returns the rows written."""
+    deltas = {}
+    for row in _daily_totals():
+        _add(deltas, *row)
+    rows = [
+        {
+            "warehouse": warehouse, "period": period, "period_start": start, "slot": 0,
+            **dict(zip(MEASURES, measures)),
+        }
+        for (warehouse, period, start), measures in sorted(deltas.items())
+    ]
+    db.session.execute(delete(StockRollup))
+    if rows:
+        db.session.execute(insert(StockRollup.__table__), rows)
+    db.session.commit()
+    return len(rows)
+
+
+# -------------------------------
+# Reads
+# -------------------------------
+def parse_range(args):
+    """
+    Read `period`, `from` and `to` (YYYY-MM-DD) from `args`.
+
+    Defaults to daily points for the year up to today. Raises ValueError
+    with a user-facing message when a value is invalid.
+    """
+    period = (args.get("period") or "day").strip().lower()
+    if period not in PERIODS:
+        raise ValueError("Invalid period. Use 'day', 'week', or 'month'.")
+
+    bounds = {}
+    for name in ("from", "to"):
+        raw = (args.get(name) or "").strip()
+        if not raw:
+            continue
+        try:
+            bounds[name] = datetime.strptime(raw, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format.")
+    end = bounds.get("to") or date.today()
+    start = bounds.get("from") or end - timedelta(days=364)
+    if start > end:
+        raise ValueError("'from' must not be after 'to'.")
+    return period, start, end
+
+
+def _rollup_totals(period, first, end, warehouse):
+    rollup = StockRollup
+    query = (
+        select(rollup.period_start, *[func.sum(getattr(rollup, name)) for name in MEASURES])
+        .where(rollup.period == period, rollup.period_start >= first, rollup.period_start <= end)
+        .group_by(rollup.period_start)
+    )
+    if warehouse is not None:
+        query = query.where(rollup.warehouse == warehouse)
+    return {row[0]: list(row[1:]) for row in db.session.execute(query)}
+
+
+def _ledger_totals(period, first, end, warehouse):
+    deltas = {}
+    until = next_start(period_start(end, period), period)
+    where = [StockMovement.movement_date >= first, StockMovement.movement_date < until]
+    if warehouse is not None:
+        where.append(StockMovement.warehouse == warehouse)
+    for _, day, direction, qty, value, count in _daily_totals(where):
+        # one series: every warehouse goes into the same buckets
+        _add(deltas, None, day, direction, qty, value, count)
+    return {start: measures for (_, name, start), measures in deltas.items() if name == period}
+
+
+def timeseries(period, start, end, warehouse=None):
+    """
+    Per-period inward/outward quantity, value, margin and movement count.
+
+    Points cover every period overlapping [start, end] (zero-filled), so
+    the first and last week or month can extend past the range. Covers
+    one warehouse, or all of them with `warehouse=None`.
+    """
+    first = period_start(start, period)
+    starts = [first]
+    while True:
+        following = next_start(starts[-1], period)
+        if following > end:
+            break
+        starts.append(following)
+        if len(starts) > MAX_POINTS:
+            raise ValueError(f"Range too long: at most {MAX_POINTS} points per query.")
+
+    loader = _rollup_totals if rollups_enabled() else _ledger_totals
+    found = loader(period, first, end, warehouse)
+
+    points = []
+    totals = dict.fromkeys(MEASURES, 0)
+    for bucket in starts:
+        measures = dict(zip(MEASURES, found.get(bucket) or (0, 0, 0, 0, 0)))
+        for name in MEASURES:
+            totals[name] += measures[name] or 0
+        points.append({"period_start": bucket.isoformat(), **_format(measures)})
+
+    return {
+        "period": period,
+        "from": first.isoformat(),
+        "to": end.isoformat(),
+        "points": points,
+        "totals": _format(totals),
+    }
+
+
+def _format(measures):
+    result = {name: round(float(measures[name] or 0), 6) for name in MEASURES[:4]}
+    result["margin"] = round(result["outward_value"] - result["inward_value"], 6)
+    result["movements"] = int(measures["movements"] or 0)
+    return result
@@ -0,0 +1,445 @@
+"""
+Async (ASGI) serving mode for the read API (see asgi.py).
+
+GET /api/inventory, /api/item/<id> and /api/dashboard-metrics are served
+on an async SQLAlchemy engine (aiomysql for MySQL, aiosqlite for SQLite,
+asyncpg for PostgreSQL; ASYNC_DATABASE_URL overrides the derived URL),
+so a waiting query parks a coroutine instead of a worker thread (point
+ASYNC_DATABASE_URL at a replica to keep them off the primary). They
+build the same statements as the Flask views (inventory_filters(), the
+summary queries, serialize.py) and share the response cache and
+its ETags with them, so the JSON is identical.
+
+Every other request (writes, pages, exports, imports, the change feed)
+goes to the Flask app on a thread pool of ASGI_WSGI_THREADS threads,
+as does a dashboard read that first has to build the summary table.
+A change-feed client holds one of those threads while connected.
+Request bodies are streamed into Flask as it reads them (RequestBody),
+so an upload is never held in full before the view sees it.
+
+The async driver is an optional dependency, imported when the first
+native read arrives.
+"""
+import asyncio
+import contextvars
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.http import parse_etags
+
+from . import forecast, serialize, summary, warehouses
+from .cache import _etag, active_cache, response_key
+from .engines import engine_options
+from .models import StockItem
+from .utils import ESTIMATE_CAP, decode_cursor, encode_cursor, estimate_counter, inventory_filters
+
+# Sync driver family -> async driver
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+class NotHandled(Exception):
+    """A native read that has to be answered by the Flask app instead."""
+
+
+def async_database_url(config):
+    """ASYNC_DATABASE_URL, or the primary URL with its async driver swapped in."""
+    if config.get("ASYNC_DATABASE_URL"):
+        return config["ASYNC_DATABASE_URL"]
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No async driver known for {url.get_backend_name()}; set ASYNC_DATABASE_URL.")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+class AsyncReadAPI:
+    """ASGI application: native async reads, everything else via Flask."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config.get("ASGI_WSGI_THREADS", 32), thread_name_prefix="stockapp-wsgi"
+        )
+        self.engine = None
+        self.sessionmaker = None
+
+    # -------------------------------
+    # ASGI entry
+    # -------------------------------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        if scope["method"] in ("GET", "HEAD"):
+            route = self._route(scope["path"])
+            if route is not None:
+                try:
+                    return await self._read(scope, send, *route)
+                except NotHandled:
+                    pass
+        await self._call_flask(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.engine is not None:
+                    await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _route(self, path):
+        if path == "/api/inventory":
+            return "inventory", self._inventory, None
+        if path == "/api/dashboard-metrics":
+            return "metrics", self._metrics, None
+        if path.startswith("/api/item/"):
+            item_id = path[len("/api/item/"):]
+            if item_id.isdigit():
+                return "item", self._item, int(item_id)
+        return None
+
+    def _session(self):
+        if self.sessionmaker is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+            url = async_database_url(self.config)
+            self.engine = create_async_engine(url, **engine_options(url, self.config))
+            self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        return self.sessionmaker()
+
+    # -------------------------------
+    # Cached, conditional JSON reads
+    # -------------------------------
+    async def _read(self, scope, send, scope_name, handler, item_id):
+        args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+        cache = active_cache(self.flask_app)
+
+        hit = None
+        if cache is not None:
+            # generations and entries may live in Redis: keep that off the loop
+            blocking = cache.shared is not None
+            key = await self._maybe_thread(blocking, response_key, cache, scope_name, scope["path"], args, item_id)
+            hit = await self._maybe_thread(blocking, cache.get, key)
+
+        if hit is None:
+            # config lookups (summary_enabled() and friends) need the app context
+            with self.flask_app.app_context():
+                status, body, etag = await handler(args, item_id)
+                if not isinstance(body, bytes):
+                    body = self.flask_app.json.response(body).get_data()
+            if status != 200:
+                return await self._respond(send, status, body)
+            hit = (body, etag or _etag(body), "application/json")
+            if cache is not None:
+                await self._maybe_thread(blocking, cache.set, key, hit)
+
+        body, etag, mimetype = hit
+        headers = [(b"etag", f'"{etag}"'.encode()), (b"cache-control", b"no-cache")]
+        if parse_etags(_header(scope, b"if-none-match")).contains_weak(etag):
+            return await self._respond(send, 304, b"", headers=headers, mimetype=None)
+        if scope["method"] == "HEAD":
+            body = b""
+        await self._respond(send, 200, body, headers=headers, mimetype=mimetype)
+
+    async def _maybe_thread(self, blocking, function, *args):
+        if blocking:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        return function(*args)
+
+    @staticmethod
+    async def _respond(send, status, body, headers=(), mimetype="application/json"):
+        headers = list(headers) + [(b"content-length", str(len(body)).encode())]
+        if mimetype:
+            headers.append((b"content-type", mimetype.encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _counters(self, session, warehouse):
+        """Dashboard metrics (as summary.get_metrics()); NotHandled if the table needs a rebuild."""
+        if not self.config.get("METRICS_SUMMARY_ENABLED", True):
+            row = (await session.execute(summary.aggregate_query(warehouse))).one()
+            return summary.format_metrics(summary.metrics_from_aggregate(row))
+        row = (await session.execute(summary.counters_query(warehouse))).one()
+        if row[0]:
+            return summary.format_metrics(dict(zip(summary.COUNTERS, row[1:])))
+        if warehouse is not None and (await session.execute(summary.built_query())).first():
+            return summary.format_metrics(summary.empty_delta())
+        raise NotHandled()
+
+    # -------------------------------
+    # Handlers: (args, item_id) -> (status, payload or encoded body, etag)
+    # -------------------------------
+    async def _metrics(self, args, item_id):
+        try:
+            warehouse = warehouses.parse(args.get("warehouse"))
+        except ValueError as e:
+            return 400, {"error": str(e)}, None
+        async with self._session() as session:
+            return 200, await self._counters(session, warehouse), None
+
+    async def _item(self, args, item_id):
+        try:
+            warehouse = warehouses.parse(args.get("warehouse"))
+        except ValueError as e:
+            return 400, {"error": str(e)}, None
+        async with self._session() as session:
+            item = await session.get(StockItem, item_id)
+            if item is None or not warehouses.in_scope(item, warehouse):
+                # Flask renders the 404 page
+                raise NotHandled()
+            # the stored row, as get_single_item() serves it: its version is the ETag
+            return 200, item.to_dict(), str(item.version)
+
+    async def _inventory(self, args, item_id):
+        try:
+            page = int(args.get("page", 1))
+            limit = int(args.get("limit", 50))
+        except ValueError:
+            # the Flask view fails these with its error page
+            raise NotHandled()
+        try:
+            filters = inventory_filters(args)
+            fields = serialize.parse_fields(args.get("fields"))
+            order = forecast.sort_order(args.get("sort"))
+            if order is not None and "cursor" in args:
+                raise ValueError("sort is only supported with page pagination.")
+            cursor = decode_cursor(args.get("cursor")) if "cursor" in args else None
+        except ValueError as e:
+            return 400, {"error": str(e)}, None
+
+        try:
+            async with self._session() as session:
+                query = serialize.item_select(fields, filters, with_forecast=order is not None)
+
+                if "cursor" in args:
+                    page_body = await self._cursor_page(session, args, query, fields, cursor, limit)
+                    return 200, serialize.dumps(page_body), None
+
+                total_items = await _count(session, query)
+                rows = (await session.execute(
+                    query.order_by(*(order or (StockItem.id.desc(),))).offset((page - 1) * limit).limit(limit)
+                )).all()
+                return 200, serialize.dumps({
+                    "page": page,
+                    "limit": limit,
+                    "total_items": total_items,
+                    "total_pages": (total_items + limit - 1) // limit,
+                    "items": serialize.serialize_rows(rows, fields)
+                }), None
+        except NotHandled:
+            raise
+        except Exception as e:
+            return 500, {"error": "Failed to fetch inventory.", "detail": str(e)}, None
+
+    async def _cursor_page(self, session, args, query, fields, cursor, limit):
+        """Async twin of routes._cursor_page()."""
+        if cursor and cursor["dir"] == "prev":
+            rows = (await session.execute(
+                query.where(StockItem.id > cursor["id"]).order_by(StockItem.id.asc()).limit(limit + 1)
+            )).all()
+            has_more = len(rows) > limit
+            items = list(reversed(rows[:limit]))
+            has_newer, has_older = has_more, True
+        else:
+            page_query = query.where(StockItem.id < cursor["id"]) if cursor else query
+            rows = (await session.execute(
+                page_query.order_by(StockItem.id.desc()).limit(limit + 1)
+            )).all()
+            items = rows[:limit]
+            has_newer, has_older = cursor is not None, len(rows) > limit
+
+        if args.get("exact_total", "").lower() in ("1", "true", "yes"):
+            total_items, estimated = await _count(session, query), False
+        else:
+            counter = estimate_counter(args)
+            if counter is not None:
+                total_items = (await self._counters(session, warehouses.from_args(args)))[counter]
+            else:
+                total_items = await _count(session, query.limit(ESTIMATE_CAP))
+            estimated = True
+
+        return {
+            "limit": limit,
+            "items": serialize.serialize_rows(items, fields),
+            "next_cursor": encode_cursor(items[-1].id, "next") if items and has_older else None,
+            "prev_cursor": encode_cursor(items[0].id, "prev") if items and has_newer else None,
+            "total_items": total_items,
+            "total_estimated": estimated,
+        }
+
+    # -------------------------------
+    # Everything else: the Flask app on a thread pool
+    # -------------------------------
+    async def _call_flask(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        body = RequestBody(receive, loop)
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+            ]
+            return lambda data: started.setdefault("written", []).append(data)
+
+        environ = _environ(scope, body)
+        # one context for the whole response: stream_with_context generators
+        # keep Flask's context in contextvars between chunks, whichever
+        # pool thread runs them
+        context = contextvars.Context()
+
+        def run(function, *args):
+            return loop.run_in_executor(self.executor, context.run, function, *args)
+
+        result = await run(self.flask_app.wsgi_app, environ, start_response)
+        chunks = iter(result)
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            await body.wait_disconnect()
+            disconnected.set()
+
+        watcher = loop.create_task(watch_disconnect())
+        try:
+            first = await run(next, chunks, None)
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            for data in started.get("written", []):
+                await send({"type": "http.response.body", "body": data, "more_body": True})
+            chunk = first
+            while chunk is not None and not disconnected.is_set():
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await run(next, chunks, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+            if hasattr(result, "close"):
+                await run(result.close)
+
+
+class RequestBody(io.RawIOBase):
+    """
+    wsgi.input that pulls the ASGI request body as the app reads it.
+
+    read() runs on the pool thread and asks the event loop for the next
+    `http.request` message only when what it has is used up, so the body
+    reaches Flask in the chunks the server received and a slow reader
+    holds back the client instead of buffering. A disconnect mid-body
+    raises ClientDisconnected in the reader.
+    """
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._lock = asyncio.Lock()
+        self._mutex = threading.Lock()
+        self._buffer = bytearray()
+        self._more = True
+        self.disconnected = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while True:
+            with self._mutex:
+                if self._buffer or not self._more:
+                    if self.disconnected and not self._buffer:
+                        raise ClientDisconnected()
+                    size = min(len(target), len(self._buffer))
+                    target[:size] = self._buffer[:size]
+                    del self._buffer[:size]
+                    return size
+            asyncio.run_coroutine_threadsafe(self._pull(), self._loop).result()
+
+    async def _pull(self, keep=True):
+        async with self._lock:
+            if not self._more:
+                return
+            message = await self._receive()
+            with self._mutex:
+                if message["type"] == "http.disconnect":
+                    self.disconnected = True
+                    self._more = False
+                    return
+                if keep:
+                    self._buffer += message.get("body", b"")
+                self._more = message.get("more_body", False)
+
+    async def wait_disconnect(self):
+        """Drop the body the app left unread, then return when the client goes away."""
+        while self._more:
+            await self._pull(keep=False)
+        if not self.disconnected:
+            async with self._lock:
+                while (await self._receive())["type"] != "http.disconnect":
+                    pass
+            self.disconnected = True
+
+
+async def _count(session, query):
+    return (await session.execute(
+        select(func.count()).select_from(query.order_by(None).subquery())
+    )).scalar_one()
+
+
+def _header(scope, name):
+    values = [value.decode("latin-1") for key, value in scope["headers"] if key == name]
+    return ", ".join(values) or None
+
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope whose body streams from `body`."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # read to EOF, so a chunked body needs no Content-Length
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+        elif name != "TRANSFER_ENCODING":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def create_asgi_app(flask_app):
+    return AsyncReadAPI(flask_app)
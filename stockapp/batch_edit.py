@@ -0,0 +1,294 @@
+"""
+Batch update and delete for /api/items.
+
+Targets are a list of ids or a filter (the /api/inventory query params).
+Rows are processed a chunk at a time but in ONE transaction: each chunk
+is a single set-based UPDATE/DELETE (or one executemany per field set
+when every id brings its own values), with totals, balance and alarm
+status re-derived inside the statement by models.derived_expressions().
+Summary counters, the movement ledger, the search index and the change
+feed are brought along per chunk, exactly like the single-row routes.
+Only items of the request's warehouse are touched; other ids are
+reported as not_found.
+"""
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, func, literal, select, update
+
+from . import bulk, changes, db, ledger, summary, thresholds, warehouses
+from . import search as search_index
+from .models import StockItem, derived_expressions
+from .utils import inventory_filters
+
+TEXT_FIELDS = ("item_code",) + bulk.TEXT_FIELDS
+EDITABLE_FIELDS = TEXT_FIELDS + bulk.NUMERIC_FIELDS + bulk.DATE_FIELDS
+
+# Everything the summary, ledger and search hooks need before and after
+STATE_COLUMNS = sorted({
+    "id", "alarm_status", "inward_total_price",
+    *search_index.SEARCH_COLUMNS, *ledger.LEDGER_COLUMNS,
+})
+
+MAX_IDS = 100_000
+
+
+class BatchError(ValueError):
+    """The batch request itself is invalid (reported as a 400)."""
+
+
+# -------------------------------
+# Request parsing
+# -------------------------------
+def clean_values(values, allow_item_code=True):
+    """Validate and type a {field: value} dict of edits; raises ValueError."""
+    if not isinstance(values, dict) or not values:
+        raise ValueError("No fields to update.")
+    unknown = set(values) - set(EDITABLE_FIELDS) - {"id"}
+    if unknown:
+        raise ValueError(f"Fields cannot be updated: {', '.join(sorted(unknown))}.")
+
+    cleaned = {}
+    for field, value in values.items():
+        if field == "id":
+            continue
+        if field in TEXT_FIELDS:
+            value = None if value is None else str(value)
+            if field == "item_code":
+                if not allow_item_code:
+                    raise ValueError("'item_code' can only be changed per id.")
+                value = (value or "").strip()
+                if not value:
+                    raise ValueError("'item_code' cannot be empty.")
+            length = bulk.MAX_LENGTHS[field]
+            if value is not None and len(value) > length:
+                raise ValueError(f"'{field}' is longer than {length} characters.")
+        elif field in bulk.NUMERIC_FIELDS:
+            try:
+                value = float(value or 0)
+            except (TypeError, ValueError):
+                raise ValueError(f"'{field}' must be a number.")
+        else:
+            if value not in (None, ""):
+                try:
+                    value = datetime.strptime(value, "%Y-%m-%d").date()
+                except (TypeError, ValueError):
+                    raise ValueError(f"'{field}' must be a date in YYYY-MM-DD format.")
+            else:
+                value = None
+        cleaned[field] = value
+    return cleaned
+
+
+def _parse_ids(raw):
+    if not isinstance(raw, list) or not raw:
+        raise BatchError("'ids' must be a non-empty list of item ids.")
+    if len(raw) > MAX_IDS:
+        raise BatchError(f"At most {MAX_IDS} ids per request.")
+    try:
+        return list(dict.fromkeys(int(item_id) for item_id in raw))
+    except (TypeError, ValueError):
+        raise BatchError("'ids' must contain integers.")
+
+
+def resolve_targets(data):
+    """Return the ids a request addresses: its "ids" list, or the rows matching "filter"."""
+    if "ids" in data:
+        return _parse_ids(data["ids"])
+
+    criteria = data.get("filter")
+    if not isinstance(criteria, dict):
+        raise BatchError("Provide 'ids' or a 'filter'.")
+    # the filter cannot reach outside the request's warehouse
+    criteria = {**criteria, "warehouse": warehouses.current()}
+    try:
+        clauses = inventory_filters(criteria)
+    except ValueError as e:
+        raise BatchError(str(e))
+    if len(clauses) == 1:  # nothing but the warehouse scope
+        raise BatchError("Refusing to apply a batch to every item: the filter is empty.")
+    return db.session.execute(
+        select(StockItem.id).where(*clauses).order_by(StockItem.id)
+    ).scalars().all()
+
+
+# -------------------------------
+# Shared per-chunk plumbing
+# -------------------------------
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _state(ids):
+    return {
+        row["id"]: row
+        for row in db.session.execute(
+            select(*[getattr(StockItem, name) for name in STATE_COLUMNS])
+            .where(StockItem.id.in_(ids), *warehouses.scope_filters(warehouses.current()))
+        ).mappings()
+    }
+
+
+def _update_statement(fields, ruleset, shared=None):
+    """
+    UPDATE setting `fields` and re-deriving the computed columns.
+
+    With `shared` (a value dict) the new values are literals and the
+    statement is meant for `WHERE id IN (...)`; otherwise they are
+    bindparams new_<field>, with the row picked by bindparam _id.
+    """
+    table = StockItem.__table__
+
+    def incoming(name):
+        return literal(shared[name]) if shared is not None else bindparam(f"new_{name}")
+
+    def base(name):
+        return incoming(name) if name in fields else func.coalesce(table.c[name], 0)
+
+    def key(name):
+        return incoming(name) if name in fields else table.c[name]
+
+    values = {name: incoming(name) for name in fields}
+    values.update(derived_expressions(
+        base("inward_qty"), base("inward_unit_price"),
+        base("outward_qty"), base("outward_unit_price"),
+        ruleset=ruleset,
+        keys={"item_code": key("item_code"), "category": key("category"), "uom": key("uom")},
+    ))
+    values["version"] = table.c.version + 1
+    statement = update(table)
+    if shared is None:
+        statement = statement.where(table.c.id == bindparam("_id"))
+    # ordered so base columns are assigned before the derived ones (MySQL)
+    return statement.ordered_values(*values.items())
+
+
+def _after_write(before, after, delta):
+    for item_id, row in after.items():
+        summary.add_change(delta, summary.snapshot(before[item_id]), summary.snapshot(row))
+    ledger.record_changes([(before[item_id], row) for item_id, row in after.items()], "edit")
+    search_index.index_items(list(after.values()))
+
+
+# -------------------------------
+# Batch update / delete
+# -------------------------------
+def update_items(data):
+    """
+    Apply a batch PATCH and commit. Returns (counts, results).
+
+    Body forms:
+      {"ids": [1, 2], "set": {"uom": "kg"}}
+      {"filter": {"status": "low"}, "set": {"outward_qty": 0}}
+      {"items": [{"id": 1, "inward_qty": 5}, {"id": 2, "po_number": "PO-9"}]}
+    """
+    results, counts = [], {"updated": 0, "not_found": 0, "invalid": 0}
+    chunk_size = current_app.config.get("BULK_CHUNK_SIZE", 1000)
+    ruleset = thresholds.get_ruleset()
+    delta = summary.empty_delta()
+    touched = []
+
+    if "items" in data:
+        entries = data["items"]
+        if not isinstance(entries, list) or not entries:
+            raise BatchError("'items' must be a non-empty list of {\"id\": ..., field: value}.")
+        if len(entries) > MAX_IDS:
+            raise BatchError(f"At most {MAX_IDS} items per request.")
+        edits = {}
+        for entry in entries:
+            item_id = entry.get("id") if isinstance(entry, dict) else None
+            try:
+                item_id = int(item_id)
+            except (TypeError, ValueError):
+                results.append({"id": item_id, "status": "invalid", "error": "Each entry needs an integer 'id'."})
+                counts["invalid"] += 1
+                continue
+            try:
+                edits[item_id] = clean_values(entry)
+            except ValueError as e:
+                results.append({"id": item_id, "status": "invalid", "error": str(e)})
+                counts["invalid"] += 1
+        ids, shared = list(edits), None
+    else:
+        try:
+            shared = clean_values(data.get("set"), allow_item_code=False)
+        except ValueError as e:
+            raise BatchError(str(e))
+        ids, edits = resolve_targets(data), None
+
+    for chunk in _chunks(ids, chunk_size):
+        before = _state(chunk)
+        found = [item_id for item_id in chunk if item_id in before]
+        for item_id in chunk:
+            if item_id not in before:
+                results.append({"id": item_id, "status": "not_found"})
+                counts["not_found"] += 1
+        if not found:
+            continue
+
+        if shared is not None:
+            db.session.execute(
+                _update_statement(set(shared), ruleset, shared=shared)
+                .where(StockItem.__table__.c.id.in_(found))
+            )
+        else:
+            groups = {}
+            for item_id in found:
+                groups.setdefault(frozenset(edits[item_id]), []).append(item_id)
+            for fields, group in groups.items():
+                db.session.execute(
+                    _update_statement(fields, ruleset),
+                    [
+                        {"_id": item_id, **{f"new_{name}": edits[item_id][name] for name in fields}}
+                        for item_id in group
+                    ],
+                )
+
+        _after_write(before, _state(found), delta)
+        touched.extend(found)
+        results.extend({"id": item_id, "status": "updated"} for item_id in found)
+        counts["updated"] += len(found)
+
+    summary.apply_delta(delta)
+    changes.record("updated", touched)
+    db.session.commit()
+    return counts, results
+
+
+def delete_items(data):
+    """Apply a batch DELETE ({"ids": [...]} or {"filter": {...}}) and commit."""
+    results, counts = [], {"deleted": 0, "not_found": 0}
+    chunk_size = current_app.config.get("BULK_CHUNK_SIZE", 1000)
+    delta = summary.empty_delta()
+    removed = []
+
+    for chunk in _chunks(resolve_targets(data), chunk_size):
+        before = {
+            row["id"]: row
+            for row in db.session.execute(
+                select(StockItem.id, StockItem.alarm_status, StockItem.inward_total_price)
+                .where(StockItem.id.in_(chunk), *warehouses.scope_filters(warehouses.current()))
+            ).mappings()
+        }
+        found = [item_id for item_id in chunk if item_id in before]
+        for item_id in chunk:
+            if item_id not in before:
+                results.append({"id": item_id, "status": "not_found"})
+                counts["not_found"] += 1
+        if not found:
+            continue
+
+        search_index.remove_items(found)
+        ledger.remove_items(found)
+        db.session.execute(delete(StockItem.__table__).where(StockItem.__table__.c.id.in_(found)))
+        for item_id in found:
+            summary.add_change(delta, summary.snapshot(before[item_id]), None)
+        removed.extend(found)
+        results.extend({"id": item_id, "status": "deleted"} for item_id in found)
+        counts["deleted"] += len(found)
+
+    summary.apply_delta(delta)
+    changes.record("deleted", removed)
+    db.session.commit()
+    return counts, results
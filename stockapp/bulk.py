@@ -0,0 +1,472 @@
+"""
+Streaming bulk ingestion for /api/add.
+
+A JSON array (or NDJSON) request body is parsed incrementally from the
+request stream, validated and computed a chunk at a time, and written with
+Core executemany INSERTs, one commit per chunk. Memory stays bounded by
+the chunk size rather than by the size of the upload, and every row gets
+its own result: inserted, duplicate or invalid.
+"""
+import codecs
+import json
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from . import batch, changes, db, ledger, summary, thresholds, warehouses
+from . import search as search_index
+from .models import StockItem, derived_expressions
+
+READ_SIZE = 64 * 1024
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl")
+
+TEXT_FIELDS = (
+    "item_description", "inward_invoice_no", "uom", "category", "outward_invoice_no",
+    "eway_bill_number", "vehicle_number", "po_number",
+)
+NUMERIC_FIELDS = ("inward_qty", "inward_unit_price", "outward_qty", "outward_unit_price")
+DATE_FIELDS = ("inward_date", "outward_date")
+UPSERT_FIELDS = ("item_code",) + TEXT_FIELDS + NUMERIC_FIELDS + DATE_FIELDS
+
+# String column limits, checked up front so one long value can't fail a chunk
+MAX_LENGTHS = {
+    field: StockItem.__table__.c[field].type.length
+    for field in ("item_code",) + TEXT_FIELDS
+}
+
+
+class PayloadError(ValueError):
+    """The request body is not valid JSON / NDJSON."""
+
+
+# -------------------------------
+# Incremental body parsing
+# -------------------------------
+def _chunks(stream):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        text = decoder.decode(data)
+        if text:
+            yield text
+
+
+def iter_json_array(first, chunks):
+    """Yield the elements of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buf, pos = first[first.index("[") + 1:], 0
+    expect_value, seen_value = True, False
+
+    def fill():
+        nonlocal buf, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buf, pos = buf[pos:] + chunk, 0
+        return True
+
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos >= len(buf):
+            if not fill():
+                raise PayloadError("Unexpected end of JSON array.")
+            continue
+
+        char = buf[pos]
+        if char == "]":
+            if expect_value and seen_value:
+                raise PayloadError("Malformed JSON array.")
+            return
+        if char == ",":
+            if expect_value:
+                raise PayloadError("Malformed JSON array.")
+            expect_value = True
+            pos += 1
+            continue
+        if not expect_value:
+            raise PayloadError("Malformed JSON array.")
+
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not fill():
+                    raise PayloadError("Invalid JSON payload.")
+                continue
+            # a bare number at the end of the buffer may continue in the next chunk
+            if end == len(buf) and not isinstance(value, (dict, list, str)) and fill():
+                continue
+            break
+
+        yield value
+        pos = end
+        expect_value, seen_value = False, True
+
+
+def iter_ndjson(first, chunks):
+    """Yield one decoded object per non-blank line."""
+    buf = first
+    while True:
+        lines = buf.split("\n")
+        buf = lines.pop()
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    raise PayloadError("Invalid NDJSON line.")
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        buf += chunk
+    if buf.strip():
+        try:
+            yield json.loads(buf)
+        except json.JSONDecodeError:
+            raise PayloadError("Invalid NDJSON line.")
+
+
+def read_payload(req):
+    """
+    Sniff the request body without buffering all of it.
+
+    Returns ("list", iterator) for a JSON array or NDJSON body, ("dict", data)
+    for a single JSON object, ("other", data) for any other JSON value and
+    raises PayloadError when the body is not JSON at all.
+    """
+    chunks = _chunks(req.stream)
+    first = ""
+    for chunk in chunks:
+        first += chunk
+        if first.strip():
+            break
+    first = first.lstrip("\ufeff")
+
+    if req.mimetype in NDJSON_MIMETYPES:
+        return "list", iter_ndjson(first, chunks)
+    if not req.is_json:
+        raise PayloadError("Invalid JSON payload.")
+
+    if first.lstrip()[:1] == "[":
+        return "list", iter_json_array(first, chunks)
+    try:
+        data = json.loads(first + "".join(chunks))
+    except json.JSONDecodeError:
+        raise PayloadError("Invalid JSON payload.")
+    return ("dict" if isinstance(data, dict) else "other"), data
+
+
+# -------------------------------
+# Validation & derived fields
+# -------------------------------
+def _parse_date(val):
+    if isinstance(val, datetime):
+        return val.date()
+    if isinstance(val, date):
+        return val
+    if not val or not isinstance(val, str):
+        return None
+    try:
+        return datetime.strptime(val, "%Y-%m-%d").date()
+    except Exception:
+        return None
+
+
+def normalize_entry(entry):
+    """Turn one payload entry into a column dict, or raise ValueError."""
+    if not isinstance(entry, dict):
+        raise ValueError("Entry must be an object.")
+
+    item_code = (entry.get("item_code") or "")
+    item_code = item_code.strip() if isinstance(item_code, str) else str(item_code)
+    if not item_code:
+        raise ValueError("Each entry must have an 'item_code'.")
+
+    row = {"item_code": item_code}
+    for field in TEXT_FIELDS:
+        value = entry.get(field)
+        row[field] = None if value is None else str(value)
+    for field in NUMERIC_FIELDS:
+        try:
+            row[field] = float(entry.get(field) or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{field}' must be a number.")
+    for field in DATE_FIELDS:
+        row[field] = _parse_date(entry.get(field))
+    if row["inward_date"] is None:
+        row["inward_date"] = date.today()
+
+    for field, length in MAX_LENGTHS.items():
+        value = row[field]
+        if value is not None and len(value) > length:
+            raise ValueError(f"'{field}' is longer than {length} characters.")
+    return row
+
+
+# -------------------------------
+# Chunked writer
+# -------------------------------
+def upsert_statement(dialect_name, fields, ruleset=None, item_codes=None):
+    """
+    Build a native INSERT ... ON DUPLICATE KEY UPDATE / ON CONFLICT on
+    (warehouse, item_code) for on_conflict="update".
+
+    Only the columns named in `fields` are taken from the incoming row;
+    totals, balance and alarm status are re-derived inside the same
+    statement from the merged quantities, with alarm status following the
+    threshold `ruleset` (per-item rules limited to `item_codes`).
+    """
+    table = StockItem.__table__
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise ValueError(f"on_conflict is not supported on {dialect_name}.")
+
+    stmt = dialect_insert(table)
+    incoming = stmt.inserted if dialect_name == "mysql" else stmt.excluded
+
+    def base(name):
+        return incoming[name] if name in fields else func.coalesce(table.c[name], 0)
+
+    values = {
+        name: incoming[name]
+        for name in UPSERT_FIELDS
+        if name in fields and name != "item_code"
+    }
+    def key(name):
+        return incoming[name] if name in fields else table.c[name]
+
+    values.update(derived_expressions(
+        base("inward_qty"), base("inward_unit_price"),
+        base("outward_qty"), base("outward_unit_price"),
+        ruleset=ruleset,
+        keys={
+            "item_code": incoming.item_code,
+            "category": key("category"),
+            "uom": key("uom"),
+            "item_codes": item_codes,
+        },
+    ))
+    values["version"] = table.c.version + 1
+
+    if dialect_name == "mysql":
+        # ordered so base columns are assigned before the derived ones
+        return stmt.on_duplicate_key_update(list(values.items()))
+    return stmt.on_conflict_do_update(index_elements=["warehouse", "item_code"], set_=values)
+
+
+class BulkImporter:
+    """
+    Insert rows chunk by chunk and keep per-row results.
+
+    Rows go into `warehouse` (default: the request's). `on_conflict`
+    decides what happens to rows whose item_code already exists there:
+    None reports them as duplicates, "skip" leaves the stored row
+    alone and "update" merges the supplied fields into it (native upsert).
+    Repeated item_codes are caught within a chunk; across chunks the
+    stored row decides, so memory does not grow with the upload.
+    `report_all=False` keeps only non-inserted rows in `results` so the
+    response stays small for very large uploads; the counters cover all rows.
+    `max_results` caps `results` further, and `progress(importer, rows_seen)`
+    is called after every committed chunk.
+    """
+
+    def __init__(self, chunk_size=None, report_all=False, on_conflict=None,
+                 max_results=None, progress=None, warehouse=None):
+        self.warehouse = warehouse or warehouses.current() or warehouses.default_warehouse()
+        self.chunk_size = chunk_size or current_app.config.get("BULK_CHUNK_SIZE", 1000)
+        self.report_all = report_all
+        self.on_conflict = on_conflict
+        self.max_results = max_results
+        self.progress = progress
+        self.counts = {"inserted": 0, "updated": 0, "skipped": 0, "duplicate": 0, "invalid": 0}
+        self.results = []
+        self.ruleset = thresholds.get_ruleset()
+
+    def _result(self, index, item_code, status, error=None):
+        self.counts[status] += 1
+        if self.max_results is not None and len(self.results) >= self.max_results:
+            return
+        if status != "inserted" or self.report_all:
+            result = {"index": index, "item_code": item_code, "status": status}
+            if error:
+                result["error"] = error
+            self.results.append(result)
+
+    def run(self, entries):
+        """Consume an iterable of payload entries; returns the number of rows seen."""
+        pending, total = [], 0
+        for index, entry in enumerate(entries):
+            total += 1
+            try:
+                row = normalize_entry(entry)
+            except ValueError as e:
+                code = entry.get("item_code") if isinstance(entry, dict) else None
+                self._result(index, code, "invalid", str(e))
+                continue
+            row["warehouse"] = self.warehouse
+            pending.append((index, row, frozenset(entry).intersection(UPSERT_FIELDS)))
+            if len(pending) >= self.chunk_size:
+                self.write_chunk(pending)
+                pending = []
+                if self.progress is not None:
+                    self.progress(self, total)
+        if pending:
+            self.write_chunk(pending)
+        if self.progress is not None:
+            self.progress(self, total)
+        return total
+
+    def _insert(self, entries, clashed=None):
+        """
+        Plain INSERT; returns the (index, row, fields) entries that went in.
+
+        Rows another writer inserted first are appended to `clashed` when
+        given (on_conflict="update" updates them instead), else reported
+        as skipped with on_conflict="skip" and as duplicates otherwise.
+        """
+        try:
+            db.session.execute(insert(StockItem.__table__), [row for _, row, _ in entries])
+            return entries
+        except IntegrityError:
+            # Lost a race with another writer: retry row by row to find the clash
+            db.session.rollback()
+            inserted = []
+            for entry in entries:
+                index, row, _ = entry
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(StockItem.__table__), [row])
+                    inserted.append(entry)
+                except IntegrityError:
+                    if clashed is not None:
+                        clashed.append(entry)
+                    elif self.on_conflict == "skip":
+                        self._result(index, row["item_code"], "skipped")
+                    else:
+                        self._result(index, row["item_code"], "duplicate", "Duplicate item_code. Must be unique.")
+            return inserted
+
+    def _upsert(self, entries):
+        """Native upsert, one executemany per distinct set of supplied fields."""
+        dialect_name = db.session.get_bind().dialect.name
+        groups = {}
+        for _, row, fields in entries:
+            groups.setdefault(fields, []).append(row)
+        for fields, rows in groups.items():
+            statement = upsert_statement(
+                dialect_name, fields,
+                ruleset=self.ruleset, item_codes={row["item_code"] for row in rows},
+            )
+            db.session.execute(statement, rows)
+
+    def _existing(self, codes, lock=False):
+        """The stored state (summary and ledger columns) of `codes` in the warehouse, by item_code."""
+        if not codes:
+            return {}
+        query = (
+            select(StockItem.item_code, StockItem.alarm_status, StockItem.inward_total_price,
+                   StockItem.inward_qty, StockItem.outward_qty)
+            .where(StockItem.warehouse == self.warehouse, StockItem.item_code.in_(codes))
+        )
+        if lock:
+            query = query.with_for_update()
+        return {row["item_code"]: row for row in db.session.execute(query).mappings()}
+
+    def write_chunk(self, pending):
+        """Write one chunk of (index, row, supplied_fields) entries and commit it."""
+        fresh, seen = [], set()
+        for entry in pending:
+            index, row, _ = entry
+            if row["item_code"] in seen:
+                self._result(index, row["item_code"], "duplicate", "Duplicate item_code in request.")
+            else:
+                seen.add(row["item_code"])
+                fresh.append(entry)
+
+        existing = self._existing([row["item_code"] for _, row, _ in fresh])
+
+        new_rows, updates = [], []
+        for entry in fresh:
+            index, row, _ = entry
+            if row["item_code"] not in existing:
+                new_rows.append(entry)
+            elif self.on_conflict == "update":
+                updates.append(entry)
+            elif self.on_conflict == "skip":
+                self._result(index, row["item_code"], "skipped")
+            else:
+                self._result(index, row["item_code"], "duplicate", "Duplicate item_code. Must be unique.")
+        if not new_rows and not updates:
+            return
+
+        batch.compute_rows([row for _, row, _ in new_rows + updates], ruleset=self.ruleset)
+        if self.on_conflict == "update":
+            # Classified by what the statements did, not by the read above:
+            # a row another writer inserted meanwhile fails the INSERT and
+            # is updated, one it deleted is re-inserted by the upsert. The
+            # updated rows' before-state is re-read under the row lock.
+            clashed = []
+            new_rows = self._insert(new_rows, clashed)
+            updates += clashed
+            existing = self._existing([row["item_code"] for _, row, _ in updates], lock=True)
+            gone = [entry for entry in updates if entry[1]["item_code"] not in existing]
+            updates = [entry for entry in updates if entry[1]["item_code"] in existing]
+            self._upsert(updates + gone)
+            new_rows += gone
+        else:
+            # "skip" inserts plainly too, so a row that lost a race is
+            # reported as skipped rather than counted as inserted
+            new_rows = self._insert(new_rows)
+
+        written = new_rows + updates
+        if written:
+            after_columns = {
+                "id", "inward_total_price", *search_index.SEARCH_COLUMNS, *ledger.LEDGER_COLUMNS,
+            }
+            after = {
+                row["item_code"]: row
+                for row in db.session.execute(
+                    select(*[getattr(StockItem, name) for name in sorted(after_columns)])
+                    .where(
+                        StockItem.warehouse == self.warehouse,
+                        StockItem.item_code.in_([row["item_code"] for _, row, _ in written]),
+                    )
+                ).mappings()
+            }
+            delta = summary.empty_delta()
+            for _, row, _ in new_rows:
+                summary.add_change(delta, None, summary.snapshot(after.get(row["item_code"])))
+            for _, row, _ in updates:
+                summary.add_change(
+                    delta,
+                    summary.snapshot(existing[row["item_code"]]),
+                    summary.snapshot(after.get(row["item_code"])),
+                )
+            summary.apply_delta(delta, self.warehouse)
+            created = [after[row["item_code"]] for _, row, _ in new_rows if row["item_code"] in after]
+            changed = [after[row["item_code"]] for _, row, _ in updates if row["item_code"] in after]
+            ledger.record_changes([(None, row) for row in created], "opening", is_new=True)
+            ledger.record_changes([(existing[row["item_code"]], row) for row in changed], "edit")
+            search_index.index_items(created, is_new=True)
+            search_index.index_items(changed)
+            changes.record("created", [row["id"] for row in created], warehouse=self.warehouse)
+            changes.record("updated", [row["id"] for row in changed], warehouse=self.warehouse)
+        db.session.commit()
+
+        for index, row, _ in new_rows:
+            self._result(index, row["item_code"], "inserted")
+        for index, row, _ in updates:
+            self._result(index, row["item_code"], "updated")
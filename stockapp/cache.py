@@ -0,0 +1,250 @@
+"""
+Server-side response cache for the read endpoints.
+
+Responses are cached in an in-process LRU+TTL store in front of a
+shared store (Redis, or "memory" for a single process and tests) that
+holds the entries and the "generation" counters cache keys carry for
+the data they depend on:
+- the metrics, inventory pages or one item.
+A committed write bumps only the generations it touched, so stale
+entries simply stop being addressed. The counters must be seen by every
+worker for that to hold, so without CACHE_BACKEND nothing is cached: a
+write in one worker could not invalidate another's entries. Every
+response still carries an ETag, and an `If-None-Match` that still
+matches gets an empty 304.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+from .changes import items_changed
+
+# Above this many touched ids a write bumps all item generations at once
+MAX_PRECISE_IDS = 1000
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            expires = time.monotonic() + ttl if ttl else None
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MemorySharedBackend(LRUCache):
+    """
+    Local stand-in for a shared backend (tests, single-process setups).
+
+    Same interface as RedisBackend; generations are never evicted.
+    """
+
+    def __init__(self, max_entries=100_000):
+        super().__init__(max_entries)
+        self._counters = {}
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+
+class RedisBackend:
+    """Shared backend on Redis (requires the `redis` package)."""
+
+    def __init__(self, url, prefix="stockapp:"):
+        import pickle
+
+        import redis
+
+        self._pickle = pickle
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return None if raw is None else self._pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._prefix + key, self._pickle.dumps(value), ex=ttl or None)
+
+    def incr(self, key):
+        return self._client.incr(self._prefix + "gen:" + key)
+
+    def get_counter(self, key):
+        return int(self._client.get(self._prefix + "gen:" + key) or 0)
+
+
+class ResponseCache:
+    """Two-level response cache plus the generation counters it keys on."""
+
+    def __init__(self, app=None):
+        self.local = None
+        self.shared = None
+        self.ttl = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get("CACHE_TTL", 30)
+        self.local = LRUCache(app.config.get("CACHE_MAX_ENTRIES", 1024))
+
+        backend = app.config.get("CACHE_BACKEND") or ""
+        if backend == "memory":
+            self.shared = MemorySharedBackend()
+        elif backend.startswith(("redis://", "rediss://", "unix://")):
+            self.shared = RedisBackend(backend)
+        else:
+            self.shared = None
+
+        app.extensions["stockapp_cache"] = self
+        items_changed.connect(self._on_items_changed, sender=app, weak=False)
+
+    # -------------------------------
+    # Generations
+    # -------------------------------
+    def generation(self, name):
+        return self.shared.get_counter(name)
+
+    def bump(self, *names):
+        if self.shared is None:
+            return
+        for name in names:
+            self.shared.incr(name)
+
+    def invalidate(self, item_ids=None):
+        """Invalidate inventory pages, metrics and the given items (None = all items)."""
+        self.bump("inventory", "metrics")
+        if item_ids is None or len(item_ids) > MAX_PRECISE_IDS:
+            self.bump("items")
+        else:
+            self.bump(*[f"item:{item_id}" for item_id in set(item_ids)])
+
+    def _on_items_changed(self, sender, changes=(), **extra):
+        ids = []
+        for change in changes:
+            ids.extend(change["ids"])
+        self.invalidate(ids)
+
+    # -------------------------------
+    # Entries
+    # -------------------------------
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value, self.ttl)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value, self.ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, self.ttl)
+
+
+def active_cache(app):
+    """The app's ResponseCache when caching is on (CACHE_ENABLED with a CACHE_BACKEND), else None."""
+    cache = app.extensions.get("stockapp_cache")
+    if cache is None or cache.shared is None or not app.config.get("CACHE_ENABLED", True):
+        return None
+    return cache
+
+
+def _normalized_args(args):
+    """Query args as a stable string: sorted, stripped, empty values dropped."""
+    pairs = []
+    for key in sorted(args):
+        for value in args.getlist(key):
+            value = value.strip()
+            if key in ("status", "search"):
+                value = value.lower()
+            if value:
+                pairs.append(f"{key}={value}")
+    return "&".join(pairs)
+
+
+def _etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def response_key(cache, scope, path, args, item_id=None):
+    """Cache key of a response: scope, current generations, path and normalized args."""
+    if scope == "item":
+        generations = (cache.generation("items"), cache.generation(f"item:{item_id}"))
+    else:
+        generations = (cache.generation(scope),)
+    return "resp:{}:{}:{}?{}".format(
+        scope, ".".join(map(str, generations)), path, _normalized_args(args)
+    )
+
+
+def cached_response(scope):
+    """
+    Cache a JSON view's 200 responses and answer conditional GETs.
+
+    scope is "metrics", "inventory" or "item"; for "item" the view must
+    take an `item_id` argument. An ETag the view sets itself (the item
+    version) is kept; otherwise the ETag is a hash of the body.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = active_cache(current_app)
+            if cache is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    if not response.get_etag()[0]:
+                        response.set_etag(_etag(response.get_data()))
+                    return response.make_conditional(request)
+                return response
+
+            key = response_key(cache, scope, request.path, request.args, kwargs.get("item_id"))
+
+            hit = cache.get(key)
+            if hit is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                hit = (body, response.get_etag()[0] or _etag(body), response.mimetype)
+                cache.set(key, hit)
+
+            body, etag, mimetype = hit
+            response = current_app.response_class(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "no-cache"
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
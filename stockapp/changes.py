@@ -0,0 +1,73 @@
+"""
+Post-commit change notifications.
+
+Write paths call record() while their transaction is open; the changes
+are held on the session and only announced through the `items_changed`
+signal once the transaction commits (and dropped on rollback). Caches and
+other listeners therefore never react to writes that did not happen.
+"""
+from blinker import Namespace
+from flask import current_app
+from sqlalchemy import event
+
+from . import db, warehouses
+
+_signals = Namespace()
+
+# sender: the app; kwargs: changes=[{"action", "ids", "rows", "warehouse"}, ...] and
+# metrics={warehouse: {counter: delta}} (summed dashboard deltas, may be empty)
+items_changed = _signals.signal("items-changed")
+
+_KEY = "stockapp_changes"
+_METRICS_KEY = "stockapp_metrics_delta"
+
+
+def record(action, item_ids, rows=None, warehouse=None):
+    """
+    Stage a change for announcement after commit.
+
+    action is "created", "updated" or "deleted"; `rows` optionally carries
+    the serialized items so listeners need not query them again. The
+    items are in `warehouse` (default: the request's).
+    """
+    item_ids = [item_id for item_id in item_ids if item_id is not None]
+    if not item_ids:
+        return
+    db.session.info.setdefault(_KEY, []).append({
+        "action": action, "ids": item_ids, "rows": rows,
+        "warehouse": warehouse or warehouses.current(),
+    })
+
+
+def record_metrics(delta, warehouse):
+    """Stage a warehouse's dashboard counter delta (see summary.add_change) for announcement."""
+    staged = db.session.info.setdefault(_METRICS_KEY, {}).setdefault(warehouse, {})
+    for key, value in delta.items():
+        if value:
+            staged[key] = staged.get(key, 0) + value
+
+
+def staged(session):
+    """The changes staged on `session` so far (read by the sync journal before commit)."""
+    return session.info.get(_KEY, [])
+
+
+def _announce(session):
+    pending = session.info.pop(_KEY, None)
+    metrics = session.info.pop(_METRICS_KEY, None)
+    if pending:
+        items_changed.send(
+            current_app._get_current_object(), changes=pending, metrics=metrics or {}
+        )
+
+
+def _discard(session):
+    session.info.pop(_KEY, None)
+    session.info.pop(_METRICS_KEY, None)
+
+
+def init_app(app):
+    # db.session is shared by every app, so hook it only once
+    if not event.contains(db.session, "after_commit", _announce):
+        event.listen(db.session, "after_commit", _announce)
+        event.listen(db.session, "after_rollback", _discard)
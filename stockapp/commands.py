@@ -0,0 +1,126 @@
+"""Flask CLI maintenance commands (`flask <command>`)."""
+import click
+from flask import current_app
+
+from . import db
+
+
+class MigrateCommands(click.Command):
+    """
+    `flask db ...`: stands in for Flask-Migrate's command group until used.
+
+    Flask-Migrate imports Alembic, which costs more than the rest of the
+    app put together, so it is initialized only when a db command runs.
+    """
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as migrate_group
+
+        # FlaskGroup has pushed the app context by now
+        app = current_app._get_current_object()
+        if "migrate" not in app.extensions:
+            Migrate(app, db)
+        return migrate_group.make_context(info_name, args, parent=parent, **extra)
+
+
+def register_commands(app):
+    app.cli.add_command(MigrateCommands("db", help="Perform database migrations (Flask-Migrate)."))
+
+    @app.cli.command("rebuild-summary")
+    def rebuild_summary_command():
+        """Recompute the dashboard summary table from stock_items."""
+        from .summary import rebuild_summary
+
+        metrics = rebuild_summary()
+        click.echo(f"Summary rebuilt: {metrics}")
+
+    @app.cli.command("rebuild-analytics")
+    def rebuild_analytics_command():
+        """Recompute the daily/weekly/monthly stock_rollups from the ledger."""
+        from .analytics import rebuild_rollups
+
+        written = rebuild_rollups()
+        click.echo(f"Analytics rebuilt: {written} rollup rows.")
+
+    @app.cli.command("forecast-stock")
+    @click.option("--as-of", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+                  help="Forecast date (default: today).")
+    @click.option("--chunk-size", default=None, type=int, help="Items per chunk (default: FORECAST_CHUNK_SIZE).")
+    def forecast_stock_command(as_of, chunk_size):
+        """Recompute every item's consumption rate and stockout forecast (run daily)."""
+        from .forecast import recompute_forecasts
+        from .jobs import run_inline
+
+        job = run_inline(
+            "forecast", recompute_forecasts, as_of=as_of.date() if as_of else None, chunk_size=chunk_size
+        )
+        click.echo(f"Forecast {job.changed} items.")
+
+    @app.cli.command("reindex-search")
+    @click.option("--chunk-size", default=1000, show_default=True)
+    def reindex_search_command(chunk_size):
+        """Rebuild the trigram search index from stock_items."""
+        from .search import rebuild_index
+
+        indexed = rebuild_index(chunk_size=chunk_size)
+        click.echo(f"Indexed {indexed} items.")
+
+    @app.cli.command("recompute-derived")
+    @click.option("--chunk-size", default=5000, show_default=True)
+    @click.option("--all", "check_all", is_flag=True, help="Check every row, not only drifted ones.")
+    def recompute_derived_command(chunk_size, check_all):
+        """Recompute stored totals, balance and alarm status for drifted rows."""
+        from .jobs import run_inline
+        from .recompute import recompute_derived
+
+        job = run_inline(
+            "recompute", recompute_derived, chunk_size=chunk_size, only_drifted=not check_all
+        )
+        click.echo(f"Examined {job.processed} rows, fixed {job.changed}.")
+
+    @app.cli.command("snapshot-balances")
+    @click.option("--as-of", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+                  help="Snapshot date (default: today).")
+    @click.option("--chunk-size", default=1000, show_default=True)
+    def snapshot_balances_command(as_of, chunk_size):
+        """Write per-item ledger balance snapshots (run daily, e.g. from cron)."""
+        from .jobs import run_inline
+        from .ledger import take_snapshots
+
+        job = run_inline(
+            "snapshot", take_snapshots, as_of=as_of.date() if as_of else None, chunk_size=chunk_size
+        )
+        click.echo(f"Snapshotted {job.changed} of {job.processed} items.")
+
+    @app.cli.command("sync")
+    @click.option("--loop", is_flag=True,
+                  help="Keep syncing every SYNC_INTERVAL_SECONDS (a sync process beside the web server).")
+    def sync_command(loop):
+        """Push pending local changes to SYNC_CENTRAL_URL and pull the central ones (one round)."""
+        from .jobs import run_inline
+        from .sync import Syncer, run_cycle
+
+        if not current_app.config.get("SYNC_CENTRAL_URL"):
+            raise click.ClickException("No central server configured. Set SYNC_CENTRAL_URL.")
+        if loop:
+            syncer = Syncer(current_app._get_current_object())
+            click.echo(f"Syncing with {current_app.config['SYNC_CENTRAL_URL']} every {syncer.interval}s.")
+            syncer.run()  # until interrupted
+        job = run_inline("sync", run_cycle)
+        click.echo(f"Pushed {job.processed} items, applied {job.changed} central changes.")
+
+    @app.cli.command("compact-sync-journal")
+    @click.option("--backfill", is_flag=True, help="First journal every existing item (enabling sync on a live server).")
+    @click.option("--chunk-size", default=1000, show_default=True)
+    def compact_sync_journal_command(backfill, chunk_size):
+        """
+        Drop superseded sync journal entries, keeping the newest per item (central server).
+
+        Runs every SYNC_COMPACT_INTERVAL_SECONDS in the server itself; with
+        that set to 0, schedule this instead, e.g. hourly from cron.
+        """
+        from .sync import compact_journal
+
+        removed = compact_journal(backfill=backfill, chunk_size=chunk_size)
+        click.echo(f"Removed {removed} superseded journal entries.")
@@ -0,0 +1,263 @@
+"""
+Database engine options, read-replica routing and pool statistics.
+
+configure() turns the DB_* settings into engine options for the primary
+and one `replica_<n>` bind per DATABASE_REPLICA_URLS entry; it must run
+before db.init_app(). Views decorated with @read_replica send their
+plain SELECTs to a replica (round-robin, see session.RoutingSession):
+
+- a replica whose connection check fails is skipped for
+  REPLICA_RETRY_SECONDS and the request reads from the primary;
+- for REPLICA_LAG_SECONDS after this process commits an item change,
+  reads stay on the primary so a client sees its own write. Writes made
+  by other workers can still be read stale from a lagging replica (and
+  cached) until the next change or CACHE_TTL.
+
+Every engine's pool reports connects, checkouts and its peak number of
+checked-out connections to pool_stats() (GET /api/stats/pool), so the
+pool can be sized from observed saturation rather than guessed.
+
+SQLite connections get the SQLITE_* pragmas as they open: WAL (readers
+never wait for the writer), synchronous=NORMAL, a busy timeout instead
+of instant "database is locked" errors, a bigger page cache and mmap'd
+reads. EMBEDDED_MODE swaps the primary for the local SQLite file of an
+offline terminal (see sync.py) and drops the replicas.
+"""
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+
+from . import db
+from .changes import items_changed
+
+REPLICA_PREFIX = "replica_"
+
+
+def engine_options(url, config):
+    """create_engine() pool options for `url` from the DB_* settings."""
+    options = {
+        "pool_pre_ping": config.get("DB_POOL_PRE_PING", True),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),
+    }
+    # SQLite has no server connections to pool (and in-memory uses StaticPool)
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=config.get("DB_POOL_SIZE", 10),
+            max_overflow=config.get("DB_MAX_OVERFLOW", 20),
+            pool_timeout=config.get("DB_POOL_TIMEOUT", 30),
+        )
+    return options
+
+
+def replica_urls(config):
+    return [url.strip() for url in (config.get("DATABASE_REPLICA_URLS") or "").split(",") if url.strip()]
+
+
+def configure(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS and the replica binds (explicit settings win)."""
+    config = app.config
+    if config.get("EMBEDDED_MODE"):
+        # a relative path lands in the instance folder (Flask-SQLAlchemy)
+        config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{config['EMBEDDED_DATABASE_PATH']}"
+        config["DATABASE_REPLICA_URLS"] = ""
+    config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **engine_options(config["SQLALCHEMY_DATABASE_URI"], config),
+        **(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}),
+    }
+    binds = dict(config.get("SQLALCHEMY_BINDS") or {})
+    for index, url in enumerate(replica_urls(config)):
+        binds.setdefault(f"{REPLICA_PREFIX}{index}", {"url": url, **engine_options(url, config)})
+    config["SQLALCHEMY_BINDS"] = binds
+
+
+def sqlite_pragmas(config):
+    return (
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        # negative: KiB rather than pages
+        f"PRAGMA cache_size={-1024 * int(config.get('SQLITE_CACHE_MB', 64))}",
+        f"PRAGMA mmap_size={1024 * 1024 * int(config.get('SQLITE_MMAP_MB', 256))}",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+
+def _tune_sqlite(engine, pragmas):
+    def on_connect(dbapi_connection, record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            # an in-memory database keeps journal_mode=memory; that is fine
+            cursor.execute(pragma)
+        cursor.close()
+
+    event.listen(engine, "connect", on_connect)
+
+
+# -------------------------------
+# Pool statistics
+# -------------------------------
+class PoolStats:
+    """Counters fed by one engine's pool events."""
+
+    def __init__(self, engine):
+        self.pool = engine.pool
+        self.connects = 0
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.invalidations = 0
+        self.peak_checked_out = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, record, proxy):
+        checked_out = self.pool.checkedout() if hasattr(self.pool, "checkedout") else 1
+        with self._lock:
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            if hasattr(self.pool, "size") and checked_out > self.pool.size():
+                self.overflow_checkouts += 1
+
+    def _on_invalidate(self, dbapi_connection, record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def as_dict(self):
+        pool = self.pool
+        stats = {"pool_class": type(pool).__name__}
+        if hasattr(pool, "size"):
+            stats.update(
+                size=pool.size(),
+                max_overflow=getattr(pool, "_max_overflow", 0),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+            )
+        with self._lock:
+            stats.update(
+                connects=self.connects,
+                checkouts=self.checkouts,
+                overflow_checkouts=self.overflow_checkouts,
+                invalidations=self.invalidations,
+                peak_checked_out=self.peak_checked_out,
+            )
+        return stats
+
+
+# -------------------------------
+# Replica routing
+# -------------------------------
+class ReplicaRouter:
+    """Round-robin over the healthy replica binds, with a read-your-writes window."""
+
+    def __init__(self, names, retry_seconds=30, lag_seconds=2):
+        self.names = list(names)
+        self.retry_seconds = retry_seconds
+        self.lag_seconds = lag_seconds
+        self._turn = itertools.count()
+        self._down_until = {}
+        self._last_write = float("-inf")
+        self._lock = threading.Lock()
+        self.counts = {"replica": 0, "primary": 0, "fallback": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def candidates(self):
+        """Healthy replicas in round-robin order; none right after a local write."""
+        now = time.monotonic()
+        if now - self._last_write < self.lag_seconds:
+            return []
+        with self._lock:
+            start = next(self._turn) % len(self.names)
+        order = self.names[start:] + self.names[:start]
+        return [name for name in order if self._down_until.get(name, 0) <= now]
+
+    def mark_down(self, name):
+        self._down_until[name] = time.monotonic() + self.retry_seconds
+
+    def _on_items_changed(self, sender, **extra):
+        self._last_write = time.monotonic()
+
+    def route(self, session):
+        """Point `session`'s reads at the first replica that answers, else leave it on the primary."""
+        for name in self.candidates():
+            engine = db.engines[name]
+            try:
+                # checks the connection out now (pre-ping), so a dead
+                # replica is caught here and not half-way through the view
+                session.connection(bind_arguments={"bind": engine})
+            except DBAPIError:
+                session.rollback()
+                self.mark_down(name)
+                self._count("fallback")
+                current_app.logger.warning("Read replica %s unavailable; using the primary.", name)
+                continue
+            session.info["replica"] = engine
+            self._count("replica")
+            return name
+        self._count("primary")
+        return None
+
+    def as_dict(self):
+        now = time.monotonic()
+        return {
+            "replicas": [
+                {"bind": name, "available": self._down_until.get(name, 0) <= now}
+                for name in self.names
+            ],
+            "reads": dict(self.counts),
+        }
+
+
+def read_replica(view):
+    """Serve a read-only view from a replica when one is configured and healthy."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        router = current_app.extensions.get("stockapp_replicas")
+        if router is not None and router.names:
+            router.route(db.session)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def pool_stats():
+    """Pool statistics per engine ("primary", "replica_0", ...) plus routing counts."""
+    stats = current_app.extensions.get("stockapp_pool_stats", {})
+    result = {"engines": {name: entry.as_dict() for name, entry in stats.items()}}
+    router = current_app.extensions.get("stockapp_replicas")
+    if router is not None:
+        result["routing"] = router.as_dict()
+    return result
+
+
+def init_app(app):
+    """Tune SQLite, attach pool counters to every engine and set up the replica router (after db.init_app)."""
+    with app.app_context():
+        engines = dict(db.engines)
+    pragmas = sqlite_pragmas(app.config)
+    for engine in engines.values():
+        if engine.dialect.name == "sqlite":
+            _tune_sqlite(engine, pragmas)
+    app.extensions["stockapp_pool_stats"] = {
+        "primary" if key is None else key: PoolStats(engine) for key, engine in engines.items()
+    }
+    router = ReplicaRouter(
+        sorted(key for key in engines if key and key.startswith(REPLICA_PREFIX)),
+        retry_seconds=app.config.get("REPLICA_RETRY_SECONDS", 30),
+        lag_seconds=app.config.get("REPLICA_LAG_SECONDS", 2),
+    )
+    app.extensions["stockapp_replicas"] = router
+    items_changed.connect(router._on_items_changed, sender=app, weak=False)
@@ -0,0 +1,190 @@
+"""
+Server-sent events change feed (/api/events).
+
+Committed writes (see changes.items_changed) are published as `items`
+events carrying the action, item ids and, for single-row writes, the
+serialized rows, plus a `metrics` event with the dashboard counter
+deltas of each warehouse written to (its "warehouse" key names it).
+Every event has an increasing id and the last EVENTS_REPLAY_SIZE
+events are kept in a ring buffer, so a client reconnecting with
+Last-Event-ID gets what it missed; if it fell too far behind it gets a
+`reset` event and reloads.
+
+Each subscriber is one long-lived response that mostly sleeps on a
+condition variable. Run gunicorn with cheap concurrency so it does not
+pin a worker per browser, e.g.
+    gunicorn -k gthread --threads 256 app:app
+or `-k gevent` where gevent is installed. With more than one worker
+process set EVENTS_BACKEND to a Redis URL: events are then numbered and
+fanned out through Redis so every worker sees every write.
+"""
+import json
+import os
+import threading
+from collections import deque
+
+from flask import current_app
+
+from .changes import items_changed
+
+CHANNEL = "stockapp:events"
+
+# Larger changes are announced as a `reset` instead of listing every id
+MAX_EVENT_IDS = 1000
+
+
+class Broadcaster:
+    """In-process event ring buffer that subscribers block on."""
+
+    def __init__(self, replay_size=1000, heartbeat=15):
+        self.heartbeat = heartbeat
+        self._events = deque(maxlen=replay_size)
+        self._last_id = 0
+        self._condition = threading.Condition()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def start_at(self, event_id):
+        """Continue numbering after event_id (events before it are not replayable)."""
+        with self._condition:
+            self._last_id = max(self._last_id, event_id)
+
+    def publish(self, event, data):
+        """Number and buffer an event originating in this process."""
+        with self._condition:
+            self._append(self._last_id + 1, event, data)
+
+    def receive(self, event_id, event, data):
+        """Buffer an event numbered elsewhere (shared backend relay)."""
+        with self._condition:
+            if event_id > self._last_id:
+                self._append(event_id, event, data)
+
+    def _append(self, event_id, event, data):
+        self._events.append((event_id, event, data))
+        self._last_id = event_id
+        self._condition.notify_all()
+
+    def _since(self, last_id):
+        """Buffered events after last_id, or None when some were evicted."""
+        if self._events and last_id < self._events[0][0] - 1:
+            return None
+        return [entry for entry in self._events if entry[0] > last_id]
+
+    def stream(self, last_id=None):
+        """Yield SSE frames forever, starting after last_id (None = from now)."""
+        yield "retry: 3000\n\n"
+        with self._condition:
+            if last_id is None:
+                last_id = self._last_id
+            # an id from before a restart cannot be replayed either
+            pending = self._since(last_id) if last_id <= self._last_id else None
+
+        while True:
+            if pending is None:
+                # too far behind to replay; the client reloads and continues from here
+                with self._condition:
+                    last_id = self._last_id
+                pending = []
+                yield format_event(last_id, "reset", "{}")
+            for event_id, event, data in pending:
+                last_id = event_id
+                yield format_event(event_id, event, data)
+
+            with self._condition:
+                if self._last_id == last_id:
+                    self._condition.wait(self.heartbeat)
+                pending = self._since(last_id)
+            if pending == []:
+                yield ": keep-alive\n\n"
+
+
+def format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+class RedisRelay:
+    """
+    Cross-process fan-out: number events with INCR, deliver via PUBLISH.
+
+    A daemon thread per process feeds every published event (including
+    its own) into the local Broadcaster. It starts on first use rather
+    than with the app, so building the app makes no Redis round trip and
+    a worker forked from a preloaded master starts its own listener
+    (threads do not survive fork). Requires the `redis` package.
+    """
+
+    def __init__(self, url, broadcaster):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._broadcaster = broadcaster
+        self._listening_pid = None
+        self._lock = threading.Lock()
+
+    def ensure_listening(self):
+        if self._listening_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listening_pid == os.getpid():
+                return
+            self._broadcaster.start_at(int(self._client.get(CHANNEL + ":seq") or 0))
+            thread = threading.Thread(target=self._listen, name="stockapp-events", daemon=True)
+            thread.start()
+            self._listening_pid = os.getpid()
+
+    def publish(self, event, data):
+        self.ensure_listening()
+        event_id = self._client.incr(CHANNEL + ":seq")
+        self._client.publish(CHANNEL, json.dumps([event_id, event, data]))
+
+    def _listen(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        for message in pubsub.listen():
+            event_id, event, data = json.loads(message["data"])
+            self._broadcaster.receive(event_id, event, data)
+
+
+def _on_items_changed(app, changes=(), metrics=None, **extra):
+    state = app.extensions.get("stockapp_events")
+    if state is None:
+        return
+    publisher = state["relay"] or state["broadcaster"]
+
+    if sum(len(change["ids"]) for change in changes) > MAX_EVENT_IDS:
+        publisher.publish("reset", "{}")
+        return
+    for change in changes:
+        publisher.publish("items", app.json.dumps({
+            "action": change["action"],
+            "warehouse": change.get("warehouse"),
+            "ids": change["ids"],
+            "items": change["rows"],
+        }))
+    for warehouse, delta in sorted((metrics or {}).items()):
+        delta = {key: value for key, value in delta.items() if value}
+        if delta:
+            if "total_value" in delta:
+                delta["total_value"] = round(delta["total_value"], 2)
+            publisher.publish("metrics", app.json.dumps({"warehouse": warehouse, **delta}))
+
+
+def init_app(app):
+    broadcaster = Broadcaster(
+        app.config.get("EVENTS_REPLAY_SIZE", 1000),
+        app.config.get("EVENTS_HEARTBEAT_SECONDS", 15),
+    )
+    backend = app.config.get("EVENTS_BACKEND") or ""
+    relay = RedisRelay(backend, broadcaster) if backend else None
+    app.extensions["stockapp_events"] = {"broadcaster": broadcaster, "relay": relay}
+    items_changed.connect(_on_items_changed, sender=app)
+
+
+def get_broadcaster():
+    state = current_app.extensions["stockapp_events"]
+    if state["relay"] is not None:
+        state["relay"].ensure_listening()
+    return state["broadcaster"]
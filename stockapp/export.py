@@ -0,0 +1,133 @@
+"""
+Streaming inventory export (/api/export).
+
+Rows are read as plain Core tuples in batches of EXPORT_BATCH_SIZE, from
+a server-side cursor where the driver supports one and by keyset on id
+otherwise, and are written out batch by batch. Memory therefore stays
+flat however many rows match, and the first bytes leave as soon as the
+first batch is read.
+
+CSV and NDJSON stream directly. XLSX uses openpyxl's write-only mode
+(rows go to a temp file, not memory); a workbook can only be zipped once
+it is complete, so its first byte comes after the last row is written.
+Dates are exported as YYYY-MM-DD, the format /api/add accepts.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date
+
+from sqlalchemy import select
+
+from . import db
+from .models import StockItem
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+# Same column order as StockItem.to_dict()
+EXPORT_COLUMNS = (
+    "id", "warehouse", "item_code", "item_description", "inward_invoice_no", "inward_date",
+    "uom", "category", "inward_qty", "inward_unit_price", "inward_total_price", "outward_qty",
+    "balance_stock_qty", "alarm_status", "outward_invoice_no", "outward_date",
+    "outward_unit_price", "outward_total_price", "eway_bill_number", "vehicle_number",
+    "po_number",
+)
+
+# Excel's per-sheet row limit, header included
+XLSX_MAX_ROWS = 1_048_576
+
+
+def iter_batches(filters, batch_size=5000):
+    """Yield lists of row tuples (EXPORT_COLUMNS order) matching `filters`, by id."""
+    columns = [getattr(StockItem, name) for name in EXPORT_COLUMNS]
+    query = select(*columns).where(*filters)
+
+    if db.session.get_bind().dialect.supports_server_side_cursors:
+        result = db.session.execute(
+            query.order_by(StockItem.id).execution_options(yield_per=batch_size)
+        )
+        for partition in result.partitions():
+            yield partition
+        return
+
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            query.where(StockItem.id > last_id).order_by(StockItem.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+# -------------------------------
+# Writers
+# -------------------------------
+def stream_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows([[_iso(value) for value in row] for row in rows])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_ndjson(batches):
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_iso, row))), separators=(",", ":")) + "\n"
+            for row in rows
+        )
+
+
+def stream_xlsx(batches, read_size=64 * 1024):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows = None, XLSX_MAX_ROWS
+    for rows in batches:
+        for row in rows:
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet(f"Inventory {len(workbook.worksheets) + 1}")
+                sheet.append(EXPORT_COLUMNS)
+                sheet_rows = 1
+            sheet.append(tuple(row))
+            sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet("Inventory 1").append(EXPORT_COLUMNS)
+
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    try:
+        workbook.save(path)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(read_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+WRITERS = {"csv": stream_csv, "ndjson": stream_ndjson, "xlsx": stream_xlsx}
+
+
+def stream(fmt, filters, batch_size=5000):
+    """Return an iterator of response chunks for one export."""
+    return WRITERS[fmt](iter_batches(filters, batch_size))
@@ -0,0 +1,215 @@
+"""
+Reorder forecasting from the stock movement ledger.
+
+An item's consumption rate is its outward quantity over the last
+FORECAST_WINDOW_DAYS divided by the window; days_to_stockout is the
+current balance over that rate (0 once the balance is gone, NULL with no
+recent consumption). stockout_risk grades it against the reorder lead
+time: "stockout", "high" (within FORECAST_LEAD_TIME_DAYS), "medium"
+(within twice that), "low", or "none" without consumption.
+
+Results are kept in `stock_forecasts`, one row per item:
+- the ledger refreshes the items behind every batch of movements it
+  appends, in the same transaction;
+- `flask forecast-stock` / POST /api/jobs/forecast recompute every item
+  (run daily so the window slides), chunk by chunk: two grouped queries
+  per chunk and NumPy for the arithmetic, so a million items take
+  seconds.
+
+/api/inventory returns daily_usage, days_to_stockout and stockout_risk
+with each item and sorts by risk with ?sort=stockout_risk.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+
+from . import db
+from .models import StockForecast, StockItem, StockMovement
+
+FORECAST_FIELDS = ("daily_usage", "days_to_stockout", "stockout_risk")
+
+
+def forecast_enabled():
+    return current_app.config.get("FORECAST_ENABLED", True)
+
+
+# -------------------------------
+# Vectorized model
+# -------------------------------
+def forecast_arrays(balance, outward_qty, window_days, lead_days):
+    """
+    Forecast NumPy columns: balance and outward quantity in the window.
+
+    Returns (daily_usage, days_to_stockout with NaN for "never", risk).
+    """
+    balance = np.asarray(balance, dtype=float)
+    daily_usage = np.clip(np.asarray(outward_qty, dtype=float), 0, None) / window_days
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days = np.where(daily_usage > 0, balance / daily_usage, np.nan)
+    days = np.where(balance <= 0, 0.0, days)
+    risk = np.select(
+        [balance <= 0, np.isnan(days), days <= lead_days, days <= 2 * lead_days],
+        ["stockout", "none", "high", "medium"],
+        default="low",
+    )
+    return daily_usage, days, risk
+
+
+def _forecast_rows(item_ids, balances, usage, as_of):
+    config = current_app.config
+    daily_usage, days, risk = forecast_arrays(
+        balances, usage,
+        config.get("FORECAST_WINDOW_DAYS", 90), config.get("FORECAST_LEAD_TIME_DAYS", 14),
+    )
+    days = [None if np.isnan(value) else value for value in np.round(days, 2).tolist()]
+    return [
+        {
+            "item_id": item_id,
+            "daily_usage": usage_rate,
+            "days_to_stockout": remaining,
+            "stockout_risk": level,
+            "computed_on": as_of,
+        }
+        for item_id, usage_rate, remaining, level in zip(
+            item_ids, np.round(daily_usage, 6).tolist(), days, risk.tolist()
+        )
+    ]
+
+
+def _window_start(as_of):
+    return as_of - timedelta(days=current_app.config.get("FORECAST_WINDOW_DAYS", 90) - 1)
+
+
+def _compute(item_filter, movement_filter, as_of):
+    """Forecast rows for the items matched by the two filters (same items)."""
+    items = db.session.execute(
+        select(
+            StockItem.id,
+            func.coalesce(StockItem.inward_qty, 0) - func.coalesce(StockItem.outward_qty, 0),
+        ).where(item_filter).order_by(StockItem.id)
+    ).all()
+    if not items:
+        return []
+    item_ids = np.fromiter((row[0] for row in items), dtype=np.int64, count=len(items))
+    balances = np.fromiter((row[1] for row in items), dtype=float, count=len(items))
+
+    consumed = db.session.execute(
+        select(StockMovement.item_id, func.sum(StockMovement.qty))
+        .where(
+            movement_filter,
+            StockMovement.direction == "out",
+            StockMovement.movement_date >= _window_start(as_of),
+            StockMovement.movement_date <= as_of,
+        )
+        .group_by(StockMovement.item_id)
+    ).all()
+    usage = np.zeros(len(items))
+    if consumed:
+        consumed_ids = np.fromiter((row[0] for row in consumed), dtype=np.int64, count=len(consumed))
+        positions = np.searchsorted(item_ids, consumed_ids)
+        usage[positions] = [float(row[1] or 0) for row in consumed]
+
+    return _forecast_rows(item_ids.tolist(), balances, usage, as_of)
+
+
+def _upsert_statement(dialect_name):
+    table = StockForecast.__table__
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+
+    stmt = dialect_insert(table)
+    incoming = stmt.inserted if dialect_name == "mysql" else stmt.excluded
+    values = {name: incoming[name] for name in (*FORECAST_FIELDS, "computed_on")}
+    if dialect_name == "mysql":
+        return stmt.on_duplicate_key_update(**values)
+    return stmt.on_conflict_do_update(index_elements=["item_id"], set_=values)
+
+
+def _store(rows):
+    if not rows:
+        return
+    statement = _upsert_statement(db.session.get_bind(mapper=StockForecast).dialect.name)
+    if statement is None:
+        db.session.execute(
+            delete(StockForecast).where(StockForecast.item_id.in_([row["item_id"] for row in rows]))
+        )
+        statement = insert(StockForecast.__table__)
+    db.session.execute(statement, rows)
+
+
+# -------------------------------
+# Incremental refresh & full recompute
+# -------------------------------
+def refresh_items(item_ids):
+    """Re-forecast `item_ids` inside the current transaction (after their movements)."""
+    item_ids = sorted(set(item_ids))
+    if not item_ids or not forecast_enabled():
+        return
+    _store(_compute(
+        StockItem.id.in_(item_ids), StockMovement.item_id.in_(item_ids), date.today()
+    ))
+
+
+def remove_items(item_ids):
+    item_ids = list(item_ids)
+    if item_ids:
+        db.session.execute(delete(StockForecast).where(StockForecast.item_id.in_(item_ids)))
+
+
+def recompute_forecasts(job=None, as_of=None, chunk_size=None):
+    """
+    Forecast every item as of `as_of` (default today), committing per chunk.
+
+    Returns the number of items forecast.
+    """
+    as_of = as_of or date.today()
+    chunk_size = chunk_size or current_app.config.get("FORECAST_CHUNK_SIZE", 50000)
+    last_id, written = 0, 0
+    while True:
+        upper = db.session.execute(
+            select(StockItem.id).where(StockItem.id > last_id)
+            .order_by(StockItem.id).offset(chunk_size - 1).limit(1)
+        ).scalar()
+        if upper is None:
+            upper = db.session.execute(select(func.max(StockItem.id))).scalar()
+            if upper is None or upper <= last_id:
+                break
+        rows = _compute(
+            StockItem.id.between(last_id + 1, upper),
+            StockMovement.item_id.between(last_id + 1, upper),
+            as_of,
+        )
+        _store(rows)
+        last_id = upper
+        written += len(rows)
+        if job is not None:
+            job.processed = written
+            job.changed = written
+        db.session.commit()
+
+    cache = current_app.extensions.get("stockapp_cache")
+    if cache is not None:
+        cache.bump("inventory")
+    return written
+
+
+# -------------------------------
+# Inventory listing
+# -------------------------------
+def sort_order(sort):
+    """ORDER BY for ?sort= on /api/inventory (None: newest first); ValueError if unknown."""
+    if not sort:
+        return None
+    if sort != "stockout_risk":
+        raise ValueError("Invalid sort. Use 'stockout_risk'.")
+    days = StockForecast.days_to_stockout
+    # soonest stockout first; items without a forecast or consumption last
+    return (days.is_(None), days.asc(), StockItem.id.desc())
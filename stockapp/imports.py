@@ -0,0 +1,114 @@
+"""
+Spreadsheet import pipeline (/api/import).
+
+An uploaded CSV or XLSX sheet is saved to IMPORT_DIR and handed to a
+background job, so the request returns a job id at once however big the
+sheet is. The job reads the sheet incrementally (pandas chunked CSV
+reader, openpyxl read-only workbook) and feeds the rows through the same
+BulkImporter as /api/add: validated and computed a chunk at a time and
+written with bulk INSERTs (or upserts with on_conflict). Progress, the
+failed-row count and throughput are visible on /api/jobs/<id>.
+"""
+import os
+import tempfile
+import uuid
+
+from flask import current_app
+
+from . import bulk, db
+
+EXTENSIONS = {".csv": "csv", ".txt": "csv", ".xlsx": "xlsx", ".xlsm": "xlsx"}
+
+
+def detect_format(filename, requested=None):
+    """Return "csv" or "xlsx" from ?format= or the file extension, else None."""
+    if requested:
+        requested = requested.strip().lower()
+        return requested if requested in ("csv", "xlsx") else None
+    return EXTENSIONS.get(os.path.splitext(filename or "")[1].lower())
+
+
+def save_upload(storage, fmt):
+    """Persist an uploaded FileStorage under IMPORT_DIR and return its path."""
+    directory = current_app.config.get("IMPORT_DIR") or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    # openpyxl picks its reader by extension
+    path = os.path.join(directory, f"stockapp-import-{uuid.uuid4().hex}.{fmt}")
+    storage.save(path)
+    return path
+
+
+def header_key(value):
+    """'Inward Qty ' -> 'inward_qty'."""
+    return "_".join(str(value or "").strip().lower().replace("-", " ").split())
+
+
+def _cell(value):
+    """Blank cells become None, integral floats ints (so codes stay '1001')."""
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# -------------------------------
+# Readers (yield one dict per data row)
+# -------------------------------
+def read_csv(path, chunk_size=1000):
+    import pandas as pd
+
+    reader = pd.read_csv(
+        path, chunksize=chunk_size, dtype=str, keep_default_na=False,
+        skipinitialspace=True, encoding="utf-8-sig",
+    )
+    for frame in reader:
+        frame.columns = [header_key(name) for name in frame.columns]
+        for record in frame.to_dict("records"):
+            yield {key: _cell(value) for key, value in record.items()}
+
+
+def read_xlsx(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [header_key(name) for name in next(rows, ())]
+        for values in rows:
+            if values is None or all(value in (None, "") for value in values):
+                continue
+            yield {key: _cell(value) for key, value in zip(header, values) if key}
+    finally:
+        workbook.close()
+
+
+# -------------------------------
+# Job body
+# -------------------------------
+def run_import(job, path, fmt, on_conflict=None, warehouse=None):
+    """Background job: stream the sheet at `path` into `warehouse` through the bulk importer."""
+    chunk_size = current_app.config.get("BULK_CHUNK_SIZE", 1000)
+    entries = read_csv(path, chunk_size) if fmt == "csv" else read_xlsx(path)
+
+    def progress(importer, rows_seen):
+        counts = importer.counts
+        job.processed = rows_seen
+        job.failed = counts["invalid"] + counts["duplicate"]
+        job.changed = counts["inserted"] + counts["updated"]
+        job.results = list(importer.results)
+        db.session.commit()
+
+    try:
+        importer = bulk.BulkImporter(
+            chunk_size=chunk_size,
+            on_conflict=on_conflict,
+            max_results=current_app.config.get("IMPORT_MAX_ERRORS", 1000),
+            progress=progress,
+            warehouse=warehouse,
+        )
+        importer.run(entries)
+    finally:
+        os.remove(path)
+    return importer.counts
@@ -0,0 +1,383 @@
+"""
+Opt-in per-request instrumentation (INSTRUMENTATION_ENABLED=1).
+
+For every request served by Flask it records:
+- SQL statements executed and the time spent in them (engine events);
+- ORM rows hydrated (mapper "load" events);
+- serialization time (building the JSON body, see serializing());
+- total time.
+
+The numbers go out on each response as a `Server-Timing` header (shown
+by the browser's network panel) and are accumulated per endpoint for
+GET /metrics in the Prometheus text format. Counters are per worker
+process, as Prometheus expects when it scrapes each worker.
+
+Profiling is sampled: PROFILE_SAMPLE_RATE of the requests (or any
+request sending `X-Profile: <PROFILE_TOKEN>`) run under a profiler, and
+those taking at least PROFILE_SLOW_MS are dumped to PROFILE_DIR as a
+cProfile `.prof` (python -m pstats, snakeviz) or, with PROFILER=stack, a
+folded-stack `.folded` file for flamegraph.pl / speedscope. A `.sql.json`
+with the request's statements is written next to it. Only one request
+is profiled at a time.
+
+Reads answered natively by asgi.py use their own async engine and are
+not counted here.
+"""
+import cProfile
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+from . import db
+
+# Request duration histogram buckets (seconds)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Statements kept per profiled request for its .sql.json dump
+MAX_PROFILED_STATEMENTS = 200
+
+
+class RequestTimings:
+    """What one request spent, filled in by the SQL/ORM events and serializing()."""
+
+    def __init__(self, keep_statements=False):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.serialize_seconds = 0.0
+        self.statements = [] if keep_statements else None
+
+    def add_statement(self, statement, seconds):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        if self.statements is not None and len(self.statements) < MAX_PROFILED_STATEMENTS:
+            self.statements.append({"ms": round(seconds * 1000, 3), "sql": statement})
+
+    def server_timing(self, total):
+        return ", ".join((
+            f'db;dur={self.sql_seconds * 1000:.2f};desc="{self.sql_count} queries"',
+            f'hydrate;desc="{self.rows} rows"',
+            f"serialize;dur={self.serialize_seconds * 1000:.2f}",
+            f"total;dur={total * 1000:.2f}",
+        ))
+
+
+def current_timings():
+    """The RequestTimings of the request being served, or None."""
+    if not has_app_context():
+        return None
+    return g.get("stockapp_timings")
+
+
+@contextmanager
+def serializing():
+    """Count the enclosed block as serialization time (no-op when disabled)."""
+    timings = current_timings()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialize_seconds += time.perf_counter() - started
+
+
+# -------------------------------
+# SQL and ORM events
+# -------------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_timings() is not None:
+        conn.info.setdefault("stockapp_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    starts = conn.info.get("stockapp_query_start")
+    if timings is None or not starts:
+        return
+    timings.add_statement(statement, time.perf_counter() - starts.pop())
+
+
+def _on_load(target, context):
+    timings = current_timings()
+    if timings is not None:
+        timings.rows += 1
+
+
+# -------------------------------
+# Per-endpoint metrics
+# -------------------------------
+class MetricsRegistry:
+    """Per-endpoint counters and a duration histogram, rendered for Prometheus."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.seconds = defaultdict(float)
+        self.sql_queries = Counter()
+        self.sql_seconds = defaultdict(float)
+        self.rows = Counter()
+        self.serialize_seconds = defaultdict(float)
+        self.histogram = defaultdict(lambda: [0] * len(self.buckets))
+        self.profiles = 0
+
+    def observe(self, endpoint, method, status, timings, total):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.seconds[endpoint] += total
+            self.sql_queries[endpoint] += timings.sql_count
+            self.sql_seconds[endpoint] += timings.sql_seconds
+            self.rows[endpoint] += timings.rows
+            self.serialize_seconds[endpoint] += timings.serialize_seconds
+            counts = self.histogram[endpoint]
+            for index, bound in enumerate(self.buckets):
+                if total <= bound:
+                    counts[index] += 1
+
+    def render(self, pool=None):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("stockapp_requests_total", "counter", "Requests served.")
+            for (endpoint, method, status), value in sorted(self.requests.items()):
+                lines.append(
+                    f'stockapp_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {value}'
+                )
+
+            family("stockapp_request_duration_seconds", "histogram", "Total request time.")
+            counts_by_endpoint = Counter()
+            for (endpoint, _method, _status), value in self.requests.items():
+                counts_by_endpoint[endpoint] += value
+            for endpoint in sorted(self.histogram):
+                for bound, value in zip(self.buckets, self.histogram[endpoint]):
+                    lines.append(
+                        f'stockapp_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {value}'
+                    )
+                lines.append(
+                    f'stockapp_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} '
+                    f"{counts_by_endpoint[endpoint]}"
+                )
+                lines.append(f'stockapp_request_duration_seconds_sum{{endpoint="{endpoint}"}} {self.seconds[endpoint]:.6f}')
+                lines.append(f'stockapp_request_duration_seconds_count{{endpoint="{endpoint}"}} {counts_by_endpoint[endpoint]}')
+
+            for name, kind, help_text, values, fmt in (
+                ("stockapp_sql_queries_total", "counter", "SQL statements executed.", self.sql_queries, "{}"),
+                ("stockapp_sql_seconds_total", "counter", "Time spent executing SQL.", self.sql_seconds, "{:.6f}"),
+                ("stockapp_rows_hydrated_total", "counter", "ORM rows loaded.", self.rows, "{}"),
+                ("stockapp_serialize_seconds_total", "counter", "Time spent serializing responses.",
+                 self.serialize_seconds, "{:.6f}"),
+            ):
+                family(name, kind, help_text)
+                for endpoint in sorted(values):
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} ' + fmt.format(values[endpoint]))
+
+            family("stockapp_profiles_written_total", "counter", "Slow-request profiles dumped.")
+            lines.append(f"stockapp_profiles_written_total {self.profiles}")
+
+        # Connection pool gauges (see engines.PoolStats)
+        for key, help_text in (
+            ("checked_out", "Connections currently checked out."),
+            ("peak_checked_out", "Most connections checked out at once."),
+            ("overflow_checkouts", "Checkouts beyond pool_size."),
+        ):
+            name = f"stockapp_db_pool_{key}"
+            family(name, "gauge", help_text)
+            for engine, stats in sorted((pool or {}).items()):
+                if key in stats:
+                    lines.append(f'{name}{{engine="{engine}"}} {stats[key]}')
+
+        return "\n".join(lines) + "\n"
+
+
+# -------------------------------
+# Sampled profiler
+# -------------------------------
+class StackSampler:
+    """Samples one thread's stack every `interval` seconds into folded-stack counts."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="stockapp-stack-sampler", daemon=True)
+
+    def enable(self):
+        self._sampler.start()
+
+    def disable(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, "w") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """Decides which requests to profile and writes out the slow ones."""
+
+    def __init__(self, config):
+        self.sample_rate = config.get("PROFILE_SAMPLE_RATE", 0.0)
+        self.slow_ms = config.get("PROFILE_SLOW_MS", 500)
+        self.directory = config.get("PROFILE_DIR") or ""
+        self.token = config.get("PROFILE_TOKEN") or ""
+        self.kind = config.get("PROFILER") or "cprofile"
+        self._busy = threading.Lock()
+
+    def wanted(self):
+        if not self.directory:
+            return False
+        if self.token and request.headers.get("X-Profile") == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        """A running profiler for this request, or None if one is already running."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = StackSampler() if self.kind == "stack" else cProfile.Profile()
+        try:
+            profiler.enable()
+        except Exception:
+            self._busy.release()
+            raise
+        return profiler
+
+    def stop(self, profiler):
+        try:
+            profiler.disable()
+        finally:
+            self._busy.release()
+
+    def dump(self, profiler, endpoint, timings, total):
+        """Write the profile and its SQL statements; returns the profile's path."""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S.%f")
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", endpoint)
+        base = os.path.join(self.directory, f"{stamp}-{name}-{int(total * 1000)}ms")
+        if isinstance(profiler, StackSampler):
+            path = base + ".folded"
+            profiler.dump(path)
+        else:
+            path = base + ".prof"
+            profiler.dump_stats(path)
+        with open(base + ".sql.json", "w") as handle:
+            json.dump({
+                "path": request.full_path,
+                "total_ms": round(total * 1000, 3),
+                "sql_ms": round(timings.sql_seconds * 1000, 3),
+                "serialize_ms": round(timings.serialize_seconds * 1000, 3),
+                "rows": timings.rows,
+                "statements": timings.statements,
+            }, handle, indent=2)
+        return path
+
+
+# -------------------------------
+# Request hooks
+# -------------------------------
+def _before_request():
+    state = current_app.extensions["stockapp_instrumentation"]
+    profiler = state["profiler"]
+    profiling = profiler.wanted()
+    g.stockapp_timings = RequestTimings(keep_statements=profiling)
+    if profiling:
+        g.stockapp_profiler = profiler.start()
+
+
+def _finish_profile():
+    running = g.pop("stockapp_profiler", None)
+    if running is not None:
+        current_app.extensions["stockapp_instrumentation"]["profiler"].stop(running)
+    return running
+
+
+def _after_request(response):
+    timings = g.get("stockapp_timings")
+    if timings is None:
+        return response
+    running = _finish_profile()
+    total = time.perf_counter() - timings.started
+    endpoint = request.endpoint or "unmatched"
+
+    state = current_app.extensions["stockapp_instrumentation"]
+    state["metrics"].observe(endpoint, request.method, response.status_code, timings, total)
+    response.headers["Server-Timing"] = timings.server_timing(total)
+
+    profiler = state["profiler"]
+    if running is not None and total * 1000 >= profiler.slow_ms:
+        try:
+            path = profiler.dump(running, endpoint, timings, total)
+        except OSError:
+            current_app.logger.exception("Could not write the profile for %s", request.path)
+        else:
+            with state["metrics"]._lock:
+                state["metrics"].profiles += 1
+            current_app.logger.warning("Slow request %s (%.0f ms) profiled to %s", request.path, total * 1000, path)
+    return response
+
+
+def _teardown_request(exc):
+    # after_request is skipped when the view raises; never leave a profiler running
+    _finish_profile()
+    g.pop("stockapp_timings", None)
+
+
+def metrics_text():
+    """Prometheus exposition of the per-endpoint metrics, or None when disabled."""
+    state = current_app.extensions.get("stockapp_instrumentation")
+    if state is None:
+        return None
+    from .engines import pool_stats
+    return state["metrics"].render(pool_stats()["engines"])
+
+
+def init_app(app):
+    """Hook the request, SQL and ORM events when INSTRUMENTATION_ENABLED (after db.init_app)."""
+    if not app.config.get("INSTRUMENTATION_ENABLED"):
+        return
+    app.extensions["stockapp_instrumentation"] = {
+        "metrics": MetricsRegistry(),
+        "profiler": Profiler(app.config),
+    }
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    # the model classes are shared by every app, so hook them only once
+    if not event.contains(db.Model, "load", _on_load):
+        event.listen(db.Model, "load", _on_load, propagate=True)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
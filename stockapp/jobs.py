@@ -0,0 +1,89 @@
+"""
+Background job runner.
+
+Jobs run on a small per-process thread pool (JOB_WORKERS) inside their own
+app context, so long work never holds a request worker. Status and progress
+live in the `background_jobs` table: any gunicorn worker can answer a
+status poll, not just the one that started the job.
+"""
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+
+from . import db
+from .models import BackgroundJob
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get("JOB_WORKERS", 2),
+                thread_name_prefix="stockapp-job",
+            )
+        return _executor
+
+
+def submit(kind, func, *args, **kwargs):
+    """
+    Queue `func(job, *args, **kwargs)` and return its BackgroundJob row.
+
+    `func` receives the job row bound to the worker's session; it should
+    update `processed`/`failed`/`changed` as it goes and commit with its
+    own chunks so pollers see progress.
+    """
+    app = current_app._get_current_object()
+    job = BackgroundJob(id=uuid.uuid4().hex, kind=kind, status="queued")
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+
+    def runner():
+        with app.app_context():
+            job = db.session.get(BackgroundJob, job_id)
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+            try:
+                func(job, *args, **kwargs)
+                job.status = "finished"
+            except Exception as e:
+                db.session.rollback()
+                job = db.session.get(BackgroundJob, job_id)
+                job.status = "failed"
+                job.error = str(e)
+                app.logger.exception("Background job %s (%s) failed", job_id, kind)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            db.session.remove()
+
+    _get_executor(app).submit(runner)
+    return job
+
+
+def run_inline(kind, func, *args, **kwargs):
+    """Run a job body synchronously (CLI use), still recording its status."""
+    job = BackgroundJob(
+        id=uuid.uuid4().hex, kind=kind, status="running", started_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+    try:
+        func(job, *args, **kwargs)
+        job.status = "finished"
+    except Exception as e:
+        db.session.rollback()
+        job.status = "failed"
+        job.error = str(e)
+        raise
+    finally:
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    return job
@@ -0,0 +1,375 @@
+"""
+Stock movement ledger.
+
+Every change to an item's quantities is appended to `stock_movements`
+with the running balance after it, so history is never overwritten. The
+quantity columns on stock_items are the ledger's running totals, updated
+in the same transaction as each movement (relative UPDATE, so concurrent
+receipts/issues add up without locking the row first), which keeps compute_fields(), the summary
+counters and every list read as cheap as before.
+
+Daily `stock_balance_snapshots` (flask snapshot-balances) hold each
+item's totals as of a date; "balance as of X" is the nearest snapshot
+on or before X plus the short ledger tail after it. A movement dated on
+or before an existing snapshot drops that item's later snapshots.
+
+Every movement appended here is also added to the daily/weekly/monthly
+rollups (analytics.py); deleting an item leaves them as they are. The items it touches are re-forecast
+(forecast.py).
+"""
+from collections.abc import Mapping
+from datetime import date
+
+from sqlalchemy import and_, case, delete, func, insert, literal, select, update
+from sqlalchemy.orm.exc import StaleDataError
+
+from . import analytics, db, forecast
+from .models import BalanceSnapshot, StockItem, StockMovement, derived_expressions
+from .thresholds import get_ruleset
+
+DIRECTIONS = ("in", "out")
+
+# Item columns a movement reads or sets
+LEDGER_COLUMNS = (
+    "id", "warehouse", "inward_qty", "inward_unit_price", "inward_invoice_no", "inward_date",
+    "outward_qty", "outward_unit_price", "outward_invoice_no", "outward_date",
+    "eway_bill_number", "vehicle_number", "po_number",
+)
+
+
+def _value(row, key):
+    if isinstance(row, Mapping):
+        return row.get(key)
+    return getattr(row, key, None)
+
+
+def quantities(row):
+    """Copy the ledger-relevant fields of an item (ORM object or dict)."""
+    return {name: _value(row, name) for name in LEDGER_COLUMNS}
+
+
+# -------------------------------
+# Posting
+# -------------------------------
+def movements_for_change(before, after, source):
+    """
+    Ledger rows taking an item from `before` to `after` (before=None: new item).
+
+    An opening movement is dated with the item's inward/outward date; a
+    later correction is dated today, so it never rewrites the balance of
+    days that were already reported.
+    """
+    inward_before = float(_value(before, "inward_qty") or 0) if before is not None else 0.0
+    outward_before = float(_value(before, "outward_qty") or 0) if before is not None else 0.0
+    inward_after = float(_value(after, "inward_qty") or 0)
+    outward_after = float(_value(after, "outward_qty") or 0)
+
+    balance = inward_before - outward_before
+    today = date.today()
+    rows = []
+    if inward_after != inward_before:
+        balance += inward_after - inward_before
+        rows.append({
+            "item_id": _value(after, "id"),
+            "warehouse": _value(after, "warehouse"),
+            "direction": "in",
+            "qty": inward_after - inward_before,
+            "unit_price": float(_value(after, "inward_unit_price") or 0),
+            "movement_date": (_value(after, "inward_date") or today) if before is None else today,
+            "source": source,
+            "invoice_no": _value(after, "inward_invoice_no"),
+            "eway_bill_number": None,
+            "vehicle_number": None,
+            "po_number": _value(after, "po_number"),
+            "balance_after": balance,
+        })
+    if outward_after != outward_before:
+        balance -= outward_after - outward_before
+        rows.append({
+            "item_id": _value(after, "id"),
+            "warehouse": _value(after, "warehouse"),
+            "direction": "out",
+            "qty": outward_after - outward_before,
+            "unit_price": float(_value(after, "outward_unit_price") or 0),
+            "movement_date": (_value(after, "outward_date") or today) if before is None else today,
+            "source": source,
+            "invoice_no": _value(after, "outward_invoice_no"),
+            "eway_bill_number": _value(after, "eway_bill_number"),
+            "vehicle_number": _value(after, "vehicle_number"),
+            "po_number": _value(after, "po_number"),
+            "balance_after": balance,
+        })
+    return rows
+
+
+def record_changes(pairs, source, is_new=False):
+    """
+    Append the movements behind (before, after) item pairs.
+
+    For rows written directly (create, edit, bulk); must run after a flush
+    so new items have their ids. Returns the ledger rows written.
+    """
+    rows = []
+    for before, after in pairs:
+        rows.extend(movements_for_change(before, after, source))
+    if rows:
+        db.session.execute(insert(StockMovement.__table__), rows)
+        analytics.record_movements(rows)
+        forecast.refresh_items(row["item_id"] for row in rows)
+        if not is_new:
+            _invalidate_snapshots(rows)
+    return rows
+
+
+def post_movement(item, direction, qty, unit_price=None, movement_date=None,
+                  source="receipt", invoice_no=None, eway_bill_number=None,
+                  vehicle_number=None, po_number=None, expected_version=None,
+                  bump_version=True):
+    """
+    Receive (direction="in") or issue ("out") `qty` of an ORM item.
+
+    One relative UPDATE moves the running total, makes the unit price the
+    quantity-weighted average, re-derives totals, balance and alarm status
+    and bumps the version once, so concurrent postings add up instead of
+    overwriting each other. With `expected_version` it only applies to
+    that version of the row and raises StaleDataError otherwise;
+    bump_version=False is for a caller that already bumped it in this
+    transaction. Refreshes `item`, appends the movement and returns it.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError("direction must be 'in' or 'out'.")
+    movement_date = movement_date or date.today()
+    db.session.flush()
+
+    table = StockItem.__table__
+    prefix = "inward" if direction == "in" else "outward"
+    qty_column, price_column = table.c[f"{prefix}_qty"], table.c[f"{prefix}_unit_price"]
+    current = func.coalesce(qty_column, 0)
+    new_qty = current + qty
+    new_price = func.coalesce(price_column, 0)
+    if unit_price is not None:
+        new_price = case(
+            (new_qty != 0, (current * new_price + qty * unit_price) / new_qty),
+            else_=literal(unit_price),
+        )
+    base = {
+        name: func.coalesce(table.c[name], 0)
+        for name in ("inward_qty", "inward_unit_price", "outward_qty", "outward_unit_price")
+    }
+    base.update({f"{prefix}_qty": new_qty, f"{prefix}_unit_price": new_price})
+
+    # MySQL evaluates SET left to right with updated values, so everything
+    # reading the old quantity and price is assigned before them
+    values = list(derived_expressions(
+        base["inward_qty"], base["inward_unit_price"], base["outward_qty"], base["outward_unit_price"],
+        ruleset=get_ruleset(),
+        keys={"item_code": table.c.item_code, "category": table.c.category, "uom": table.c.uom},
+    ).items())
+    if unit_price is not None:
+        values.append((price_column.name, new_price))
+    values.append((qty_column.name, new_qty))
+    values.append((f"{prefix}_date", movement_date))
+    for name, value in (
+        (f"{prefix}_invoice_no", invoice_no),
+        ("eway_bill_number", eway_bill_number if direction == "out" else None),
+        ("vehicle_number", vehicle_number if direction == "out" else None),
+        ("po_number", po_number),
+    ):
+        if value is not None:
+            values.append((name, value))
+    if bump_version:
+        values.append(("version", table.c.version + 1))
+
+    statement = update(table).where(table.c.id == item.id)
+    if expected_version is not None:
+        statement = statement.where(table.c.version == expected_version)
+    result = db.session.execute(
+        statement.ordered_values(*[(table.c[name], value) for name, value in values])
+    )
+    if result.rowcount == 0:
+        raise StaleDataError(f"Item {item.id} is no longer at version {expected_version}.")
+    db.session.refresh(item)
+
+    movement = StockMovement(
+        item_id=item.id,
+        warehouse=item.warehouse,
+        direction=direction,
+        qty=qty,
+        unit_price=unit_price if unit_price is not None else (
+            item.inward_unit_price if direction == "in" else item.outward_unit_price
+        ),
+        movement_date=movement_date,
+        source=source,
+        invoice_no=invoice_no,
+        eway_bill_number=eway_bill_number,
+        vehicle_number=vehicle_number,
+        po_number=po_number,
+        balance_after=item.balance_stock_qty,
+    )
+    db.session.add(movement)
+    db.session.flush()
+    analytics.record_movements([movement])
+    forecast.refresh_items([item.id])
+    _invalidate_snapshots([{"item_id": item.id, "movement_date": movement_date}])
+    return movement
+
+
+def remove_items(item_ids):
+    """Drop the ledger and snapshots of deleted items (SQLite does not cascade by default)."""
+    item_ids = list(item_ids)
+    if item_ids:
+        forecast.remove_items(item_ids)
+        db.session.execute(delete(BalanceSnapshot).where(BalanceSnapshot.item_id.in_(item_ids)))
+        db.session.execute(delete(StockMovement).where(StockMovement.item_id.in_(item_ids)))
+
+
+def _invalidate_snapshots(rows):
+    """Drop snapshots that a (back-dated) movement in `rows` makes stale."""
+    earliest = {}
+    for row in rows:
+        item_id, day = row["item_id"], row["movement_date"]
+        if item_id not in earliest or day < earliest[item_id]:
+            earliest[item_id] = day
+    if not earliest:
+        return
+    db.session.execute(
+        delete(BalanceSnapshot)
+        .where(BalanceSnapshot.item_id.in_(list(earliest)))
+        .where(BalanceSnapshot.as_of >= min(earliest.values()))
+    )
+
+
+# -------------------------------
+# Reads
+# -------------------------------
+def _tail_totals(item_ids, after, until):
+    """Ledger sums per item for movement_date in (after, until]; after=None is unbounded."""
+    movement = StockMovement
+    query = (
+        select(
+            movement.item_id,
+            func.sum(case((movement.direction == "in", movement.qty), else_=0)),
+            func.sum(case((movement.direction == "out", movement.qty), else_=0)),
+            func.sum(case((movement.direction == "in", movement.qty * movement.unit_price), else_=0)),
+            func.sum(case((movement.direction == "out", movement.qty * movement.unit_price), else_=0)),
+            func.max(movement.id),
+            func.count(movement.id),
+        )
+        .where(movement.item_id.in_(item_ids), movement.movement_date <= until)
+        .group_by(movement.item_id)
+    )
+    if after is not None:
+        query = query.where(movement.movement_date > after)
+    return {row[0]: row[1:] for row in db.session.execute(query)}
+
+
+def balance_as_of(item_id, as_of):
+    """Item totals at the end of `as_of`: nearest snapshot plus the ledger tail."""
+    snapshot = db.session.execute(
+        select(BalanceSnapshot)
+        .where(BalanceSnapshot.item_id == item_id, BalanceSnapshot.as_of <= as_of)
+        .order_by(BalanceSnapshot.as_of.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+
+    totals = {"inward_qty": 0.0, "outward_qty": 0.0, "inward_value": 0.0, "outward_value": 0.0}
+    if snapshot is not None:
+        for key in totals:
+            totals[key] = float(getattr(snapshot, key) or 0)
+    tail = _tail_totals([item_id], snapshot.as_of if snapshot else None, as_of).get(item_id)
+    if tail:
+        for key, value in zip(totals, tail[:4]):
+            totals[key] += float(value or 0)
+
+    return {
+        "item_id": item_id,
+        "as_of": as_of,
+        **{key: round(value, 6) for key, value in totals.items()},
+        "balance_stock_qty": round(totals["inward_qty"] - totals["outward_qty"], 6),
+        "snapshot_date": snapshot.as_of if snapshot else None,
+        "tail_movements": int(tail[5]) if tail else 0,
+    }
+
+
+# -------------------------------
+# Snapshots
+# -------------------------------
+def take_snapshots(job=None, as_of=None, chunk_size=1000):
+    """
+    Write every item's ledger totals as of `as_of` (default today).
+
+    Each item starts from its latest earlier snapshot and adds only the
+    movements after it. Commits per chunk of items; returns the number of
+    snapshots written.
+    """
+    as_of = as_of or date.today()
+    last_id, examined, written = 0, 0, 0
+    while True:
+        item_ids = db.session.execute(
+            select(StockItem.id).where(StockItem.id > last_id)
+            .order_by(StockItem.id).limit(chunk_size)
+        ).scalars().all()
+        if not item_ids:
+            break
+        last_id = item_ids[-1]
+
+        latest = (
+            select(BalanceSnapshot.item_id, func.max(BalanceSnapshot.as_of).label("as_of"))
+            .where(BalanceSnapshot.item_id.in_(item_ids), BalanceSnapshot.as_of < as_of)
+            .group_by(BalanceSnapshot.item_id)
+            .subquery()
+        )
+        previous = {
+            snapshot.item_id: snapshot
+            for snapshot in db.session.execute(
+                select(BalanceSnapshot).join(latest, and_(
+                    BalanceSnapshot.item_id == latest.c.item_id,
+                    BalanceSnapshot.as_of == latest.c.as_of,
+                ))
+            ).scalars()
+        }
+
+        # items sharing a previous snapshot date share one tail query
+        by_start = {}
+        for item_id in item_ids:
+            start = previous[item_id].as_of if item_id in previous else None
+            by_start.setdefault(start, []).append(item_id)
+        tails = {}
+        for start, ids in by_start.items():
+            tails.update(_tail_totals(ids, start, as_of))
+
+        rows = []
+        for item_id in item_ids:
+            base, tail = previous.get(item_id), tails.get(item_id)
+            if base is None and tail is None:
+                continue
+            row = {
+                "item_id": item_id,
+                "as_of": as_of,
+                "inward_qty": base.inward_qty if base else 0.0,
+                "outward_qty": base.outward_qty if base else 0.0,
+                "inward_value": base.inward_value if base else 0.0,
+                "outward_value": base.outward_value if base else 0.0,
+                "last_movement_id": base.last_movement_id if base else None,
+            }
+            if tail:
+                for key, value in zip(("inward_qty", "outward_qty", "inward_value", "outward_value"), tail):
+                    row[key] += float(value or 0)
+                row["last_movement_id"] = tail[4]
+            rows.append(row)
+
+        db.session.execute(
+            delete(BalanceSnapshot)
+            .where(BalanceSnapshot.item_id.in_(item_ids), BalanceSnapshot.as_of == as_of)
+        )
+        if rows:
+            db.session.execute(insert(BalanceSnapshot.__table__), rows)
+
+        examined += len(item_ids)
+        written += len(rows)
+        if job is not None:
+            job.processed = examined
+            job.changed = written
+        db.session.commit()
+
+    return written
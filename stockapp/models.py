@@ -1,23 +1,65 @@
 from . import db
-from datetime import date
-from sqlalchemy import UniqueConstraint
+from datetime import date, datetime
+from sqlalchemy import DDL, UniqueConstraint, case, event, func
+from sqlalchemy.dialects import mysql
+
+# Alarm cut-offs, as fractions of inward_qty
+CRITICAL_RATIO = 0.6
+LOW_STOCK_RATIO = 0.8
+
+
+def derived_expressions(inward_qty, inward_unit_price, outward_qty, outward_unit_price,
+                        ruleset=None, keys=None):
+    """
+    SQL twin of StockItem.compute_fields(): derived column expressions.
+
+    Takes SQL expressions for the four base quantities and returns the
+    expressions for the totals, balance and alarm status, so INSERT ... ON
+    CONFLICT and set-based UPDATEs derive fields with the same rules.
+    With a thresholds.Ruleset, alarm status follows the configured rules;
+    `keys` gives the item_code/category/uom expressions they match on.
+    """
+    balance = inward_qty - outward_qty
+    if ruleset is not None:
+        alarm_status = ruleset.sql_alarm(balance, inward_qty, **(keys or {}))
+    else:
+        alarm_status = case(
+            (balance < inward_qty * CRITICAL_RATIO, "Critical"),
+            (balance < inward_qty * LOW_STOCK_RATIO, "Low Stock"),
+            else_="Normal",
+        )
+    return {
+        "inward_total_price": func.round(inward_qty * inward_unit_price, 2),
+        "outward_total_price": func.round(outward_qty * outward_unit_price, 2),
+        "balance_stock_qty": balance,
+        "alarm_status": alarm_status,
+    }
+
 
 class StockItem(db.Model):
     __tablename__ = "stock_items"
-    __table_args__ = (UniqueConstraint("item_code", name="uq_stock_item_code"),)
+    # item codes are unique per warehouse; per-warehouse listings seek on
+    # (warehouse, id) and (warehouse, alarm_status) like a single site would
+    __table_args__ = (
+        UniqueConstraint("warehouse", "item_code", name="uq_stock_item_warehouse_code"),
+        db.Index("ix_stock_items_warehouse_id", "warehouse", "id"),
+        db.Index("ix_stock_items_warehouse_alarm", "warehouse", "alarm_status"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    item_code = db.Column(db.String(50), nullable=False, unique=True)
+    warehouse = db.Column(db.String(20), nullable=False, default="main", server_default="main")
+    item_code = db.Column(db.String(50), nullable=False)
     item_description = db.Column(db.String(255))
     inward_invoice_no = db.Column(db.String(100))
     inward_date = db.Column(db.Date, default=date.today)
-    uom = db.Column(db.String(10))
+    uom = db.Column(db.String(10), index=True)
+    category = db.Column(db.String(50), index=True)
     inward_qty = db.Column(db.Float, default=0)
     inward_unit_price = db.Column(db.Float, default=0)
     inward_total_price = db.Column(db.Float, default=0)
     outward_qty = db.Column(db.Float, default=0)
-    balance_stock_qty = db.Column(db.Float, default=0)
-    alarm_status = db.Column(db.String(20))
+    balance_stock_qty = db.Column(db.Float, default=0, index=True)
+    alarm_status = db.Column(db.String(20), index=True)
     outward_invoice_no = db.Column(db.String(100))
     outward_date = db.Column(db.Date)
     outward_unit_price = db.Column(db.Float, default=0)
@@ -25,8 +67,14 @@ class StockItem(db.Model):
     eway_bill_number = db.Column(db.String(100))
     vehicle_number = db.Column(db.String(50))
     po_number = db.Column(db.String(100))
+    # Bumped by every write to the row: the ORM checks it on UPDATE/DELETE
+    # (a concurrent edit raises StaleDataError) and set-based statements
+    # increment it. Clients send it back as If-Match or "version".
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
-    def compute_fields(self):
+    def compute_fields(self, ruleset=None):
         # Convert all numeric values safely
         inward_qty = float(self.inward_qty or 0)
         inward_unit_price = float(self.inward_unit_price or 0)
@@ -38,23 +86,32 @@ class StockItem(db.Model):
         self.outward_total_price = round(outward_qty * outward_unit_price, 2)
 
         # ---- BALANCE STOCK ----
+        # inward_qty/outward_qty are the running totals of the movement
+        # ledger (see ledger.py), so this is the ledger balance
         self.balance_stock_qty = inward_qty - outward_qty
 
-        # ---- ALARM LOGIC (unchanged) ----
-        if self.balance_stock_qty < (inward_qty * 0.6):
-            self.alarm_status = "Critical"
-        elif self.balance_stock_qty < (inward_qty * 0.8):
-            self.alarm_status = "Low Stock"
-        else:
-            self.alarm_status = "Normal"
+        # ---- ALARM LOGIC (configurable threshold rules) ----
+        if ruleset is None:
+            from .thresholds import get_ruleset
+            ruleset = get_ruleset()
+        self.alarm_status = ruleset.classify(
+            self.balance_stock_qty, inward_qty,
+            item_code=self.item_code, category=self.category, uom=self.uom,
+        )
+
+        return self.to_dict()
 
+    def to_dict(self):
+        """Serialize the stored values (no recomputation)."""
         return {
             "id": self.id,
+            "warehouse": self.warehouse,
             "item_code": self.item_code,
             "item_description": self.item_description,
             "inward_invoice_no": self.inward_invoice_no,
             "inward_date": self.inward_date,
             "uom": self.uom,
+            "category": self.category,
             "inward_qty": self.inward_qty,
             "inward_unit_price": self.inward_unit_price,
             "inward_total_price": self.inward_total_price,
@@ -68,7 +125,338 @@ class StockItem(db.Model):
             "eway_bill_number": self.eway_bill_number,
             "vehicle_number": self.vehicle_number,
             "po_number": self.po_number,
+            "version": self.version,
         }
-    
+
+    def __repr__(self):
+        return f"<StockItem id={self.id} warehouse={self.warehouse} code={self.item_code}>"
+
+
+class InventorySummary(db.Model):
+    """Pre-aggregated dashboard counters, kept current by the write routes.
+
+    One set of rows per warehouse. Counters are spread over a few slots so
+    concurrent writers do not all queue on one row lock; a dashboard read
+    sums the slots (of every warehouse for the cross-warehouse figures).
+    """
+    __tablename__ = "inventory_summary"
+
+    warehouse = db.Column(db.String(20), primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_items = db.Column(db.Integer, nullable=False, default=0)
+    normal_stock = db.Column(db.Integer, nullable=False, default=0)
+    low_stock = db.Column(db.Integer, nullable=False, default=0)
+    critical_stock = db.Column(db.Integer, nullable=False, default=0)
+    total_value = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<InventorySummary {self.warehouse} slot={self.slot} total={self.total_items}>"
+
+
+class SearchTrigram(db.Model):
+    """Inverted trigram index over the text columns of stock_items."""
+    __tablename__ = "stock_search_trigrams"
+
+    # Binary collation on MySQL so 'é'/'e' and case variants stay distinct keys
+    gram = db.Column(
+        db.String(3).with_variant(mysql.VARCHAR(3, collation="utf8mb4_bin"), "mysql"),
+        primary_key=True,
+    )
+    item_id = db.Column(
+        db.Integer,
+        db.ForeignKey("stock_items.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+
+    def __repr__(self):
+        return f"<SearchTrigram {self.gram!r} item={self.item_id}>"
+
+
+class StockMovement(db.Model):
+    """
+    One row of the append-only stock movement ledger.
+
+    direction is "in" or "out". Receipts and issues post a positive qty;
+    an edit of an item's quantity posts the signed difference. balance_after
+    is the item's running balance once this movement applied.
+    """
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        db.Index("ix_stock_movements_item_date", "item_id", "movement_date"),
+        db.Index("ix_stock_movements_warehouse_date", "warehouse", "movement_date"),
+    )
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    item_id = db.Column(
+        db.Integer, db.ForeignKey("stock_items.id", ondelete="CASCADE"), nullable=False
+    )
+    # the item's warehouse, copied so per-warehouse ledger reads skip the join
+    warehouse = db.Column(db.String(20), nullable=False, default="main", server_default="main")
+    direction = db.Column(db.String(3), nullable=False)
+    qty = db.Column(db.Float, nullable=False)
+    unit_price = db.Column(db.Float, default=0)
+    movement_date = db.Column(db.Date, nullable=False, default=date.today)
+    source = db.Column(db.String(20), nullable=False)
+    invoice_no = db.Column(db.String(100))
+    eway_bill_number = db.Column(db.String(100))
+    vehicle_number = db.Column(db.String(50))
+    po_number = db.Column(db.String(100))
+    balance_after = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "item_id": self.item_id,
+            "warehouse": self.warehouse,
+            "direction": self.direction,
+            "qty": self.qty,
+            "unit_price": self.unit_price,
+            "movement_date": self.movement_date,
+            "source": self.source,
+            "invoice_no": self.invoice_no,
+            "eway_bill_number": self.eway_bill_number,
+            "vehicle_number": self.vehicle_number,
+            "po_number": self.po_number,
+            "balance_after": self.balance_after,
+            "created_at": self.created_at,
+        }
+
+    def __repr__(self):
+        return f"<StockMovement {self.direction} {self.qty} item={self.item_id}>"
+
+
+class BalanceSnapshot(db.Model):
+    """Ledger totals of one item as of the end of a day (see ledger.take_snapshots)."""
+    __tablename__ = "stock_balance_snapshots"
+
+    item_id = db.Column(
+        db.Integer,
+        db.ForeignKey("stock_items.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    as_of = db.Column(db.Date, primary_key=True)
+    inward_qty = db.Column(db.Float, nullable=False, default=0)
+    outward_qty = db.Column(db.Float, nullable=False, default=0)
+    inward_value = db.Column(db.Float, nullable=False, default=0)
+    outward_value = db.Column(db.Float, nullable=False, default=0)
+    last_movement_id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"))
+
+    def __repr__(self):
+        return f"<BalanceSnapshot item={self.item_id} as_of={self.as_of}>"
+
+
+class StockForecast(db.Model):
+    """Consumption rate and projected stockout of one item (see forecast.py)."""
+    __tablename__ = "stock_forecasts"
+
+    item_id = db.Column(
+        db.Integer,
+        db.ForeignKey("stock_items.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    daily_usage = db.Column(db.Float, nullable=False, default=0)
+    # NULL when the item has no recent consumption
+    days_to_stockout = db.Column(db.Float, index=True)
+    stockout_risk = db.Column(db.String(8), nullable=False)
+    computed_on = db.Column(db.Date, nullable=False, default=date.today)
+
+    def __repr__(self):
+        return f"<StockForecast item={self.item_id} risk={self.stockout_risk}>"
+
+
+class StockRollup(db.Model):
+    """Ledger volume and value per warehouse and day, ISO week or month (see analytics.py).
+
+    Like InventorySummary, each period is spread over a few slots so
+    concurrent writers do not queue on one row lock; reads sum the slots.
+    """
+    __tablename__ = "stock_rollups"
+    __table_args__ = (
+        # cross-warehouse ranges (the primary key leads with warehouse)
+        db.Index("ix_stock_rollups_period_start", "period", "period_start"),
+    )
+
+    warehouse = db.Column(db.String(20), primary_key=True)
+    period = db.Column(db.String(5), primary_key=True)
+    period_start = db.Column(db.Date, primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    inward_qty = db.Column(db.Float, nullable=False, default=0)
+    inward_value = db.Column(db.Float, nullable=False, default=0)
+    outward_qty = db.Column(db.Float, nullable=False, default=0)
+    outward_value = db.Column(db.Float, nullable=False, default=0)
+    movements = db.Column(db.Integer, nullable=False, default=0)
+
     def __repr__(self):
-        return f"<StockItem id={self.id} code={self.item_code}>"
\ No newline at end of file
+        return f"<StockRollup {self.warehouse} {self.period} {self.period_start} slot={self.slot}>"
+
+
+class SyncJournal(db.Model):
+    """
+    Append-only log of written stock_items ids (see sync.py).
+
+    On a terminal the unpushed entries are its pending local changes; on
+    the central server `seq` is the cursor terminals pull from. seq never
+    goes backwards (AUTOINCREMENT on SQLite), so a cursor stays valid.
+    """
+    __tablename__ = "sync_journal"
+    __table_args__ = (
+        db.Index("ix_sync_journal_item_seq", "item_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    # no foreign key: a deleted item's entry is how the deletion syncs
+    item_id = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SyncJournal seq={self.seq} item={self.item_id}>"
+
+
+class SyncBase(db.Model):
+    """
+    A terminal's last known central state of one local item (see sync.py).
+
+    Links the local id to the central id and keeps the central version and
+    quantities the local row was last synced from, which conflict
+    resolution merges local quantity changes against.
+    """
+    __tablename__ = "sync_base"
+
+    item_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    central_id = db.Column(db.Integer, nullable=False, unique=True)
+    # kept so a local deletion can still be pushed to the right warehouse
+    warehouse = db.Column(db.String(20), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    inward_qty = db.Column(db.Float, nullable=False, default=0)
+    outward_qty = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SyncBase item={self.item_id} central={self.central_id} v{self.version}>"
+
+
+class SyncReceipt(db.Model):
+    """
+    Central: the last journal seq applied for one terminal item, so a push
+    replayed after a lost response is not applied (and merged) twice.
+    """
+    __tablename__ = "sync_receipts"
+
+    terminal = db.Column(db.String(64), primary_key=True)
+    item_ref = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), nullable=False)
+    central_id = db.Column(db.Integer)
+
+    def __repr__(self):
+        return f"<SyncReceipt {self.terminal} item={self.item_ref} seq={self.seq}>"
+
+
+class SyncState(db.Model):
+    """Terminal sync bookkeeping: pull cursor, last run times, last error."""
+    __tablename__ = "sync_state"
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Text)
+
+    def __repr__(self):
+        return f"<SyncState {self.name}={self.value!r}>"
+
+
+class BackgroundJob(db.Model):
+    """Status and progress of a background job, visible to every worker."""
+    __tablename__ = "background_jobs"
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    changed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    # Per-row outcomes worth keeping, e.g. the rows an import rejected
+    results = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        end = self.finished_at or datetime.utcnow()
+        elapsed = (end - self.started_at).total_seconds() if self.started_at else 0.0
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "processed": self.processed,
+            "failed": self.failed,
+            "changed": self.changed,
+            "error": self.error,
+            "results": self.results,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.processed / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def __repr__(self):
+        return f"<BackgroundJob {self.id} {self.kind} {self.status}>"
+
+
+class AlarmThreshold(db.Model):
+    """
+    One alarm threshold rule.
+
+    scope is "item", "category", "uom" or "default"; match_value holds the
+    item_code/category/UOM it applies to (NULL for the default rule). A
+    level set as an absolute qty wins over the same level's ratio.
+    """
+    __tablename__ = "alarm_thresholds"
+    __table_args__ = (UniqueConstraint("scope", "match_value", name="uq_alarm_threshold_scope"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)
+    match_value = db.Column(db.String(100))
+    critical_ratio = db.Column(db.Float)
+    low_ratio = db.Column(db.Float)
+    critical_qty = db.Column(db.Float)
+    low_qty = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "scope": self.scope,
+            "match_value": self.match_value,
+            "critical_ratio": self.critical_ratio,
+            "low_ratio": self.low_ratio,
+            "critical_qty": self.critical_qty,
+            "low_qty": self.low_qty,
+            "updated_at": self.updated_at,
+        }
+
+    def __repr__(self):
+        return f"<AlarmThreshold {self.scope}={self.match_value}>"
+
+
+class AlarmThresholdVersion(db.Model):
+    """
+    Version of the alarm threshold rules, shared by every process.
+
+    A single row (id 1), bumped in the transaction that changes a rule;
+    each process reloads its compiled rules when it moves (thresholds.py).
+    """
+    __tablename__ = "alarm_threshold_version"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<AlarmThresholdVersion {self.version}>"
+
+
+event.listen(
+    AlarmThresholdVersion.__table__, "after_create",
+    DDL("INSERT INTO alarm_threshold_version (id, version) VALUES (1, 0)"),
+)
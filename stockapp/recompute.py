@@ -0,0 +1,159 @@
+"""
+Chunked recompute/backfill of the stored derived fields.
+
+Rows drift when thresholds change or when someone edits quantities with
+direct SQL. The job asks the database for rows whose stored totals,
+balance or alarm status disagree with models.derived_expressions(),
+walks them in id order a chunk at a time, recomputes them with the
+vectorized batch API and writes back only the rows that really changed.
+The write is conditional on the version read with the chunk, so a row
+edited in between (which derived its own fields) is left alone.
+"""
+import numpy as np
+from sqlalchemy import bindparam, func, or_, select, update
+
+from . import batch, changes, db, summary, thresholds
+from . import search as search_index
+from .models import StockItem, derived_expressions
+
+# Stored Float columns may be single precision (MySQL FLOAT), so compare loosely
+RELATIVE_TOLERANCE = 1e-6
+
+DERIVED_NUMERIC = ("inward_total_price", "outward_total_price", "balance_stock_qty")
+
+
+def _differs_sql(stored, expected):
+    return or_(
+        stored.is_(None),
+        func.abs(stored - expected) > RELATIVE_TOLERANCE * (func.abs(expected) + 1),
+    )
+
+
+def drift_clause(ruleset=None):
+    """SQL predicate matching rows whose stored derived fields look stale."""
+    expected = derived_expressions(
+        *(func.coalesce(getattr(StockItem, name), 0) for name in batch.BASE_COLUMNS),
+        ruleset=ruleset,
+        keys={name: getattr(StockItem, name) for name in batch.KEY_COLUMNS},
+    )
+    return or_(
+        StockItem.alarm_status.is_(None),
+        StockItem.alarm_status != expected["alarm_status"],
+        *[_differs_sql(getattr(StockItem, name), expected[name]) for name in DERIVED_NUMERIC],
+    )
+
+
+def _differs(stored, expected):
+    stored = np.asarray([np.nan if value is None else value for value in stored], dtype=float)
+    return np.isnan(stored) | (
+        np.abs(stored - expected) > RELATIVE_TOLERANCE * (np.abs(expected) + 1)
+    )
+
+
+def _write_fixed(statement, rows):
+    """
+    Write recomputed `rows` whose version is still the one read; returns
+    the ids written.
+
+    One executemany when every row matches; if some did not (edited
+    since the chunk was read), the savepoint is rolled back and the rows
+    are written one by one to find out which.
+    """
+    params = [
+        {"_id": row["id"], "_version": row["version"],
+         **{f"new_{name}": row[name] for name in batch.DERIVED_COLUMNS}}
+        for row in rows
+    ]
+    if db.session.get_bind().dialect.supports_sane_multi_rowcount:
+        savepoint = db.session.begin_nested()
+        if db.session.execute(statement, params).rowcount == len(params):
+            savepoint.commit()
+            return {row["id"] for row in rows}
+        savepoint.rollback()
+    return {values["_id"] for values in params if db.session.execute(statement, values).rowcount}
+
+
+def recompute_derived(job=None, chunk_size=5000, where=None, only_drifted=True):
+    """
+    Recompute derived fields chunk by chunk, committing after each chunk.
+
+    `where` is an optional list of extra filter clauses (e.g. one UOM).
+    `only_drifted=False` checks every matching row instead of only those the
+    SQL drift predicate flags. Progress goes to `job` when given; rows
+    edited concurrently are skipped (not counted as changed).
+    Returns (rows_examined, rows_changed).
+    """
+    ruleset = thresholds.get_ruleset()
+    columns = sorted({
+        "id", "warehouse", "version", *batch.BASE_COLUMNS, *batch.DERIVED_COLUMNS, *batch.KEY_COLUMNS,
+        *search_index.SEARCH_COLUMNS,
+    })
+    clauses = list(where or [])
+    if only_drifted:
+        clauses.append(drift_clause(ruleset))
+
+    table = StockItem.__table__
+    write = (
+        update(table)
+        .where(table.c.id == bindparam("_id"), table.c.version == bindparam("_version"))
+        .values({
+            **{name: bindparam(f"new_{name}") for name in batch.DERIVED_COLUMNS},
+            "version": table.c.version + 1,
+        })
+    )
+
+    last_id, examined, changed = 0, 0, 0
+    while True:
+        rows = db.session.execute(
+            select(*[getattr(StockItem, name) for name in columns])
+            .where(StockItem.id > last_id, *clauses)
+            .order_by(StockItem.id)
+            .limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        derived = batch.compute_derived(
+            *([row[name] for row in rows] for name in batch.BASE_COLUMNS),
+            ruleset=ruleset,
+            **{name: [row[name] for row in rows] for name in batch.KEY_COLUMNS},
+        )
+        stale = np.zeros(len(rows), dtype=bool)
+        for name in DERIVED_NUMERIC:
+            stale |= _differs([row[name] for row in rows], derived[name])
+        stale |= np.asarray([row["alarm_status"] for row in rows], dtype=object) != derived["alarm_status"]
+
+        fixed, before = [], {}
+        for index in np.flatnonzero(stale):
+            after = dict(rows[index])
+            for name in batch.DERIVED_COLUMNS:
+                value = derived[name][index]
+                after[name] = value.item() if hasattr(value, "item") else value
+            before[after["id"]] = rows[index]
+            fixed.append(after)
+
+        if fixed:
+            written = _write_fixed(write, fixed)
+            fixed = [row for row in fixed if row["id"] in written]
+            # rows of every warehouse: counters and change events go per warehouse
+            deltas = {}
+            for row in fixed:
+                delta = deltas.setdefault(row["warehouse"], summary.empty_delta())
+                summary.add_change(delta, summary.snapshot(before[row["id"]]), summary.snapshot(row))
+            for warehouse, delta in deltas.items():
+                summary.apply_delta(delta, warehouse)
+                changes.record(
+                    "updated", [row["id"] for row in fixed if row["warehouse"] == warehouse],
+                    warehouse=warehouse,
+                )
+            search_index.index_items(fixed)
+
+        examined += len(rows)
+        changed += len(fixed)
+        if job is not None:
+            job.processed = examined
+            job.changed = changed
+        db.session.commit()
+
+    return examined, changed
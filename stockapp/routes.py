@@ -1,64 +1,106 @@
-from flask import Blueprint, jsonify, render_template, request
+from flask import Blueprint, Response, abort, current_app, g, jsonify, render_template, request, stream_with_context
 from sqlalchemy import func
-from .models import StockItem
-from . import db
+from .models import AlarmThreshold, BackgroundJob, StockItem, StockMovement
+from . import (
+    analytics, batch_edit, bulk, changes, db, events, export, forecast, imports, instrumentation, jobs,
+    ledger, recompute, serialize, startup, summary, sync, thresholds, warehouses,
+)
+from .cache import cached_response
+from .engines import pool_stats, read_replica
+from . import search as search_index
+from .utils import decode_cursor, encode_cursor, estimate_total, inventory_filters
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import or_, cast, String
+from sqlalchemy.orm.exc import StaleDataError
 
 main = Blueprint("main", __name__)
 
+# Tries for an unconditional stock posting that keeps losing races
+POSTING_ATTEMPTS = 3
+
+@main.before_request
+def resolve_warehouse():
+    """
+    Scope the request to ?warehouse=<code> (DEFAULT_WAREHOUSE when absent).
+
+    Reads also take warehouse=* (every warehouse); writes need one.
+    """
+    try:
+        g.warehouse = warehouses.parse(
+            request.args.get("warehouse"), allow_all=request.method in ("GET", "HEAD")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @main.route("/")
 def dashboard():
-    return render_template("dashboard.html")
+    return render_template("dashboard.html", warehouse=g.warehouse or warehouses.ALL)
 
 @main.route("/api/dashboard-metrics")
+@cached_response("metrics")
+@read_replica
 def dashboard_metrics():
-    """Compute live dashboard metrics from stock data."""
-    items = StockItem.query.all()
-
-    total_items = len(items)
-    low_stock = 0
-    critical_stock = 0
-    normal_stock = 0
-    total_value = 0.0
-
-    for item in items:
-        status = (item.alarm_status or "").strip().lower()
-        total_value += float(item.inward_total_price or 0)
-
-        if status == "low stock":
-            low_stock += 1
-        elif status == "critical":
-            critical_stock += 1
-        else:
-            normal_stock += 1
-
+    """Return live dashboard metrics (aggregated in SQL / summary table); warehouse=* sums all."""
+    return jsonify(summary.get_metrics(g.warehouse))
+
+@main.route("/api/warehouses")
+@cached_response("metrics")
+@read_replica
+def warehouse_metrics():
+    """Dashboard metrics per warehouse and across all of them, from the summary counters."""
     return jsonify({
-        "total_items": int(total_items),
-        "normal_stock": int(normal_stock),
-        "low_stock": int(low_stock),
-        "critical_stock": int(critical_stock),
-        "total_value": round(total_value, 2)
+        "warehouses": summary.warehouse_metrics(),
+        "total": summary.get_metrics(None),
     })
 
+@main.route("/api/analytics/timeseries")
+@cached_response("metrics")
+@read_replica
+def analytics_timeseries():
+    """
+    Inward/outward quantity, value and margin over time, from the rollups.
+
+    Usage:
+      /api/analytics/timeseries                       (daily, last 365 days)
+      /api/analytics/timeseries?period=week&from=2025-01-01&to=2025-12-31
+      /api/analytics/timeseries?period=month&from=2024-01-01
+      /api/analytics/timeseries?period=month&warehouse=*       (all warehouses)
+    """
+    try:
+        period, start, end = analytics.parse_range(request.args)
+        return jsonify(analytics.timeseries(period, start, end, g.warehouse)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @main.route("/inventory")
 def inventory_page():
     """Renders the interactive inventory management dashboard."""
-    return render_template("inventory.html")
+    return render_template("inventory.html", warehouse=g.warehouse or warehouses.ALL)
 
 @main.route("/api/inventory")
+@cached_response("inventory")
+@read_replica
 def inventory_api():
     """
-    Return inventory items with optional:
+    Return the inventory items of one warehouse (warehouse=* for all) with optional:
     - status filter
-    - Full-table dynamic search
+    - indexed text search (trigram index over the text columns)
+    - typed range filters on numeric and date columns
     - pagination (page + limit)
 
+    - keyset pagination (cursor + limit) for constant-cost deep paging
+    - field projection (fields=a,b,c; id is always included)
+    - sort=stockout_risk: soonest forecast stockout first (page mode)
+
     New Usage:
       /api/inventory?page=1&limit=50
-      /api/inventory?status=low&page=2
+      /api/inventory?warehouse=pune&status=low&page=2
       /api/inventory?search=bolt
+      /api/inventory?inward_qty_min=100&inward_date_from=2025-11-01
+      /api/inventory?cursor=&limit=50                (first page, cursor mode)
+      /api/inventory?cursor=<next_cursor>&exact_total=1
+      /api/inventory?fields=item_code,balance_stock_qty,alarm_status&limit=1000
+      /api/inventory?sort=stockout_risk&fields=item_code,days_to_stockout,stockout_risk
     """
 
     # -------------------------------
@@ -67,67 +109,35 @@ def inventory_api():
     page = int(request.args.get("page", 1))
     limit = int(request.args.get("limit", 50))
 
-    requested_status = (request.args.get("status") or "").strip().lower()
-    search = (request.args.get("search") or "").strip().lower()
-
-    # -------------------------------
-    # Map allowed status filters
-    # -------------------------------
-    status_map = {
-        "normal": "Normal",
-        "low": "Low Stock",
-        "critical": "Critical"
-    }
-
     try:
         # -------------------------------
-        # Start base query
+        # Status, search and range filters
         # -------------------------------
-        query = StockItem.query
+        try:
+            filters = inventory_filters(request.args)
+            fields = serialize.parse_fields(request.args.get("fields"))
+            order = forecast.sort_order(request.args.get("sort"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Counts go through the ORM query; pages are read as Core rows
+        query = StockItem.query.filter(*filters)
+        rows_query = serialize.item_select(fields, filters, with_forecast=order is not None)
 
         # -------------------------------
-        # Apply status filter (old behavior)
+        # Cursor mode (seek on id, no OFFSET)
         # -------------------------------
-        if requested_status:
-            if requested_status not in status_map:
-                return jsonify({
-                    "error": "Invalid status filter. Use 'normal', 'low', or 'critical'."
-                }), 400
-
-            query = query.filter(
-                StockItem.alarm_status == status_map[requested_status]
-            )
-
-        # ------------------------------------
-        # FULL-TABLE SEARCH (all columns)
-        # ------------------------------------
-        if search:
-            search_filter = or_(
-                StockItem.item_code.ilike(f"%{search}%"),
-                StockItem.item_description.ilike(f"%{search}%"),
-
-                StockItem.inward_invoice_no.ilike(f"%{search}%"),
-                StockItem.inward_date.ilike(f"%{search}%"),
-                StockItem.uom.ilike(f"%{search}%"),
-                cast(StockItem.inward_qty, String).ilike(f"%{search}%"),
-                cast(StockItem.inward_unit_price, String).ilike(f"%{search}%"),
-                cast(StockItem.inward_total_price, String).ilike(f"%{search}%"),
-
-                cast(StockItem.outward_qty, String).ilike(f"%{search}%"),
-                cast(StockItem.balance_stock_qty, String).ilike(f"%{search}%"),
-
-                StockItem.alarm_status.ilike(f"%{search}%"),
-
-                StockItem.outward_invoice_no.ilike(f"%{search}%"),
-                StockItem.outward_date.ilike(f"%{search}%"),
-                cast(StockItem.outward_unit_price, String).ilike(f"%{search}%"),
-                cast(StockItem.outward_total_price, String).ilike(f"%{search}%"),
-
-                StockItem.eway_bill_number.ilike(f"%{search}%"),
-                StockItem.vehicle_number.ilike(f"%{search}%"),
-                StockItem.po_number.ilike(f"%{search}%")
-            )
-            query = query.filter(search_filter)
+        if "cursor" in request.args:
+            if order is not None:
+                return jsonify({"error": "sort is only supported with page pagination."}), 400
+            try:
+                cursor = decode_cursor(request.args.get("cursor"))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            page_body = _cursor_page(query, rows_query, fields, cursor, limit)
+            with instrumentation.serializing():
+                response = serialize.json_response(page_body)
+            return response, 200
 
         # -------------------------------
         # Count BEFORE pagination
@@ -137,28 +147,29 @@ def inventory_api():
         # -------------------------------
         # Apply pagination
         # -------------------------------
-        items = (
-            query.order_by(StockItem.id.desc())
+        rows = db.session.execute(
+            rows_query.order_by(*(order or (StockItem.id.desc(),)))
             .offset((page - 1) * limit)
             .limit(limit)
-            .all()
-        )
-
-        # -------------------------------
-        # Compute all item fields (existing feature)
-        # -------------------------------
-        computed_items = [item.compute_fields() for item in items]
-
-        # -------------------------------
-        # Final paginated response
-        # -------------------------------
-        return jsonify({
-            "page": page,
-            "limit": limit,
-            "total_items": total_items,
-            "total_pages": (total_items + limit - 1) // limit,
-            "items": computed_items
-        }), 200
+        ).all()
+
+        with instrumentation.serializing():
+            # -------------------------------
+            # Compute all item fields (read-only, see serialize.py)
+            # -------------------------------
+            computed_items = serialize.serialize_rows(rows, fields)
+
+            # -------------------------------
+            # Final paginated response
+            # -------------------------------
+            response = serialize.json_response({
+                "page": page,
+                "limit": limit,
+                "total_items": total_items,
+                "total_pages": (total_items + limit - 1) // limit,
+                "items": computed_items
+            })
+        return response, 200
 
     except Exception as e:
         return jsonify({
@@ -167,19 +178,186 @@ def inventory_api():
         }), 500
 
 
+
+def _cursor_page(query, rows_query, fields, cursor, limit):
+    """Fetch one keyset page (newest first) and its neighbouring cursors."""
+    if cursor and cursor["dir"] == "prev":
+        rows = db.session.execute(
+            rows_query.where(StockItem.id > cursor["id"])
+            .order_by(StockItem.id.asc())
+            .limit(limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        items = list(reversed(rows[:limit]))
+        has_newer, has_older = has_more, True
+    else:
+        page_query = rows_query.where(StockItem.id < cursor["id"]) if cursor else rows_query
+        rows = db.session.execute(page_query.order_by(StockItem.id.desc()).limit(limit + 1)).all()
+        items = rows[:limit]
+        has_newer, has_older = cursor is not None, len(rows) > limit
+
+    # Exact totals cost a full count; only pay for it when asked
+    if request.args.get("exact_total", "").lower() in ("1", "true", "yes"):
+        total_items, estimated = query.order_by(None).count(), False
+    else:
+        total_items, estimated = estimate_total(request.args, query), True
+
+    with instrumentation.serializing():
+        computed_items = serialize.serialize_rows(items, fields)
+
+    return {
+        "limit": limit,
+        "items": computed_items,
+        "next_cursor": encode_cursor(items[-1].id, "next") if items and has_older else None,
+        "prev_cursor": encode_cursor(items[0].id, "prev") if items and has_newer else None,
+        "total_items": total_items,
+        "total_estimated": estimated,
+    }
+
+
+@main.route("/api/export")
+def export_inventory():
+    """
+    Stream the inventory as CSV, NDJSON or XLSX.
+
+    Takes the same warehouse/status/search/range filters as /api/inventory:
+      /api/export?format=csv&status=low
+      /api/export?format=xlsx&search=bolt
+    """
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    if fmt not in export.FORMATS:
+        return jsonify({"error": "Invalid format. Use 'csv', 'ndjson' or 'xlsx'."}), 400
+    try:
+        filters = inventory_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype, extension = export.FORMATS[fmt]
+    filename = f"inventory-{datetime.now():%Y%m%d-%H%M%S}.{extension}"
+    chunks = export.stream(fmt, filters, current_app.config.get("EXPORT_BATCH_SIZE", 5000))
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @main.route("/api/item/<int:item_id>")
+@cached_response("item")
+@read_replica
 def get_single_item(item_id):
-    """Return one inventory item for live updates"""
+    """
+    Return one inventory item for live updates.
+
+    The stored row is served as-is: writes and threshold reclassification
+    keep its derived fields current and bump its version, which is the
+    ETag, so a 304 never hides a changed alarm status.
+    """
+    item = _get_item(item_id)
+    with instrumentation.serializing():
+        response = jsonify(item.to_dict())
+    return _versioned(response, item)
+
+
+def _get_item(item_id):
+    """The item with `item_id` if it is in the request's warehouse, else 404."""
     item = StockItem.query.get_or_404(item_id)
-    return jsonify(item.compute_fields())
+    if not warehouses.in_scope(item, g.warehouse):
+        abort(404)
+    return item
+
+
+# -------------------------------
+# Optimistic concurrency helpers
+# -------------------------------
+def _versioned(response, item):
+    """Tag a single-item response with the item's version as its ETag."""
+    response.set_etag(str(item.version))
+    return response
+
+
+def _version_conflict(item, data=None):
+    """
+    Check the client's idea of the item version; None when it matches.
+
+    `If-Match: "<version>"` (the ETag of GET /api/item/<id>) answers 412
+    on mismatch, a "version" field in the JSON body 409. Without either
+    the write is unconditional.
+    """
+    if request.if_match:
+        if not request.if_match.contains(str(item.version)):
+            return _versioned(jsonify({
+                "error": "Item has changed since it was read.",
+                "item": item.to_dict()
+            }), item), 412
+    elif isinstance(data, dict) and data.get("version") is not None:
+        try:
+            expected = int(data["version"])
+        except (TypeError, ValueError):
+            return jsonify({"error": "'version' must be an integer."}), 400
+        if expected != item.version:
+            return _versioned(jsonify({
+                "error": "Item has changed since it was read.",
+                "item": item.to_dict()
+            }), item), 409
+    return None
+
+
+def _post_movement(item, direction, qty, conditional=False, **kwargs):
+    """
+    Post a movement against the version of `item` that was read.
+
+    Returns (summary before-state, movement). Instead of locking the row,
+    a posting that loses the race to another write re-reads it and tries
+    again; a conditional request (If-Match / "version") gets the
+    StaleDataError instead.
+    """
+    for attempt in range(POSTING_ATTEMPTS):
+        before = summary.snapshot(item)
+        try:
+            movement = ledger.post_movement(item, direction, qty, expected_version=item.version, **kwargs)
+            return before, movement
+        except StaleDataError:
+            if conditional or attempt == POSTING_ATTEMPTS - 1:
+                raise
+            db.session.refresh(item)
+
+
+def _stale_response(item_id):
+    """409 for an edit that lost the race at write time, with the current row."""
+    db.session.rollback()
+    item = db.session.get(StockItem, item_id)
+    body = {"error": "Item was changed by another request. Re-read it and retry."}
+    if item is None:
+        return jsonify(body), 409
+    return _versioned(jsonify({**body, "item": item.to_dict()}), item), 409
 
 # ✅ Improved Add Item route
 @main.route("/api/add", methods=["POST"])
 def add_item():
-    """Add one or more new inventory items safely."""
-    data = request.get_json(silent=True)
-    if data is None:
-        return jsonify({"error": "Invalid JSON payload."}), 400
+    """
+    Add one or more new inventory items to the request's warehouse safely.
+
+    A JSON array (or an NDJSON body) goes through the streaming bulk
+    importer: rows are committed in chunks of BULK_CHUNK_SIZE and each one
+    is reported as inserted, duplicate or invalid. Pass ?report=full to get
+    a result for inserted rows as well.
+
+    ?on_conflict=update|skip turns an existing item_code into a native
+    upsert (merge the supplied fields, re-deriving totals, balance and
+    alarm status in the same statement) or a no-op instead of a 409.
+    """
+    on_conflict = request.args.get("on_conflict") or None
+    if on_conflict not in (None, "update", "skip"):
+        return jsonify({"error": "Invalid on_conflict. Use 'update' or 'skip'."}), 400
+
+    try:
+        kind, data = bulk.read_payload(request)
+    except bulk.PayloadError as e:
+        return jsonify({"error": str(e)}), 400
 
     # Helper to safely parse date strings
     def parse_date(val):
@@ -193,11 +371,13 @@ def add_item():
     def create_item(entry):
         """Create a StockItem from dict, computing all values."""
         return StockItem(
+            warehouse=g.warehouse,
             item_code=(entry.get("item_code") or "").strip(),
             item_description=entry.get("item_description"),
             inward_invoice_no=entry.get("inward_invoice_no"),
             inward_date=parse_date(entry.get("inward_date")),
             uom=entry.get("uom"),
+            category=entry.get("category"),
             inward_qty=float(entry.get("inward_qty") or 0),
             inward_unit_price=float(entry.get("inward_unit_price") or 0),
             outward_qty=float(entry.get("outward_qty") or 0),
@@ -210,34 +390,67 @@ def add_item():
         )
 
     try:
-        # ✅ Bulk insert
-        if isinstance(data, list):
-            if not data:
+        # ✅ Bulk insert (streamed, chunked commits)
+        if kind == "list":
+            importer = bulk.BulkImporter(
+                report_all=request.args.get("report") == "full",
+                on_conflict=on_conflict
+            )
+            seen = importer.run(data)
+            if not seen:
                 return jsonify({"error": "Empty list provided."}), 400
 
-            items = []
-            for entry in data:
-                if not entry.get("item_code"):
-                    return jsonify({"error": "Each entry must have an 'item_code'."}), 400
-                item = create_item(entry)
-                item.compute_fields()
-                db.session.add(item)
-                items.append(item)
-            db.session.commit()
-            return jsonify({"message": f"{len(items)} items added successfully."}), 201
+            counts = importer.counts
+            if counts["inserted"]:
+                status_code = 201
+            elif counts["updated"] or counts["skipped"]:
+                status_code = 200
+            elif counts["duplicate"]:
+                status_code = 409
+            else:
+                status_code = 400
+            message = f"{counts['inserted']} items added successfully."
+            if on_conflict:
+                message += f" {counts['updated']} updated, {counts['skipped']} skipped."
+            return jsonify({
+                "message": message,
+                **counts,
+                "results": importer.results
+            }), status_code
 
         # ✅ Single insert
-        elif isinstance(data, dict):
+        elif kind == "dict":
             if not data.get("item_code"):
                 return jsonify({"error": "Field 'item_code' is required."}), 400
+
+            if on_conflict:
+                importer = bulk.BulkImporter(report_all=True, on_conflict=on_conflict)
+                importer.run([data])
+                result = importer.results[0]
+                if result["status"] == "invalid":
+                    return jsonify({"error": result["error"]}), 400
+                item = StockItem.query.filter_by(
+                    warehouse=g.warehouse, item_code=result["item_code"]
+                ).first()
+                return jsonify({
+                    "message": f"Item {result['status']} successfully.",
+                    "status": result["status"],
+                    "item": item.to_dict() if item else None
+                }), 201 if result["status"] == "inserted" else 200
+
             new_item = create_item(data)
             new_item.compute_fields()
             db.session.add(new_item)
+            summary.record_change(None, summary.snapshot(new_item))
+            db.session.flush()
+            ledger.record_changes([(None, new_item)], "opening", is_new=True)
+            search_index.index_items([new_item], is_new=True)
+            changes.record("created", [new_item.id], rows=[new_item.to_dict()])
             db.session.commit()
-            return jsonify({
+            return _versioned(jsonify({
                 "message": "Item added successfully.",
-                "item": new_item.compute_fields()
-            }), 201
+                "item": new_item.to_dict()
+            }), new_item), 201
 
         else:
             return jsonify({"error": "Invalid data format. Expected dict or list."}), 400
@@ -245,6 +458,9 @@ def add_item():
     except IntegrityError:
         db.session.rollback()
         return jsonify({"error": "Duplicate item_code. Must be unique."}), 409
+    except bulk.PayloadError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Failed to add item.", "detail": str(e)}), 500
@@ -253,13 +469,35 @@ def add_item():
 # ✅ Improved Update Item route
 @main.route("/api/update/<int:item_id>", methods=["PUT", "PATCH"])
 def update_item(item_id):
-    """Update an existing stock item safely."""
-    item = StockItem.query.get_or_404(item_id)
+    """
+    Update an existing stock item safely.
+
+    Send the version you read (If-Match header or "version" field) to
+    make the edit conditional. {"increment": {"outward_qty": 5}} adds to
+    a quantity with an atomic server-side UPDATE instead of overwriting
+    it, so concurrent postings never lose each other.
+    """
+    item = _get_item(item_id)
     data = request.get_json(silent=True)
 
     if data is None:
         return jsonify({"error": "Invalid JSON payload."}), 400
 
+    increments = data.get("increment") or {}
+    if not isinstance(increments, dict) or set(increments) - {"inward_qty", "outward_qty"}:
+        return jsonify({"error": "'increment' takes 'inward_qty' and/or 'outward_qty'."}), 400
+    if set(increments) & set(data):
+        return jsonify({"error": "A quantity cannot be both set and incremented."}), 400
+    try:
+        increments = {field: float(qty) for field, qty in increments.items() if float(qty)}
+    except (TypeError, ValueError):
+        return jsonify({"error": "Increments must be numbers."}), 400
+
+    conflict = _version_conflict(item, data)
+    if conflict:
+        return conflict
+    conditional = bool(request.if_match) or data.get("version") is not None
+
     def parse_date(val):
         if not val:
             return None
@@ -269,9 +507,12 @@ def update_item(item_id):
             return None
 
     try:
+        before = summary.snapshot(item)
+        before_quantities = ledger.quantities(item)
+
         # ✅ Update only allowed fields if provided
         for field in [
-            "item_code", "item_description", "inward_invoice_no", "uom",
+            "item_code", "item_description", "inward_invoice_no", "uom", "category",
             "eway_bill_number", "vehicle_number", "po_number",
             "outward_invoice_no"
         ]:
@@ -292,13 +533,31 @@ def update_item(item_id):
             item.outward_date = parse_date(data.get("outward_date"))
 
         item.compute_fields()
+        # a version-checked UPDATE (StaleDataError when the row moved on)
+        edited = db.session.is_modified(item)
+        db.session.flush()
+        ledger.record_changes([(before_quantities, item)], "edit")
+        for field, qty in increments.items():
+            direction = "in" if field == "inward_qty" else "out"
+            if edited:
+                # this transaction already holds the row and bumped its version
+                ledger.post_movement(item, direction, qty, source="edit",
+                                     expected_version=item.version, bump_version=False)
+            else:
+                before, _ = _post_movement(item, direction, qty, conditional, source="edit")
+                edited = True
+        summary.record_change(before, summary.snapshot(item))
+        search_index.index_items([item])
+        changes.record("updated", [item.id], rows=[item.to_dict()])
         db.session.commit()
 
-        return jsonify({
+        return _versioned(jsonify({
             "message": f"Item '{item.item_code}' updated successfully.",
-            "item": item.compute_fields()
-        }), 200
+            "item": item.to_dict()
+        }), item), 200
 
+    except StaleDataError:
+        return _stale_response(item_id)
     except IntegrityError:
         db.session.rollback()
         return jsonify({"error": "Duplicate item_code. Must be unique."}), 409
@@ -308,8 +567,435 @@ def update_item(item_id):
 
 @main.route("/api/delete/<int:item_id>", methods=["DELETE"])
 def delete_item(item_id):
-    """Delete a stock item."""
-    item = StockItem.query.get_or_404(item_id)
-    db.session.delete(item)
+    """Delete a stock item (conditional with If-Match, like /api/update)."""
+    item = _get_item(item_id)
+    conflict = _version_conflict(item)
+    if conflict:
+        return conflict
+    try:
+        search_index.remove_items([item.id])
+        ledger.remove_items([item.id])
+        db.session.delete(item)
+        summary.record_change(summary.snapshot(item), None)
+        changes.record("deleted", [item.id])
+        db.session.commit()
+    except StaleDataError:
+        return _stale_response(item_id)
+    return jsonify({"message": f"Item '{item.item_code}' deleted successfully"}), 200
+
+
+# -------------------------------
+# Batch update / delete
+# -------------------------------
+@main.route("/api/items", methods=["PATCH"])
+def batch_update_items():
+    """
+    Update many items of the request's warehouse in one transaction.
+
+      {"ids": [1, 2, 3], "set": {"uom": "kg", "outward_qty": 0}}
+      {"filter": {"status": "critical", "search": "bolt"}, "set": {...}}
+      {"items": [{"id": 1, "inward_qty": 40}, {"id": 7, "po_number": "PO-9"}]}
+
+    Totals, balance and alarm status are re-derived in the same statement.
+    Returns per-id results (updated / not_found / invalid).
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON payload."}), 400
+
+    try:
+        counts, results = batch_edit.update_items(data)
+    except batch_edit.BatchError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Duplicate item_code. Must be unique."}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Failed to update items.", "detail": str(e)}), 500
+
+    return jsonify({
+        "message": f"{counts['updated']} items updated.",
+        **counts,
+        "results": results
+    }), 200
+
+
+@main.route("/api/items", methods=["DELETE"])
+def batch_delete_items():
+    """
+    Delete many items of the request's warehouse in one transaction.
+
+      {"ids": [1, 2, 3]}  or  {"filter": {"status": "normal", "balance_stock_qty_max": 0}}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON payload."}), 400
+
+    try:
+        counts, results = batch_edit.delete_items(data)
+    except batch_edit.BatchError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Failed to delete items.", "detail": str(e)}), 500
+
+    return jsonify({
+        "message": f"{counts['deleted']} items deleted.",
+        **counts,
+        "results": results
+    }), 200
+
+
+# -------------------------------
+# Movement ledger
+# -------------------------------
+@main.route("/api/item/<int:item_id>/movements", methods=["POST"])
+def post_movement(item_id):
+    """
+    Record a receipt or issue against an item.
+
+    Body: {"direction": "in"|"out", "qty": 25, "unit_price": 12.5,
+           "date": "YYYY-MM-DD", "invoice_no": ..., "eway_bill_number": ...,
+           "vehicle_number": ..., "po_number": ...}
+    """
+    item = _get_item(item_id)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON payload."}), 400
+
+    direction = (data.get("direction") or "").strip().lower()
+    if direction not in ledger.DIRECTIONS:
+        return jsonify({"error": "Field 'direction' must be 'in' or 'out'."}), 400
+    try:
+        qty = float(data.get("qty"))
+        unit_price = float(data["unit_price"]) if data.get("unit_price") not in (None, "") else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "'qty' and 'unit_price' must be numbers."}), 400
+    if qty <= 0:
+        return jsonify({"error": "'qty' must be greater than 0."}), 400
+    movement_date = None
+    if data.get("date"):
+        try:
+            movement_date = datetime.strptime(data["date"], "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return jsonify({"error": "'date' must be a date in YYYY-MM-DD format."}), 400
+
+    try:
+        before, movement = _post_movement(
+            item, direction, qty,
+            unit_price=unit_price,
+            movement_date=movement_date,
+            source="receipt" if direction == "in" else "issue",
+            invoice_no=data.get("invoice_no"),
+            eway_bill_number=data.get("eway_bill_number"),
+            vehicle_number=data.get("vehicle_number"),
+            po_number=data.get("po_number"),
+        )
+        summary.record_change(before, summary.snapshot(item))
+        search_index.index_items([item])
+        changes.record("updated", [item.id], rows=[item.to_dict()])
+        db.session.commit()
+    except StaleDataError:
+        return _stale_response(item_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Failed to record movement.", "detail": str(e)}), 500
+
+    return jsonify({"movement": movement.to_dict(), "item": item.to_dict()}), 201
+
+
+@main.route("/api/item/<int:item_id>/movements")
+def list_movements(item_id):
+    """
+    Return an item's ledger, newest first.
+
+      /api/item/5/movements?limit=50
+      /api/item/5/movements?before=<movement id>     (next page)
+    """
+    _get_item(item_id)
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 500)
+        before = int(request.args["before"]) if request.args.get("before") else None
+    except ValueError:
+        return jsonify({"error": "'limit' and 'before' must be integers."}), 400
+
+    query = StockMovement.query.filter(StockMovement.item_id == item_id)
+    if before is not None:
+        query = query.filter(StockMovement.id < before)
+    movements = query.order_by(StockMovement.id.desc()).limit(limit + 1).all()
+    return jsonify({
+        "items": [movement.to_dict() for movement in movements[:limit]],
+        "next_before": movements[limit - 1].id if len(movements) > limit else None,
+    }), 200
+
+
+@main.route("/api/item/<int:item_id>/balance")
+def item_balance(item_id):
+    """Balance as of a date: /api/item/5/balance?as_of=2026-03-31 (default today)."""
+    _get_item(item_id)
+    raw = request.args.get("as_of")
+    try:
+        as_of = datetime.strptime(raw, "%Y-%m-%d").date() if raw else datetime.now().date()
+    except ValueError:
+        return jsonify({"error": "'as_of' must be a date in YYYY-MM-DD format."}), 400
+    return jsonify(ledger.balance_as_of(item_id, as_of)), 200
+
+
+@main.route("/api/events")
+def event_stream():
+    """
+    Server-sent events feed of committed item changes and metric deltas.
+
+    Reconnecting clients send Last-Event-ID (or ?last_event_id=) to replay
+    what they missed.
+    """
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid Last-Event-ID."}), 400
+
+    return Response(
+        events.get_broadcaster().stream(last_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@main.route("/api/jobs/recompute", methods=["POST"])
+def start_recompute_job():
+    """
+    Start a background recompute/backfill of derived fields.
+
+    Body (optional): {"chunk_size": 5000, "all": false}. With "all": true
+    every row is checked, not just the ones the SQL drift check flags.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        chunk_size = int(data.get("chunk_size") or current_app.config.get("RECOMPUTE_CHUNK_SIZE", 5000))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'chunk_size' must be an integer."}), 400
+
+    job = jobs.submit(
+        "recompute",
+        recompute.recompute_derived,
+        chunk_size=max(chunk_size, 1),
+        only_drifted=not data.get("all"),
+    )
+    return jsonify({"message": "Recompute job started.", "job": job.to_dict()}), 202
+
+
+@main.route("/api/jobs/snapshot", methods=["POST"])
+def start_snapshot_job():
+    """Start a background balance snapshot. Body (optional): {"as_of": "YYYY-MM-DD"}."""
+    data = request.get_json(silent=True) or {}
+    as_of = None
+    if data.get("as_of"):
+        try:
+            as_of = datetime.strptime(data["as_of"], "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return jsonify({"error": "'as_of' must be a date in YYYY-MM-DD format."}), 400
+
+    job = jobs.submit("snapshot", ledger.take_snapshots, as_of=as_of)
+    return jsonify({"message": "Snapshot job started.", "job": job.to_dict()}), 202
+
+
+@main.route("/api/jobs/forecast", methods=["POST"])
+def start_forecast_job():
+    """Start a background recompute of every item's stockout forecast. Body (optional): {"as_of": "YYYY-MM-DD"}."""
+    data = request.get_json(silent=True) or {}
+    as_of = None
+    if data.get("as_of"):
+        try:
+            as_of = datetime.strptime(data["as_of"], "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return jsonify({"error": "'as_of' must be a date in YYYY-MM-DD format."}), 400
+
+    job = jobs.submit("forecast", forecast.recompute_forecasts, as_of=as_of)
+    return jsonify({"message": "Forecast job started.", "job": job.to_dict()}), 202
+
+
+@main.route("/api/import", methods=["POST"])
+def import_sheet():
+    """
+    Queue a CSV/XLSX sheet (multipart field `file`) for background import
+    into the request's warehouse.
+
+    Headers are matched to item fields case-insensitively ("Inward Qty" ->
+    inward_qty). ?on_conflict=update|skip works as on /api/add. Returns
+    202 with a job to poll on /api/jobs/<id>.
+    """
+    on_conflict = request.args.get("on_conflict") or None
+    if on_conflict not in (None, "update", "skip"):
+        return jsonify({"error": "Invalid on_conflict. Use 'update' or 'skip'."}), 400
+
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"error": "Attach the sheet as multipart field 'file'."}), 400
+    fmt = imports.detect_format(upload.filename, request.args.get("format"))
+    if fmt is None:
+        return jsonify({"error": "Unsupported file type. Upload a .csv or .xlsx sheet."}), 400
+
+    path = imports.save_upload(upload, fmt)
+    job = jobs.submit("import", imports.run_import, path, fmt, on_conflict, g.warehouse)
+    return jsonify({"message": "Import started.", "job": job.to_dict()}), 202
+
+
+@main.route("/api/sync/push", methods=["POST"])
+def sync_push():
+    """
+    Apply a terminal's pending changes to ?warehouse= (see sync.apply_push).
+
+    Body (JSON, optionally gzip): {"terminal": id, "changes": [{"ref",
+    "seq", "op", "id", "base", "row"}, ...]}. Returns each item's outcome
+    and its central row, gzipped when accepted.
+    """
+    if not sync.journal_enabled():
+        return jsonify({"error": "Sync is disabled. Set SYNC_JOURNAL_ENABLED=1."}), 404
+    try:
+        data = sync.read_payload(request)
+        results = sync.apply_push(data.get("terminal"), data.get("changes"))
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    return sync.compressed_response({"results": results}, request)
+
+
+@main.route("/api/sync/pull")
+def sync_pull():
+    """Central item changes after ?since=<cursor> (?limit=, ?warehouse=), for terminals to apply."""
+    if not sync.journal_enabled():
+        return jsonify({"error": "Sync is disabled. Set SYNC_JOURNAL_ENABLED=1."}), 404
+    try:
+        since = int(request.args.get("since", 0))
+        limit = int(request.args.get("limit") or current_app.config.get("SYNC_BATCH_SIZE", 500))
+    except ValueError:
+        return jsonify({"error": "'since' and 'limit' must be integers."}), 400
+    entries, cursor, more = sync.changes_since(max(since, 0), min(max(limit, 1), 5000), g.warehouse)
+    return sync.compressed_response({"changes": entries, "cursor": cursor, "more": more}, request)
+
+
+@main.route("/api/sync/status")
+def sync_status():
+    """Sync mode, pending local changes and the last push/pull of this process's database."""
+    return jsonify(sync.status())
+
+
+@main.route("/api/jobs/sync", methods=["POST"])
+def start_sync_job():
+    """Run a terminal's push/pull round now, in the background."""
+    if not current_app.config.get("SYNC_CENTRAL_URL"):
+        return jsonify({"error": "No central server configured. Set SYNC_CENTRAL_URL."}), 404
+    job = jobs.submit("sync", sync.run_cycle)
+    return jsonify({"message": "Sync job started.", "job": job.to_dict()}), 202
+
+
+@main.route("/api/stats/pool")
+def database_pool_stats():
+    """Connection pool usage per engine and replica routing counts (for pool sizing)."""
+    return jsonify(pool_stats())
+
+
+@main.route("/healthz")
+def liveness():
+    """Liveness probe: the process serves requests (never touches the database)."""
+    return jsonify({"status": "ok"})
+
+
+@main.route("/readyz")
+def readiness():
+    """Readiness probe: 200 once the primary database answers, else 503."""
+    ok, error = startup.check_database()
+    body = {"status": "ready" if ok else "unavailable", "database": "ok" if ok else error}
+    body["startup"] = startup.startup_stats()
+    return jsonify(body), 200 if ok else 503
+
+
+@main.route("/metrics")
+def prometheus_metrics():
+    """Per-endpoint request, SQL and serialization metrics in the Prometheus text format."""
+    text = instrumentation.metrics_text()
+    if text is None:
+        return jsonify({"error": "Instrumentation is disabled. Set INSTRUMENTATION_ENABLED=1."}), 404
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
+
+@main.route("/api/jobs/<job_id>")
+def get_job(job_id):
+    """Return the status and progress of a background job."""
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job.to_dict())
+
+
+@main.route("/api/thresholds")
+def list_thresholds():
+    """List the alarm threshold rules."""
+    rules = AlarmThreshold.query.order_by(AlarmThreshold.scope, AlarmThreshold.match_value).all()
+    return jsonify([rule.to_dict() for rule in rules])
+
+
+@main.route("/api/thresholds", methods=["POST", "PUT"])
+def save_threshold():
+    """
+    Create or replace one threshold rule and re-classify only the rows it covers.
+
+    Body: {"scope": "item|category|uom|default", "match_value": "...",
+           "critical_ratio": 0.6, "low_ratio": 0.8,
+           "critical_qty": null, "low_qty": null}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON payload."}), 400
+
+    scope = (data.get("scope") or "").strip().lower()
+    if scope not in thresholds.SCOPES:
+        return jsonify({"error": "Invalid scope. Use 'item', 'category', 'uom' or 'default'."}), 400
+    match_value = None if scope == "default" else (data.get("match_value") or "").strip()
+    if scope != "default" and not match_value:
+        return jsonify({"error": "Field 'match_value' is required for this scope."}), 400
+
+    levels = {}
+    for field in ("critical_ratio", "low_ratio", "critical_qty", "low_qty"):
+        value = data.get(field)
+        try:
+            levels[field] = None if value in (None, "") else float(value)
+        except (TypeError, ValueError):
+            return jsonify({"error": f"'{field}' must be a number."}), 400
+        if levels[field] is not None and levels[field] < 0:
+            return jsonify({"error": f"'{field}' must not be negative."}), 400
+
+    rule = AlarmThreshold.query.filter_by(scope=scope, match_value=match_value).first()
+    created = rule is None
+    if created:
+        rule = AlarmThreshold(scope=scope, match_value=match_value)
+        db.session.add(rule)
+    for field, value in levels.items():
+        setattr(rule, field, value)
+    thresholds.bump_version()
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "A rule for this scope already exists."}), 409
+
+    job = jobs.submit("reclassify", thresholds.reclassify, scope, match_value)
+    return jsonify({"rule": rule.to_dict(), "job": job.to_dict()}), 201 if created else 200
+
+
+@main.route("/api/thresholds/<int:rule_id>", methods=["DELETE"])
+def delete_threshold(rule_id):
+    """Delete a threshold rule and re-classify the rows that used it."""
+    rule = db.get_or_404(AlarmThreshold, rule_id)
+    scope, match_value = rule.scope, rule.match_value
+    db.session.delete(rule)
+    thresholds.bump_version()
     db.session.commit()
-    return jsonify({"message": f"Item '{item.item_code}' deleted successfully"}), 200
\ No newline at end of file
+
+    job = jobs.submit("reclassify", thresholds.reclassify, scope, match_value)
+    return jsonify({"message": "Threshold rule deleted.", "job": job.to_dict()}), 200
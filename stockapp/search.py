@@ -0,0 +1,167 @@
+"""
+Trigram search index for /api/inventory.
+
+Every text column of a StockItem is lower-cased and split into overlapping
+three-character grams, stored in `stock_search_trigrams` as (gram, item_id).
+A search term is answered by intersecting the posting lists of its grams
+through the primary-key index, then confirming the substring match with
+ILIKE on that small candidate set only. Works the same on SQLite and MySQL.
+"""
+from collections.abc import Mapping
+
+from sqlalchemy import bindparam, delete, func, insert, or_, select
+
+from . import db
+from .models import SearchTrigram, StockItem
+
+SEARCH_COLUMNS = (
+    "item_code",
+    "item_description",
+    "inward_invoice_no",
+    "uom",
+    "alarm_status",
+    "outward_invoice_no",
+    "eway_bill_number",
+    "vehicle_number",
+    "po_number",
+)
+
+# Two trailing pad characters let 1-2 character terms use a prefix scan
+PAD = "  "
+
+
+def _value(row, key):
+    if isinstance(row, Mapping):
+        return row.get(key)
+    return getattr(row, key, None)
+
+
+def trigrams(text):
+    """Return the set of trigrams for one padded, lower-cased value."""
+    text = (str(text) if text is not None else "").lower()
+    if not text:
+        return set()
+    text += PAD
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def item_trigrams(row):
+    grams = set()
+    for column in SEARCH_COLUMNS:
+        grams |= trigrams(_value(row, column))
+    return grams
+
+
+def _escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# -------------------------------
+# Index maintenance
+# -------------------------------
+def index_items(rows, is_new=False):
+    """
+    Bring the index in line with `rows` (ORM objects or dicts with an id).
+
+    For existing rows only the grams that appeared or disappeared are
+    written. Must run after a flush so new rows already have their ids.
+    """
+    wanted = {_value(row, "id"): item_trigrams(row) for row in rows}
+    wanted.pop(None, None)
+    if not wanted:
+        return
+
+    current = {item_id: set() for item_id in wanted}
+    if not is_new:
+        existing = db.session.execute(
+            select(SearchTrigram.item_id, SearchTrigram.gram)
+            .where(SearchTrigram.item_id.in_(list(wanted)))
+        )
+        for item_id, gram in existing:
+            current[item_id].add(gram)
+
+    to_insert, to_delete = [], []
+    for item_id, grams in wanted.items():
+        to_delete.extend(
+            {"_item_id": item_id, "_gram": gram} for gram in current[item_id] - grams
+        )
+        to_insert.extend(
+            {"gram": gram, "item_id": item_id} for gram in grams - current[item_id]
+        )
+
+    if to_delete:
+        table = SearchTrigram.__table__
+        db.session.execute(
+            delete(table)
+            .where(table.c.item_id == bindparam("_item_id"))
+            .where(table.c.gram == bindparam("_gram")),
+            to_delete,
+        )
+    if to_insert:
+        db.session.execute(insert(SearchTrigram.__table__), to_insert)
+
+
+def remove_items(item_ids):
+    """Drop the postings of deleted items (SQLite does not cascade by default)."""
+    item_ids = list(item_ids)
+    if item_ids:
+        db.session.execute(
+            delete(SearchTrigram).where(SearchTrigram.item_id.in_(item_ids))
+        )
+
+
+def rebuild_index(chunk_size=1000):
+    """Re-create the whole index in id order, committing per chunk."""
+    db.session.execute(delete(SearchTrigram))
+    db.session.commit()
+
+    columns = [StockItem.id] + [getattr(StockItem, name) for name in SEARCH_COLUMNS]
+    last_id, indexed = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(*columns)
+            .where(StockItem.id > last_id)
+            .order_by(StockItem.id)
+            .limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            break
+        index_items(rows, is_new=True)
+        db.session.commit()
+        last_id = rows[-1]["id"]
+        indexed += len(rows)
+    return indexed
+
+
+# -------------------------------
+# Querying
+# -------------------------------
+def search_filter(term):
+    """
+    Return a filter clause matching items whose text columns contain `term`.
+
+    The id subquery is served by the trigram index; the ILIKE check only
+    runs against the ids it returns.
+    """
+    term = term.strip().lower()
+    grams = {term[i:i + 3] for i in range(len(term) - 2)}
+
+    if grams:
+        candidates = (
+            select(SearchTrigram.item_id)
+            .where(SearchTrigram.gram.in_(grams))
+            .group_by(SearchTrigram.item_id)
+            .having(func.count(SearchTrigram.gram) == len(grams))
+        )
+    else:
+        candidates = (
+            select(SearchTrigram.item_id)
+            .where(SearchTrigram.gram.like(f"{_escape_like(term)}%", escape="\\"))
+            .distinct()
+        )
+
+    pattern = f"%{_escape_like(term)}%"
+    return StockItem.id.in_(candidates) & or_(*[
+        getattr(StockItem, name).ilike(pattern, escape="\\")
+        for name in SEARCH_COLUMNS
+    ])
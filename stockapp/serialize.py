@@ -0,0 +1,141 @@
+"""
+Lean, read-only serialization for the inventory list endpoints.
+
+Listing pages used to load full StockItem instances and call
+compute_fields() on each, which hydrates the identity map and rewrites
+the derived attributes (leaving the rows dirty for the next autoflush)
+just to build a dict. Here the page is selected as plain Core rows with
+only the columns needed, the derived totals and balance are computed for
+the whole page in one vectorized pass (batch.compute_derived(): the same
+formulas as compute_fields()), and the body is encoded with orjson when
+it is installed (the app's JSON provider otherwise). alarm_status is
+served as stored, the column `?status=` filters on, so a page never
+shows a row under a status it was not selected by; writes and rule
+reclassification keep it current.
+
+`?fields=id,item_code,alarm_status` projects the items down to those
+keys ("id" is always included; cursors point at it). Derived fields
+select the base columns they are computed from; the forecast fields
+outer-join stock_forecasts (see forecast.py). The output is the same
+JSON as jsonify() would produce for to_dict() plus the forecast: sorted
+keys and dates in HTTP-date form.
+"""
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import select
+from werkzeug.http import http_date
+
+from . import batch
+from .forecast import FORECAST_FIELDS
+from .models import StockForecast, StockItem
+
+# StockItem.to_dict() order, then the item's forecast
+ITEM_FIELDS = (
+    "id", "warehouse", "item_code", "item_description", "inward_invoice_no", "inward_date",
+    "uom", "category", "inward_qty", "inward_unit_price", "inward_total_price", "outward_qty",
+    "balance_stock_qty", "alarm_status", "outward_invoice_no", "outward_date",
+    "outward_unit_price", "outward_total_price", "eway_bill_number", "vehicle_number",
+    "po_number", "version", *FORECAST_FIELDS,
+)
+
+# Base columns compute_fields() derives each field from
+QUANTITIES = ("inward_qty", "inward_unit_price", "outward_qty", "outward_unit_price")
+DERIVED_FROM = {
+    "inward_total_price": ("inward_qty", "inward_unit_price"),
+    "outward_total_price": ("outward_qty", "outward_unit_price"),
+    "balance_stock_qty": ("inward_qty", "outward_qty"),
+}
+
+DATE_FIELDS = ("inward_date", "outward_date")
+
+
+def parse_fields(raw):
+    """
+    Turn a `fields=` value into the projected field names (ITEM_FIELDS order).
+
+    Returns None (every field) when empty; raises ValueError naming any
+    unknown field.
+    """
+    requested = {name.strip() for name in (raw or "").split(",") if name.strip()}
+    if not requested:
+        return None
+    unknown = requested.difference(ITEM_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}.")
+    requested.add("id")
+    return tuple(name for name in ITEM_FIELDS if name in requested)
+
+
+def item_select(fields, filters=(), with_forecast=False):
+    """
+    SELECT of the columns `fields` need (None: all), as Core rows.
+
+    stock_forecasts is joined when a forecast field is wanted or
+    `with_forecast` is set (to sort on it).
+    """
+    fields = fields or ITEM_FIELDS
+    needed = set(fields)
+    for name in fields:
+        needed.update(DERIVED_FROM.get(name, ()))
+    columns = [
+        getattr(StockForecast if name in FORECAST_FIELDS else StockItem, name)
+        for name in ITEM_FIELDS
+        if name in needed and name not in DERIVED_FROM
+    ]
+    query = select(*columns)
+    if with_forecast or needed.intersection(FORECAST_FIELDS):
+        query = query.select_from(
+            StockItem.__table__.outerjoin(
+                StockForecast.__table__, StockForecast.item_id == StockItem.id
+            )
+        )
+    return query.where(*filters)
+
+
+def serialize_rows(rows, fields):
+    """
+    Dicts for Core rows from item_select(), derived fields computed per page.
+
+    The totals and balance come from batch.compute_derived() over the
+    whole page, so they match StockItem.compute_fields() without the ORM.
+    """
+    fields = fields or ITEM_FIELDS
+    derived = [name for name in fields if name in DERIVED_FROM]
+    stored = [name for name in fields if name not in DERIVED_FROM]
+    dates = [name for name in stored if name in DATE_FIELDS]
+
+    rows = [row._asdict() for row in rows]
+    columns = []
+    if derived and rows:
+        computed = batch.compute_derived(*([row.get(name) for row in rows] for name in QUANTITIES))
+        columns = [computed[name].tolist() for name in derived]
+    derived_rows = zip(*columns) if columns else [()] * len(rows)
+
+    items = []
+    for values, derived_values in zip(rows, derived_rows):
+        item = {name: values[name] for name in stored}
+        for name in dates:
+            if isinstance(item[name], date):
+                item[name] = http_date(item[name])
+        item.update(zip(derived, derived_values))
+        items.append(item)
+    return items
+
+
+def dumps(payload):
+    """Encode `payload` as jsonify() would (sorted keys, compact), with orjson if available."""
+    provider = current_app.json
+    try:
+        import orjson
+    except ImportError:
+        return provider.response(payload).get_data()
+
+    option = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+    if provider.sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(payload, default=provider.default, option=option)
+
+
+def json_response(payload):
+    return current_app.response_class(dumps(payload), mimetype=current_app.json.mimetype)
@@ -0,0 +1,27 @@
+"""
+Session class behind `db.session`: sends reads to a replica when asked.
+
+engines.read_replica() puts a replica engine in `session.info["replica"]`
+for one request. While it is there, plain SELECTs (not FOR UPDATE) go to
+that replica; the first write, flush or locking read drops it, so the
+rest of the request reads its own writes from the primary.
+"""
+from flask_sqlalchemy.session import Session
+
+
+def _is_read(clause):
+    return (
+        clause is not None
+        and getattr(clause, "is_select", False)
+        and getattr(clause, "_for_update_arg", None) is None
+    )
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get("replica")
+        if replica is not None and bind is None:
+            if not self._flushing and _is_read(clause):
+                return replica
+            self.info.pop("replica")
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
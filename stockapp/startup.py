@@ -0,0 +1,76 @@
+"""
+Process startup: lazy by default, warm on request.
+
+Building the app (create_app) opens no database connection and imports
+nothing a request might never need: Flask-Migrate and Alembic load with
+`flask db`, pandas and openpyxl with the first import, export or scoped
+threshold rule, orjson with the first serialized page. Whether the
+database answers is reported by the /readyz probe (check_database())
+rather than queried at import time, so a slow database can no longer
+hang a worker boot, a CLI command or a test import.
+
+A server that imports once and forks its workers (gunicorn --preload,
+see wsgi.py) calls preload() in the master instead: the lazy imports and
+the template compilation are paid once and shared copy-on-write, and
+any pooled connection is dropped before the fork so no two workers end
+up on the same socket.
+
+create_app() records how long the app took from `import stockapp` to
+being ready to serve (startup_stats(), reported by /readyz).
+"""
+import importlib
+import time
+
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+
+# Imported on first use at request time; preload() loads them up front
+LAZY_MODULES = ("pandas", "openpyxl", "orjson")
+
+
+def mark_ready(app, imported_at):
+    """Record the import-to-ready time of `app` (call at the end of create_app)."""
+    app.extensions["stockapp_startup"] = {
+        "import_to_ready_ms": round((time.perf_counter() - imported_at) * 1000, 1),
+        "preloaded": False,
+    }
+
+
+def startup_stats():
+    return dict(current_app.extensions.get("stockapp_startup", {}))
+
+
+def preload(app):
+    """Warm `app` in a process that forks its workers afterwards; returns the app."""
+    started = time.perf_counter()
+    for name in LAZY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            # optional (orjson), or the feature needing it is unused here
+            pass
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    # nothing above should have connected, but a forked pool must start empty
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+    stats = app.extensions.setdefault("stockapp_startup", {})
+    stats["preloaded"] = True
+    stats["preload_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return app
+
+
+def check_database():
+    """(ok, error): run SELECT 1 on the primary database."""
+    try:
+        db.session.execute(text("SELECT 1"))
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return False, str(e.__cause__ or e).splitlines()[0]
+    return True, None
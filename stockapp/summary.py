@@ -0,0 +1,254 @@
+"""
+Dashboard metrics engine.
+
+Counts and the stock value are aggregated inside the database instead of
+hydrating every StockItem. When METRICS_SUMMARY_ENABLED is on, the add,
+update and delete routes also keep the `inventory_summary` table current,
+so a dashboard read is a lookup of a handful of counter rows.
+
+Counters are kept per warehouse. The cross-warehouse figures are the sum
+of every warehouse's rows, which is still a few rows per warehouse rather
+than a pass over stock_items.
+"""
+import random
+from collections.abc import Mapping
+
+from flask import current_app
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import changes, db, warehouses
+from .models import InventorySummary, StockItem
+
+COUNTERS = ("total_items", "normal_stock", "low_stock", "critical_stock", "total_value")
+
+
+def summary_enabled():
+    return current_app.config.get("METRICS_SUMMARY_ENABLED", True)
+
+
+def status_bucket(status):
+    """Map an alarm_status value to its dashboard counter (old dashboard rules)."""
+    status = (status or "").strip().lower()
+    if status == "low stock":
+        return "low_stock"
+    if status == "critical":
+        return "critical_stock"
+    return "normal_stock"
+
+
+def _value(row, key):
+    if isinstance(row, Mapping):
+        return row.get(key)
+    return getattr(row, key, None)
+
+
+def snapshot(row):
+    """Capture the part of an item (ORM object or dict) the summary depends on."""
+    if row is None:
+        return None
+    return {
+        "bucket": status_bucket(_value(row, "alarm_status")),
+        "value": float(_value(row, "inward_total_price") or 0),
+    }
+
+
+def empty_delta():
+    return {key: 0 for key in COUNTERS}
+
+
+def add_change(delta, before, after):
+    """Accumulate the difference between two snapshots into `delta`."""
+    if before is not None:
+        delta["total_items"] -= 1
+        delta[before["bucket"]] -= 1
+        delta["total_value"] -= before["value"]
+    if after is not None:
+        delta["total_items"] += 1
+        delta[after["bucket"]] += 1
+        delta["total_value"] += after["value"]
+    return delta
+
+
+def record_change(before, after, warehouse=None):
+    """Apply one item's before/after snapshots to the summary table."""
+    apply_delta(add_change(empty_delta(), before, after), warehouse)
+
+
+def apply_delta(delta, warehouse=None):
+    """
+    Add `delta` to one counter slot of `warehouse` (default: the request's).
+
+    Runs inside the current transaction. The UPDATE is relative
+    (`col = col + n`), so concurrent writers never overwrite each other.
+    If the summary has not been built yet nothing is touched; the next
+    read rebuilds it from scratch. The delta is also staged for the
+    post-commit change feed.
+    """
+    if not any(delta.values()):
+        return
+    warehouse = warehouse or warehouses.current() or warehouses.default_warehouse()
+    changes.record_metrics(delta, warehouse)
+    if not summary_enabled():
+        return
+
+    slots = current_app.config.get("METRICS_SUMMARY_SLOTS", 8)
+    values = {
+        key: getattr(InventorySummary, key) + delta[key]
+        for key in COUNTERS
+        if delta[key]
+    }
+
+    def add_to(slot):
+        return db.session.execute(
+            update(InventorySummary)
+            .where(InventorySummary.warehouse == warehouse, InventorySummary.slot == slot)
+            .values(**values)
+        ).rowcount
+
+    # Slot count changed since the last rebuild: fall back to slot 0
+    if add_to(random.randrange(slots)) or add_to(0):
+        return
+    if not db.session.execute(built_query()).first():
+        return
+    # First item of a warehouse the last rebuild did not see
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(InventorySummary.__table__), [{
+                "warehouse": warehouse, "slot": 0,
+                **{key: delta[key] for key in COUNTERS},
+            }])
+    except IntegrityError:
+        # a concurrent writer created it first
+        add_to(0)
+
+
+# -------------------------------
+# Reads
+# -------------------------------
+def _aggregate_columns():
+    status = func.lower(func.trim(func.coalesce(StockItem.alarm_status, "")))
+    return (
+        func.count(StockItem.id),
+        func.coalesce(func.sum(case((status == "low stock", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((status == "critical", 1), else_=0)), 0),
+        func.coalesce(func.sum(StockItem.inward_total_price), 0),
+    )
+
+
+def aggregate_query(warehouse=None):
+    """SELECT of (total, low, critical, value) straight from stock_items (None: all warehouses)."""
+    return select(*_aggregate_columns()).where(*warehouses.scope_filters(warehouse))
+
+
+def counters_query(warehouse=None):
+    """SELECT of the slot count followed by the summed COUNTERS (None: all warehouses)."""
+    query = select(
+        func.count(InventorySummary.slot),
+        *[func.coalesce(func.sum(getattr(InventorySummary, key)), 0) for key in COUNTERS],
+    )
+    if warehouse is not None:
+        query = query.where(InventorySummary.warehouse == warehouse)
+    return query
+
+
+def built_query():
+    """SELECT returning a row once the summary table has been built."""
+    return select(InventorySummary.slot).limit(1)
+
+
+def metrics_from_aggregate(row):
+    total, low, critical, value = row
+    return {
+        "total_items": int(total),
+        "normal_stock": int(total) - int(low) - int(critical),
+        "low_stock": int(low),
+        "critical_stock": int(critical),
+        "total_value": float(value),
+    }
+
+
+def aggregate_metrics(warehouse=None):
+    """Compute the dashboard figures with one aggregate query."""
+    return metrics_from_aggregate(db.session.execute(aggregate_query(warehouse)).one())
+
+
+def format_metrics(metrics):
+    """The dashboard JSON shape of a metrics dict."""
+    return {
+        "total_items": int(metrics["total_items"]),
+        "normal_stock": int(metrics["normal_stock"]),
+        "low_stock": int(metrics["low_stock"]),
+        "critical_stock": int(metrics["critical_stock"]),
+        "total_value": round(float(metrics["total_value"]), 2),
+    }
+
+
+def rebuild_summary():
+    """Recompute the summary table from stock_items and commit it; returns the overall metrics."""
+    per_warehouse = {
+        row[0]: metrics_from_aggregate(row[1:])
+        for row in db.session.execute(
+            select(StockItem.warehouse, *_aggregate_columns()).group_by(StockItem.warehouse)
+        )
+    }
+    # the default warehouse always has rows, so an empty table reads as built
+    per_warehouse.setdefault(warehouses.default_warehouse(), metrics_from_aggregate((0, 0, 0, 0)))
+    slots = current_app.config.get("METRICS_SUMMARY_SLOTS", 8)
+
+    db.session.query(InventorySummary).delete()
+    for warehouse, metrics in sorted(per_warehouse.items()):
+        db.session.add(InventorySummary(warehouse=warehouse, slot=0, **metrics))
+        for slot in range(1, slots):
+            db.session.add(InventorySummary(warehouse=warehouse, slot=slot, **empty_delta()))
+    db.session.commit()
+
+    totals = empty_delta()
+    for metrics in per_warehouse.values():
+        for key in COUNTERS:
+            totals[key] += metrics[key]
+    return totals
+
+
+def get_metrics(warehouse=None):
+    """Return the dashboard metrics of `warehouse` (None: all), from the summary table when enabled."""
+    if not summary_enabled():
+        metrics = aggregate_metrics(warehouse)
+    else:
+        row = db.session.execute(counters_query(warehouse)).one()
+
+        if row[0]:
+            metrics = dict(zip(COUNTERS, row[1:]))
+        elif warehouse is not None and db.session.execute(built_query()).first():
+            # built, but nothing has been stocked in this warehouse yet
+            metrics = empty_delta()
+        else:
+            try:
+                rebuild_summary()
+            except IntegrityError:
+                # Another worker built it first; its result is just as good.
+                db.session.rollback()
+            return get_metrics(warehouse)
+
+    return format_metrics(metrics)
+
+
+def warehouse_metrics():
+    """Dashboard metrics of every warehouse with counters, keyed by warehouse."""
+    if not summary_enabled():
+        return {
+            row[0]: format_metrics(metrics_from_aggregate(row[1:]))
+            for row in db.session.execute(
+                select(StockItem.warehouse, *_aggregate_columns())
+                .group_by(StockItem.warehouse).order_by(StockItem.warehouse)
+            )
+        }
+    if not db.session.execute(built_query()).first():
+        get_metrics()  # builds the table
+    rows = db.session.execute(
+        select(
+            InventorySummary.warehouse,
+            *[func.sum(getattr(InventorySummary, key)) for key in COUNTERS],
+        ).group_by(InventorySummary.warehouse).order_by(InventorySummary.warehouse)
+    )
+    return {row[0]: format_metrics(dict(zip(COUNTERS, row[1:]))) for row in rows}
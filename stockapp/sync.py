@@ -0,0 +1,879 @@
+"""
+Offline terminals: an embedded SQLite database synced with the central server.
+
+A dock terminal runs this same app in EMBEDDED_MODE on a local SQLite
+file (WAL and tuned pragmas, see engines.py), so every page, read and
+write is served locally and the terminal keeps working while its link to
+the central server is down. Sync is per stock item: items are matched by
+their central id once linked and by (warehouse, item_code) before that.
+
+Journal. Every committed stock write appends the written item ids to
+sync_journal in the same transaction (a before_commit hook over the
+changes.record() stream, so single, bulk, batch and job writes are all
+covered). On a terminal the entries are its pending local changes; on the
+central server (SYNC_JOURNAL_ENABLED) `seq` is the cursor terminals pull
+from. Writes made by the sync itself are not journaled.
+
+Push. A terminal sends its pending items, gzip-compressed and per
+warehouse, to POST /api/sync/push: the local row plus its sync_base
+entry (central id, version and quantities it was last synced from).
+The server (apply_push) takes the row as is when the base version is
+still current. Otherwise the item was edited on both sides (or created
+on both under the same item_code): inward/outward quantities are merged
+- the central totals plus the terminal's own change since its base - and
+the other fields follow SYNC_CONFLICT_POLICY ("central" keeps the
+server's, "terminal" takes the terminal's). A deletion is applied unless
+the item changed centrally since the base under the "central" policy.
+Receipts make a push replayed after a lost response a no-op; only
+applied changes get one, so a rejected change can be corrected and
+pushed again under the same seq. The response carries each item's central row, which the terminal applies
+and records as its new base.
+
+Pull. The terminal reads GET /api/sync/pull?since=<cursor> pages of
+central rows changed since (deletions as empty rows) and applies them,
+skipping items with pending local changes: the next push merges those.
+
+Both sides write through the existing paths (BulkImporter, batch_edit),
+so summary counters, the ledger, the search index, caches and the change
+feed stay consistent. A terminal syncs from a background thread every
+SYNC_INTERVAL_SECONDS (backing off while the server is unreachable),
+started by a process's first request; a lock file next to the database
+keeps it to one process per terminal, whatever the worker count. Also
+on `flask sync` (`--loop` to keep going) and on POST /api/jobs/sync. The central server compacts its journal to the
+newest entry per item every SYNC_COMPACT_INTERVAL_SECONDS (or from cron
+with `flask compact-sync-journal`), so it grows with the item count
+rather than with every write.
+"""
+import gzip
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from flask import current_app, g
+from sqlalchemy import bindparam, delete, event, func, insert, or_, select
+
+from . import batch_edit, bulk, changes, db, warehouses
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, run one worker per terminal
+    fcntl = None
+from .models import StockItem, SyncBase, SyncJournal, SyncReceipt, SyncState
+
+# What a terminal and the server exchange per item; derived fields are
+# recomputed on arrival by the write paths
+SYNC_FIELDS = bulk.UPSERT_FIELDS
+# Running totals: concurrent changes to these add up instead of overwriting
+MERGED_FIELDS = ("inward_qty", "outward_qty")
+CONFLICT_POLICIES = ("central", "terminal")
+
+ROW_COLUMNS = ("id", "warehouse", "version", *SYNC_FIELDS)
+
+_APPLYING = "stockapp_sync_applying"
+
+
+def journal_enabled():
+    return current_app.extensions.get("stockapp_sync", {}).get("journal", False)
+
+
+def terminal_id():
+    return (current_app.config.get("SYNC_TERMINAL_ID") or socket.gethostname())[:64]
+
+
+# -------------------------------
+# Journal
+# -------------------------------
+def _journal(session):
+    """before_commit: append the ids written in this transaction to sync_journal."""
+    if session.in_nested_transaction() or session.info.get(_APPLYING) or not journal_enabled():
+        return
+    item_ids = sorted({item_id for change in changes.staged(session) for item_id in change["ids"]})
+    if item_ids:
+        now = datetime.utcnow()
+        session.execute(
+            insert(SyncJournal.__table__), [{"item_id": item_id, "changed_at": now} for item_id in item_ids]
+        )
+
+
+@contextmanager
+def _applying(warehouse):
+    """Write as the sync: unjournaled, scoped to `warehouse` (restores the previous scope)."""
+    previous = g.get("warehouse", warehouses.default_warehouse())
+    db.session.info[_APPLYING] = True
+    g.warehouse = warehouse
+    try:
+        yield
+    finally:
+        g.warehouse = previous
+        db.session.info.pop(_APPLYING, None)
+
+
+def compact_journal(backfill=False, chunk_size=1000):
+    """
+    Keep only the newest journal entry per item (central side); returns
+    the number of entries removed. `backfill` first journals every item,
+    for a server that ran without SYNC_JOURNAL_ENABLED for a while.
+    """
+    table = SyncJournal.__table__
+    if backfill:
+        last_id = 0
+        while True:
+            ids = db.session.execute(
+                select(StockItem.id).where(StockItem.id > last_id).order_by(StockItem.id).limit(chunk_size)
+            ).scalars().all()
+            if not ids:
+                break
+            now = datetime.utcnow()
+            db.session.execute(insert(table), [{"item_id": item_id, "changed_at": now} for item_id in ids])
+            db.session.commit()
+            last_id = ids[-1]
+
+    removed = 0
+    prune = delete(table).where(table.c.item_id == bindparam("_item"), table.c.seq < bindparam("_seq"))
+    while True:
+        superseded = db.session.execute(
+            select(table.c.item_id, func.max(table.c.seq))
+            .group_by(table.c.item_id)
+            .having(func.count() > 1)
+            .limit(chunk_size)
+        ).all()
+        if not superseded:
+            break
+        result = db.session.execute(prune, [{"_item": item_id, "_seq": seq} for item_id, seq in superseded])
+        removed += result.rowcount
+        db.session.commit()
+    return removed
+
+
+# -------------------------------
+# Rows on the wire
+# -------------------------------
+def wire_row(row):
+    """A stock_items row (mapping) as exchanged: sync fields, warehouse and version; ISO dates."""
+    result = {name: row[name] for name in ("warehouse", "version", *SYNC_FIELDS)}
+    for name in bulk.DATE_FIELDS:
+        if isinstance(result[name], date):
+            result[name] = result[name].isoformat()
+    return result
+
+
+def _rows(*clauses):
+    return {
+        row["id"]: row
+        for row in db.session.execute(
+            select(*[getattr(StockItem, name) for name in ROW_COLUMNS]).where(*clauses)
+        ).mappings()
+    }
+
+
+def _changed_fields(current, target):
+    """The fields of `target` differing from the `current` wire row."""
+    return {name: target[name] for name in SYNC_FIELDS if target[name] != current[name]}
+
+
+def merge(current, incoming, base, policy):
+    """Fields for an item edited on both sides: quantity changes added up, the rest by policy."""
+    winner = current if policy == "central" else incoming
+    fields = {name: winner[name] for name in SYNC_FIELDS}
+    for name in MERGED_FIELDS:
+        fields[name] = (current[name] or 0) + (incoming[name] or 0) - ((base or {}).get(name) or 0)
+    return fields
+
+
+def read_payload(request):
+    """The JSON body of a sync request, gunzipped when sent with Content-Encoding: gzip."""
+    body = request.get_data()
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        try:
+            body = gzip.decompress(body)
+        except (OSError, EOFError):
+            raise ValueError("Body is not valid gzip.")
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise ValueError("Invalid JSON payload.")
+    if not isinstance(data, dict):
+        raise ValueError("Invalid JSON payload.")
+    return data
+
+
+def compressed_response(payload, request):
+    """JSON response, gzipped when the client accepts it (sync batches compress ~10x)."""
+    from .serialize import dumps
+
+    body = dumps(payload)
+    response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    if "gzip" in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+# -------------------------------
+# Central side
+# -------------------------------
+def _check_push(entries):
+    if not isinstance(entries, list):
+        raise ValueError("'changes' must be a list.")
+    for entry in entries:
+        if not isinstance(entry, dict) or entry.get("op") not in ("upsert", "delete"):
+            raise ValueError("Each change needs an 'op' of 'upsert' or 'delete'.")
+        if not isinstance(entry.get("ref"), int) or not isinstance(entry.get("seq"), int):
+            raise ValueError("Each change needs integer 'ref' and 'seq'.")
+        if entry["op"] == "upsert":
+            row = entry.get("row")
+            if not isinstance(row, dict) or not row.get("item_code"):
+                raise ValueError("An upsert needs a 'row' with an 'item_code'.")
+            entry["row"] = {name: row.get(name) for name in SYNC_FIELDS}
+        base = entry.get("base")
+        if base is not None and not isinstance(base, dict):
+            raise ValueError("'base' must be an object.")
+
+
+def apply_push(terminal, entries, policy=None):
+    """
+    Apply a terminal's pushed changes to the request's warehouse.
+
+    Returns one result per change, in order: {"ref", "id", "status",
+    "row"}, `row` being the item's central state afterwards (None once
+    deleted) and `status` "applied", "merged" (edited on both sides),
+    "kept" (the server's row won), "invalid" (with "error") or "retry"
+    (lost a race with another writer; pushed again next time).
+    """
+    policy = policy or current_app.config.get("SYNC_CONFLICT_POLICY", "central")
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"Invalid SYNC_CONFLICT_POLICY. Use {' or '.join(CONFLICT_POLICIES)}.")
+    if not terminal or not isinstance(terminal, str):
+        raise ValueError("'terminal' is required.")
+    _check_push(entries)
+    warehouse = warehouses.current()
+    scope = warehouses.scope_filters(warehouse)
+
+    receipts = {
+        receipt.item_ref: {"seq": receipt.seq, "central_id": receipt.central_id}
+        for receipt in db.session.execute(
+            select(SyncReceipt.item_ref, SyncReceipt.seq, SyncReceipt.central_id).where(
+                SyncReceipt.terminal == terminal,
+                SyncReceipt.item_ref.in_([entry["ref"] for entry in entries]),
+            )
+        )
+    }
+    # locked until the updates commit, so two terminals merging into the
+    # same item queue instead of overwriting each other (MySQL/PostgreSQL)
+    current = {
+        row["id"]: wire_row(row) | {"id": row["id"]}
+        for row in db.session.execute(
+            select(*[getattr(StockItem, name) for name in ROW_COLUMNS])
+            .where(StockItem.id.in_([entry.get("id") for entry in entries if entry.get("id")]), *scope)
+            .with_for_update()
+        ).mappings()
+    }
+    by_code = {
+        row["item_code"]: row
+        for row in (
+            wire_row(row) | {"id": row["id"]}
+            for row in _rows(
+                StockItem.item_code.in_([entry["row"]["item_code"] for entry in entries if entry["op"] == "upsert"]),
+                *scope,
+            ).values()
+        )
+    }
+
+    results, updates, creates, deletes = [], {}, {}, []
+    for entry in entries:
+        central_id, base, row = entry.get("id"), entry.get("base"), entry.get("row")
+        result = {"ref": entry["ref"], "id": central_id, "status": "applied"}
+        results.append(result)
+        receipt = receipts.get(entry["ref"])
+        if receipt is not None and receipt["seq"] >= entry["seq"]:
+            # replay of a push whose response was lost
+            result["id"] = receipt["central_id"]
+            continue
+
+        if entry["op"] == "delete":
+            cur = current.get(central_id)
+            if cur is None:
+                continue
+            if policy == "central" and (base is None or cur["version"] != base.get("version")):
+                result["status"] = "kept"
+            else:
+                deletes.append((result, entry))
+            continue
+
+        cur = current.get(central_id) if central_id else by_code.get(row["item_code"])
+        if central_id and cur is None:
+            # deleted centrally since the terminal's base
+            if policy == "central":
+                result["status"], result["id"] = "kept", None
+                continue
+            cur = by_code.get(row["item_code"])
+        if cur is None:
+            creates[row["item_code"]] = (result, entry)
+            continue
+
+        result["id"] = cur["id"]
+        if base is not None and central_id == cur["id"] and cur["version"] == base.get("version"):
+            fields = dict(row)
+        else:
+            # edited on both sides, or created on both under this item_code
+            fields = merge(cur, row, base if central_id == cur["id"] else None, policy)
+            result["status"] = "merged"
+        taken = by_code.get(fields["item_code"])
+        if taken is not None and taken["id"] != cur["id"]:
+            fields["item_code"] = cur["item_code"]
+            result["status"] = "merged"
+        updates[cur["id"]] = (result, entry, _changed_fields(cur, fields))
+
+    def stage_receipts(pairs):
+        pairs = list(pairs)
+        if not pairs:
+            return
+        drop_receipts(pairs)
+        db.session.execute(insert(SyncReceipt.__table__), [
+            {"terminal": terminal, "item_ref": entry["ref"], "seq": entry["seq"], "central_id": result["id"]}
+            for result, entry in pairs
+        ])
+
+    def drop_receipts(pairs, restore=False):
+        refs = [entry["ref"] for _, entry in pairs]
+        db.session.execute(
+            delete(SyncReceipt.__table__).where(SyncReceipt.terminal == terminal, SyncReceipt.item_ref.in_(refs))
+        )
+        previous = [{"terminal": terminal, "item_ref": ref, **receipts[ref]} for ref in refs if ref in receipts]
+        if restore and previous:
+            db.session.execute(insert(SyncReceipt.__table__), previous)
+
+    # Only applied changes get a receipt: a rejected one, corrected and
+    # pushed again under the same seq, must not be taken for a replay.
+    # Edits are validated up front so their receipts can still ride along
+    # with the write path's own transaction.
+    edits, applied = [], []
+    for central_id, (result, entry, fields) in updates.items():
+        if fields:
+            try:
+                batch_edit.clean_values(fields)
+            except ValueError as e:
+                result["status"], result["error"] = "invalid", str(e)
+                continue
+            edits.append({"id": central_id, **fields})
+        applied.append((result, entry))
+    stage_receipts(applied)
+    if edits:
+        _, outcomes = batch_edit.update_items({"items": edits})
+        missed = []
+        for outcome in outcomes:
+            result, entry, _ = updates[outcome["id"]]
+            if outcome["status"] == "invalid":
+                result["status"], result["error"] = "invalid", outcome["error"]
+            elif outcome["status"] == "not_found":
+                # deleted by another writer since it was read (SQLite takes no row locks)
+                result["status"] = "retry"
+            else:
+                continue
+            missed.append((result, entry))
+        if missed:
+            drop_receipts(missed, restore=True)
+            db.session.commit()
+    else:
+        db.session.commit()
+
+    if deletes:
+        stage_receipts(deletes)
+        batch_edit.delete_items({"ids": [result["id"] for result, _ in deletes]})
+
+    if creates:
+        importer = bulk.BulkImporter(chunk_size=len(creates), report_all=True, warehouse=warehouse)
+        pending = list(creates.values())
+        importer.run([entry["row"] for _, entry in pending])
+        for outcome in importer.results:
+            result = pending[outcome["index"]][0]
+            if outcome["status"] == "duplicate":
+                result["status"] = "retry"
+            elif outcome["status"] == "invalid":
+                result["status"], result["error"] = "invalid", outcome["error"]
+        created = {row["item_code"]: item_id for item_id, row in _rows(
+            StockItem.item_code.in_(list(creates)), *scope
+        ).items()}
+        for result, entry in pending:
+            if result["status"] != "retry":
+                result["id"] = created.get(entry["row"]["item_code"])
+        stage_receipts(
+            (result, entry) for result, entry in pending if result["status"] not in ("retry", "invalid")
+        )
+        db.session.commit()
+
+    final = _rows(StockItem.id.in_([result["id"] for result in results if result["id"]]))
+    for result in results:
+        row = final.get(result["id"])
+        result["row"] = wire_row(row) if row is not None else None
+        if row is None:
+            result["id"] = None
+    return results
+
+
+def changes_since(since, limit, warehouse=None):
+    """
+    Central item changes after journal seq `since`, oldest first.
+
+    Returns (changes, cursor, more): [{"id", "row"}] with row None for a
+    deleted item, and the seq to continue from. Entries younger than
+    SYNC_PULL_LAG_SECONDS wait, so a transaction still committing with an
+    earlier seq is not skipped over. `warehouse` None means all.
+    """
+    lag = current_app.config.get("SYNC_PULL_LAG_SECONDS", 2)
+    cutoff = datetime.utcnow() - timedelta(seconds=lag)
+    entries = db.session.execute(
+        select(SyncJournal.seq, SyncJournal.item_id, SyncJournal.changed_at)
+        .where(SyncJournal.seq > since)
+        .order_by(SyncJournal.seq)
+        .limit(limit)
+    ).all()
+    more = len(entries) == limit
+    for index, entry in enumerate(entries):
+        if entry.changed_at > cutoff:
+            entries, more = entries[:index], False
+            break
+    if not entries:
+        return [], since, False
+
+    item_ids = list(dict.fromkeys(entry.item_id for entry in entries))
+    rows = _rows(StockItem.id.in_(item_ids))
+    result = []
+    for item_id in item_ids:
+        row = rows.get(item_id)
+        if row is None:
+            result.append({"id": item_id, "row": None})
+        elif warehouse is None or row["warehouse"] == warehouse:
+            result.append({"id": item_id, "row": wire_row(row)})
+    return result, entries[-1].seq, more
+
+
+# -------------------------------
+# Terminal side
+# -------------------------------
+def _get_state(name, default=None):
+    state = db.session.get(SyncState, name)
+    return state.value if state is not None and state.value is not None else default
+
+
+def _set_state(**values):
+    for name, value in values.items():
+        db.session.merge(SyncState(name=name, value=None if value is None else str(value)))
+
+
+def _central(path, params=None, payload=None):
+    """Call the central server; a JSON payload is POSTed gzip-compressed."""
+    config = current_app.config
+    url = config["SYNC_CENTRAL_URL"].rstrip("/") + path
+    if params:
+        url += "?" + urlencode(params)
+    headers = {"Accept": "application/json", "Accept-Encoding": "gzip"}
+    data = None
+    if payload is not None:
+        data = gzip.compress(json.dumps(payload).encode("utf-8"), compresslevel=6)
+        headers.update({"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    request = Request(url, data=data, headers=headers, method="GET" if data is None else "POST")
+    with urlopen(request, timeout=config.get("SYNC_TIMEOUT_SECONDS", 10)) as response:
+        body = response.read()
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+    return json.loads(body)
+
+
+def _apply_central(entries, sent=None):
+    """
+    Bring local rows and their sync_base in line with central rows; returns the rows written.
+
+    `entries` are {"id", "row"} from a pull, or push results, which also
+    carry the local id as "ref"; `sent` maps those local ids to the rows
+    pushed. Items with pending local changes are left for the next push,
+    except just-pushed ones changed again meanwhile: they take the
+    central row with their newer quantity changes replayed on top.
+    """
+    bases = {
+        base.central_id: base
+        for base in db.session.scalars(
+            select(SyncBase).where(SyncBase.central_id.in_([entry["id"] for entry in entries if entry.get("id")]))
+        )
+    }
+    local_of = {}
+    unlinked = {}
+    for index, entry in enumerate(entries):
+        if entry.get("ref"):
+            local_of[index] = entry["ref"]
+        elif entry["id"] in bases:
+            local_of[index] = bases[entry["id"]].item_id
+        elif entry["row"] is not None:
+            unlinked.setdefault(entry["row"]["warehouse"], {})[entry["row"]["item_code"]] = index
+    # not linked yet: the item may exist here under its code (first sync,
+    # or created on both sides while offline)
+    for warehouse, codes in unlinked.items():
+        candidates = _rows(StockItem.warehouse == warehouse, StockItem.item_code.in_(list(codes)))
+        linked = set(db.session.scalars(select(SyncBase.item_id).where(SyncBase.item_id.in_(list(candidates)))))
+        for item_id, row in candidates.items():
+            if item_id not in linked:
+                local_of[codes[row["item_code"]]] = item_id
+
+    local = {item_id: wire_row(row) for item_id, row in _rows(StockItem.id.in_(list(local_of.values()))).items()}
+    pending = set(db.session.scalars(
+        select(SyncJournal.item_id).where(SyncJournal.item_id.in_(list(local_of.values())))
+    ))
+
+    plans, new_bases, dropped = {}, [], set()
+    for index, entry in enumerate(entries):
+        item_id, row = local_of.get(index), entry["row"]
+        mine = local.get(item_id)
+        if item_id in pending and (sent is None or mine is None or sent.get(item_id) is None):
+            continue
+        if row is None:
+            if item_id is None:
+                continue
+            dropped.add(item_id)
+            if mine is not None and item_id not in pending:
+                plans.setdefault(mine["warehouse"], {"update": [], "insert": [], "delete": []})["delete"].append(item_id)
+            continue
+
+        plan = plans.setdefault(row["warehouse"], {"update": [], "insert": [], "delete": []})
+        target = {name: row[name] for name in SYNC_FIELDS}
+        if item_id in pending:
+            # changed again since the push: keep the newer edits on top
+            target = {name: mine[name] for name in SYNC_FIELDS}
+            for name in MERGED_FIELDS:
+                target[name] = (row[name] or 0) + (mine[name] or 0) - (sent[item_id][name] or 0)
+        if mine is None:
+            plan["insert"].append(target)
+            new_bases.append((None, entry["id"], row))
+        else:
+            fields = _changed_fields(mine, target)
+            if fields:
+                plan["update"].append({"id": item_id, **fields})
+            new_bases.append((item_id, entry["id"], row))
+
+    written = 0
+    for warehouse, plan in sorted(plans.items()):
+        with _applying(warehouse):
+            if plan["update"]:
+                counts, _ = batch_edit.update_items({"items": plan["update"]})
+                written += counts["updated"]
+            if plan["delete"]:
+                counts, _ = batch_edit.delete_items({"ids": plan["delete"]})
+                written += counts["deleted"]
+            if plan["insert"]:
+                importer = bulk.BulkImporter(
+                    chunk_size=len(plan["insert"]), on_conflict="update", warehouse=warehouse
+                )
+                importer.run(plan["insert"])
+                written += importer.counts["inserted"] + importer.counts["updated"]
+
+    inserted = {}
+    for warehouse in {row["warehouse"] for item_id, _, row in new_bases if item_id is None}:
+        codes = [row["item_code"] for item_id, _, row in new_bases if item_id is None and row["warehouse"] == warehouse]
+        inserted.update({
+            (warehouse, row["item_code"]): item_id
+            for item_id, row in _rows(StockItem.warehouse == warehouse, StockItem.item_code.in_(codes)).items()
+        })
+    new_bases = [
+        {
+            "item_id": item_id or inserted.get((row["warehouse"], row["item_code"])), "central_id": central_id,
+            "warehouse": row["warehouse"], "version": row["version"],
+            **{name: row[name] or 0 for name in MERGED_FIELDS},
+        }
+        for item_id, central_id, row in new_bases
+    ]
+    new_bases = [base for base in new_bases if base["item_id"] is not None]
+    stale_items = dropped | {base["item_id"] for base in new_bases}
+    stale_central = {base["central_id"] for base in new_bases}
+    stale_central.update(entry["id"] for entry in entries if entry["row"] is None and entry.get("id"))
+    if stale_items or stale_central:
+        db.session.execute(delete(SyncBase.__table__).where(or_(
+            SyncBase.item_id.in_(list(stale_items)), SyncBase.central_id.in_(list(stale_central)),
+        )))
+    if new_bases:
+        db.session.execute(insert(SyncBase.__table__), new_bases)
+    db.session.commit()
+    return written
+
+
+def push(limit=None):
+    """Send pending local changes to the central server; returns the number of items sent."""
+    limit = limit or current_app.config.get("SYNC_BATCH_SIZE", 500)
+    sent_total = 0
+    while True:
+        journal = db.session.execute(
+            select(SyncJournal.seq, SyncJournal.item_id).order_by(SyncJournal.seq).limit(limit)
+        ).all()
+        if not journal:
+            break
+        last_seq = journal[-1].seq
+        seqs = {}
+        for seq, item_id in journal:
+            seqs[item_id] = seq
+        rows = _rows(StockItem.id.in_(list(seqs)))
+        bases = {
+            base.item_id: base
+            for base in db.session.scalars(select(SyncBase).where(SyncBase.item_id.in_(list(seqs))))
+        }
+
+        batches, sent = {}, {}
+        for item_id, seq in seqs.items():
+            row, base = rows.get(item_id), bases.get(item_id)
+            change = {
+                "ref": item_id, "seq": seq, "id": base.central_id if base else None,
+                "base": {
+                    "version": base.version,
+                    **{name: getattr(base, name) for name in MERGED_FIELDS},
+                } if base else None,
+            }
+            if row is not None:
+                change.update(op="upsert", row=wire_row(row))
+                sent[item_id] = change["row"]
+                batches.setdefault(row["warehouse"], []).append(change)
+            elif base is not None:
+                change["op"] = "delete"
+                sent[item_id] = None
+                batches.setdefault(base.warehouse, []).append(change)
+            # else: created and deleted again before it was ever synced
+
+        results = []
+        for warehouse, batch in sorted(batches.items()):
+            response = _central(
+                "/api/sync/push", {"warehouse": warehouse}, {"terminal": terminal_id(), "changes": batch}
+            )
+            results.extend(response["results"])
+
+        retry = {result["ref"] for result in results if result["status"] == "retry"}
+        for result in results:
+            if result["status"] == "invalid":
+                # acknowledged all the same: resending cannot fix it, the next local edit may
+                current_app.logger.warning("Central server rejected item %s: %s", result["ref"], result.get("error"))
+        # acknowledge what was sent; anything written since stays pending
+        db.session.execute(delete(SyncJournal.__table__).where(
+            SyncJournal.seq <= last_seq,
+            SyncJournal.item_id.in_([item_id for item_id in seqs if item_id not in retry]),
+        ))
+        db.session.commit()
+        _apply_central([result for result in results if result["status"] not in ("retry", "invalid")], sent=sent)
+        sent_total += len(sent)
+        _set_state(last_push_at=datetime.utcnow().isoformat(timespec="seconds"))
+        db.session.commit()
+        if retry or len(journal) < limit:
+            break
+    return sent_total
+
+
+def pull(limit=None):
+    """Apply the central changes since the stored cursor; returns the rows written locally."""
+    config = current_app.config
+    limit = limit or config.get("SYNC_BATCH_SIZE", 500)
+    cursor = int(_get_state("pull_cursor", 0))
+    written = 0
+    while True:
+        params = {"since": cursor, "limit": limit}
+        if config.get("SYNC_WAREHOUSE"):
+            params["warehouse"] = config["SYNC_WAREHOUSE"]
+        response = _central("/api/sync/pull", params)
+        if response["changes"]:
+            written += _apply_central(response["changes"])
+        cursor = response["cursor"]
+        _set_state(pull_cursor=cursor, last_pull_at=datetime.utcnow().isoformat(timespec="seconds"))
+        db.session.commit()
+        if not response["more"]:
+            break
+    return written
+
+
+def run_cycle(job=None):
+    """Push, then pull (a terminal's sync round). Returns (items pushed, rows pulled)."""
+    try:
+        pushed = push()
+        pulled = pull()
+    except Exception as e:
+        db.session.rollback()
+        _set_state(last_error=str(e)[:500], last_error_at=datetime.utcnow().isoformat(timespec="seconds"))
+        db.session.commit()
+        raise
+    _set_state(last_error=None)
+    db.session.commit()
+    if job is not None:
+        job.processed = pushed
+        job.changed = pulled
+    return pushed, pulled
+
+
+def status():
+    """Sync configuration and progress of this process's database."""
+    config = current_app.config
+    return {
+        "embedded": bool(config.get("EMBEDDED_MODE")),
+        "journal": journal_enabled(),
+        "central_url": config.get("SYNC_CENTRAL_URL") or None,
+        "terminal": terminal_id(),
+        "pending_items": db.session.scalar(select(func.count(func.distinct(SyncJournal.item_id)))),
+        "pull_cursor": int(_get_state("pull_cursor", 0)),
+        "last_push_at": _get_state("last_push_at"),
+        "last_pull_at": _get_state("last_pull_at"),
+        "last_error": _get_state("last_error"),
+        "last_error_at": _get_state("last_error_at"),
+    }
+
+
+# -------------------------------
+# Background loops
+# -------------------------------
+class BackgroundLoop:
+    """
+    Runs step() every `interval` seconds on one daemon thread per process.
+
+    init_app starts it on a process's first request, never while the app
+    is built: under `gunicorn --preload` that is the master, which would
+    run a loop of its own (and hold a pooled connection across the fork).
+    The thread does not survive a fork either, so the pid guard starts
+    one in each worker.
+    """
+    name = "stockapp-loop"
+    # step right away, or wait one interval first
+    run_at_start = True
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self.run, name=self.name, daemon=True).start()
+            self._pid = os.getpid()
+
+    def run(self):
+        """Loop forever in the calling thread (the daemon thread, or `flask sync --loop`)."""
+        with self.exclusive():
+            self.loop()
+
+    @contextmanager
+    def exclusive(self):
+        """Hold whatever keeps other processes from running the same loop (nothing here)."""
+        yield
+
+    def loop(self):
+        delay = self.interval
+        if not self.run_at_start:
+            time.sleep(delay)
+        while True:
+            with self.app.app_context():
+                try:
+                    self.step()
+                    delay = self.interval
+                except Exception as e:
+                    db.session.rollback()
+                    delay = self.failed(e, delay)
+                finally:
+                    db.session.remove()
+            time.sleep(delay)
+
+    def step(self):
+        raise NotImplementedError
+
+    def failed(self, error, delay):
+        """Log a failed step; returns the seconds to wait before the next one."""
+        self.app.logger.warning("%s failed (%s); retrying in %ss.", self.name, error, self.interval)
+        return self.interval
+
+
+class Syncer(BackgroundLoop):
+    """
+    A terminal's push/pull loop (EMBEDDED_MODE with SYNC_CENTRAL_URL).
+
+    While the server is unreachable the interval doubles up to 20x
+    SYNC_INTERVAL_SECONDS; local use is unaffected. Every worker starts
+    one, but only the holder of the terminal's lock file
+    (<database>.sync.lock) syncs; the others wait on it and take over if
+    that process exits.
+    """
+    name = "stockapp-sync"
+
+    def __init__(self, app):
+        super().__init__(app, app.config.get("SYNC_INTERVAL_SECONDS", 15))
+
+    def lock_path(self):
+        with self.app.app_context():
+            return f"{db.engine.url.database}.sync.lock"
+
+    @contextmanager
+    def exclusive(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path(), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.app.logger.info("Another process syncs this terminal; waiting to take over.")
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def step(self):
+        run_cycle()
+
+    def failed(self, error, delay):
+        delay = min(delay * 2, self.interval * 20)
+        self.app.logger.warning("Sync with %s failed (%s); retrying in %ss.",
+                                self.app.config["SYNC_CENTRAL_URL"], error, delay)
+        return delay
+
+
+class Compactor(BackgroundLoop):
+    """
+    The central server's journal compaction, every SYNC_COMPACT_INTERVAL_SECONDS.
+
+    Every write appends to sync_journal, so without it the journal grows
+    with the write volume instead of the item count. Compacting is
+    idempotent, so workers doing it concurrently only repeat each other.
+    """
+    name = "stockapp-sync-compact"
+    run_at_start = False
+
+    def __init__(self, app):
+        super().__init__(app, app.config["SYNC_COMPACT_INTERVAL_SECONDS"])
+
+    def step(self):
+        removed = compact_journal()
+        if removed:
+            self.app.logger.info("Compacted the sync journal: %s superseded entries removed.", removed)
+
+
+def init_app(app):
+    config = app.config
+    syncer = compactor = None
+    if config.get("EMBEDDED_MODE"):
+        if config.get("SYNC_CENTRAL_URL"):
+            syncer = Syncer(app)
+    elif config.get("SYNC_JOURNAL_ENABLED") and config.get("SYNC_COMPACT_INTERVAL_SECONDS"):
+        compactor = Compactor(app)
+    for loop in (syncer, compactor):
+        if loop is None:
+            continue
+        # on the first request, not here (see BackgroundLoop)
+        app.before_request(loop.ensure_running)
+    app.extensions["stockapp_sync"] = {
+        "journal": bool(config.get("EMBEDDED_MODE") or config.get("SYNC_JOURNAL_ENABLED")),
+        "syncer": syncer,
+        "compactor": compactor,
+    }
+    # db.session is shared by every app, so hook it only once
+    if not event.contains(db.session, "before_commit", _journal):
+        event.listen(db.session, "before_commit", _journal)
@@ -0,0 +1,241 @@
+"""
+Alarm threshold rule engine.
+
+Critical / Low Stock cut-offs come from `alarm_thresholds` rows scoped to
+one item_code, a category, a UOM or the global default (most specific
+wins). Each level is either an absolute quantity or a fraction of
+inward_qty. The rules are compiled once into a Ruleset, which evaluates
+one row (compute_fields), NumPy columns (batch) or builds the equivalent
+SQL CASE (upserts and drift checks), so every path classifies the same way.
+
+Each process caches the compiled rules. A rule change bumps the shared
+version row (alarm_threshold_version) in its own transaction, and every
+request or job checks that version once (one primary-key read) before
+using the cache, so no worker keeps classifying writes with old rules
+after the change's reclassify job has passed their rows.
+"""
+import threading
+
+import numpy as np
+from flask import g
+from sqlalchemy import and_, case, insert, literal, not_, or_, select, update
+
+from . import db
+from .models import CRITICAL_RATIO, LOW_STOCK_RATIO, AlarmThreshold, AlarmThresholdVersion, StockItem
+
+SCOPES = ("item", "category", "uom", "default")
+
+# scope -> StockItem column it matches on
+SCOPE_COLUMNS = {"item": "item_code", "category": "category", "uom": "uom"}
+
+_cache = {"ruleset": None, "version": None}
+_cache_lock = threading.Lock()
+
+
+class Rule:
+    __slots__ = ("critical_ratio", "low_ratio", "critical_qty", "low_qty")
+
+    def __init__(self, critical_ratio=CRITICAL_RATIO, low_ratio=LOW_STOCK_RATIO,
+                 critical_qty=None, low_qty=None):
+        self.critical_ratio = CRITICAL_RATIO if critical_ratio is None else critical_ratio
+        self.low_ratio = LOW_STOCK_RATIO if low_ratio is None else low_ratio
+        self.critical_qty = critical_qty
+        self.low_qty = low_qty
+
+    def levels(self, inward_qty):
+        critical = self.critical_qty if self.critical_qty is not None else inward_qty * self.critical_ratio
+        low = self.low_qty if self.low_qty is not None else inward_qty * self.low_ratio
+        return critical, low
+
+
+class Ruleset:
+    """Compiled, read-only view of the threshold rules."""
+
+    def __init__(self, rules=()):
+        self.default = Rule()
+        self.scoped = {scope: {} for scope in SCOPE_COLUMNS}
+        for row in rules:
+            rule = Rule(row.critical_ratio, row.low_ratio, row.critical_qty, row.low_qty)
+            if row.scope == "default":
+                self.default = rule
+            else:
+                self.scoped[row.scope][row.match_value] = rule
+
+    def lookup(self, item_code=None, category=None, uom=None):
+        keys = {"item": item_code, "category": category, "uom": uom}
+        for scope in SCOPE_COLUMNS:
+            rule = self.scoped[scope].get(keys[scope])
+            if rule is not None:
+                return rule
+        return self.default
+
+    # -------------------------------
+    # Per-row
+    # -------------------------------
+    def classify(self, balance, inward_qty, item_code=None, category=None, uom=None):
+        critical, low = self.lookup(item_code, category, uom).levels(inward_qty)
+        if balance < critical:
+            return "Critical"
+        if balance < low:
+            return "Low Stock"
+        return "Normal"
+
+    # -------------------------------
+    # Vectorized
+    # -------------------------------
+    def classify_batch(self, balance, inward_qty, item_code=None, category=None, uom=None):
+        """Classify NumPy columns; scope key columns may be omitted (None)."""
+        n = len(balance)
+        rule_fields = ("critical_ratio", "low_ratio", "critical_qty", "low_qty")
+        params = {
+            field: np.full(n, np.nan if getattr(self.default, field) is None
+                           else getattr(self.default, field), dtype=float)
+            for field in rule_fields
+        }
+
+        keys = {"item": item_code, "category": category, "uom": uom}
+        # least specific first so more specific scopes overwrite it
+        for scope in reversed(tuple(SCOPE_COLUMNS)):
+            rules, values = self.scoped[scope], keys[scope]
+            if not rules or values is None:
+                continue
+            import pandas as pd
+
+            matched = pd.Series(values, dtype=object).map(rules)
+            mask = matched.notna().to_numpy()
+            if not mask.any():
+                continue
+            for field in rule_fields:
+                picked = [getattr(rule, field) for rule in matched[mask]]
+                params[field][mask] = [np.nan if value is None else value for value in picked]
+
+        critical = np.where(np.isnan(params["critical_qty"]),
+                            inward_qty * params["critical_ratio"], params["critical_qty"])
+        low = np.where(np.isnan(params["low_qty"]),
+                       inward_qty * params["low_ratio"], params["low_qty"])
+        return np.where(
+            balance < critical, "Critical", np.where(balance < low, "Low Stock", "Normal")
+        ).astype(object)
+
+    # -------------------------------
+    # SQL
+    # -------------------------------
+    def sql_alarm(self, balance, inward_qty, item_code=None, category=None, uom=None,
+                  item_codes=None):
+        """
+        Return a SQL CASE computing alarm_status with these rules.
+
+        Key arguments are SQL expressions (None skips that scope). Passing
+        `item_codes` limits the per-item WHENs to codes that can occur.
+        """
+        keys = {"item": item_code, "category": category, "uom": uom}
+        whens = {"critical": [], "low": []}
+        for scope, column in keys.items():
+            if column is None:
+                continue
+            for value, rule in self.scoped[scope].items():
+                if scope == "item" and item_codes is not None and value not in item_codes:
+                    continue
+                critical, low = self._sql_levels(rule, inward_qty)
+                whens["critical"].append((column == value, critical))
+                whens["low"].append((column == value, low))
+
+        default_critical, default_low = self._sql_levels(self.default, inward_qty)
+        critical = case(*whens["critical"], else_=default_critical) if whens["critical"] else default_critical
+        low = case(*whens["low"], else_=default_low) if whens["low"] else default_low
+        return case(
+            (balance < critical, "Critical"),
+            (balance < low, "Low Stock"),
+            else_="Normal",
+        )
+
+    @staticmethod
+    def _sql_levels(rule, inward_qty):
+        critical = literal(rule.critical_qty) if rule.critical_qty is not None else inward_qty * rule.critical_ratio
+        low = literal(rule.low_qty) if rule.low_qty is not None else inward_qty * rule.low_ratio
+        return critical, low
+
+
+# -------------------------------
+# Loading & caching
+# -------------------------------
+def rules_version():
+    """The shared rules version; read once per app context (request or job)."""
+    if "threshold_rules_version" not in g:
+        # called from compute_fields() mid-edit: flushing here would bump
+        # the edited item's version an extra time
+        with db.session.no_autoflush:
+            g.threshold_rules_version = db.session.execute(
+                select(AlarmThresholdVersion.version).where(AlarmThresholdVersion.id == 1)
+            ).scalar() or 0
+    return g.threshold_rules_version
+
+
+def bump_version():
+    """Mark the rules changed for every process (in the transaction that changes them)."""
+    table = AlarmThresholdVersion.__table__
+    result = db.session.execute(
+        update(table).where(table.c.id == 1).values(version=table.c.version + 1)
+    )
+    if not result.rowcount:
+        db.session.execute(insert(table).values(id=1, version=1))
+    g.pop("threshold_rules_version", None)
+    invalidate()
+
+
+def get_ruleset():
+    """Return the compiled rules, reloaded when the shared rules version moved."""
+    version = rules_version()
+    ruleset = _cache["ruleset"]
+    if ruleset is not None and _cache["version"] == version:
+        return ruleset
+
+    with _cache_lock:
+        if _cache["ruleset"] is None or _cache["version"] != version:
+            with db.session.no_autoflush:
+                _cache["ruleset"] = Ruleset(db.session.query(AlarmThreshold).all())
+            _cache["version"] = version
+        return _cache["ruleset"]
+
+
+def invalidate():
+    _cache["ruleset"] = None
+
+
+# -------------------------------
+# Incremental re-classification
+# -------------------------------
+def affected_rows_clause(scope, match_value, ruleset):
+    """
+    SQL filter for the rows a change to one rule can re-classify.
+
+    More specific rules shield their rows, so e.g. a UOM rule change skips
+    items that have an item or category rule of their own.
+    """
+    if scope == "item":
+        return StockItem.item_code == match_value
+
+    shields = []
+    for other in SCOPE_COLUMNS:
+        if other == scope:
+            break
+        values = list(ruleset.scoped[other])
+        if values:
+            column = getattr(StockItem, SCOPE_COLUMNS[other])
+            shields.append(and_(column.isnot(None), column.in_(values)))
+
+    clauses = [not_(or_(*shields))] if shields else []
+    if scope != "default":
+        clauses.append(getattr(StockItem, SCOPE_COLUMNS[scope]) == match_value)
+    return and_(*clauses) if clauses else None
+
+
+def reclassify(job, scope, match_value, chunk_size=5000):
+    """Background job body: re-derive alarm status for rows under one rule."""
+    from .recompute import recompute_derived
+
+    invalidate()
+    clause = affected_rows_clause(scope, match_value, get_ruleset())
+    return recompute_derived(
+        job, chunk_size=chunk_size, where=[clause] if clause is not None else None
+    )
@@ -0,0 +1,126 @@
+import base64
+import json
+from datetime import datetime
+
+from .models import StockItem
+from . import search as search_index
+from . import summary, warehouses
+
+# Allowed ?status= values and the alarm_status they map to
+STATUS_MAP = {
+    "normal": "Normal",
+    "low": "Low Stock",
+    "critical": "Critical"
+}
+
+# Typed range filters: ?<column>_min= / ?<column>_max=
+NUMERIC_RANGE_COLUMNS = (
+    "inward_qty",
+    "inward_unit_price",
+    "inward_total_price",
+    "outward_qty",
+    "balance_stock_qty",
+    "outward_unit_price",
+    "outward_total_price",
+)
+
+# Typed date filters: ?<column>_from=YYYY-MM-DD / ?<column>_to=YYYY-MM-DD
+DATE_RANGE_COLUMNS = ("inward_date", "outward_date")
+
+# Estimated totals for filtered cursor pages stop counting here
+ESTIMATE_CAP = 10000
+
+
+def inventory_filters(args):
+    """
+    Build the filter clauses shared by the inventory list endpoints.
+
+    Reads `warehouse`, `status`, `search` and the typed range parameters
+    from `args` (e.g. request.args) and raises ValueError with a
+    user-facing message when one of them is invalid. Without `warehouse`
+    the request's warehouse applies (see warehouses.py).
+    """
+    clauses = warehouses.scope_filters(warehouses.from_args(args))
+
+    requested_status = (args.get("status") or "").strip().lower()
+    if requested_status:
+        if requested_status not in STATUS_MAP:
+            raise ValueError("Invalid status filter. Use 'normal', 'low', or 'critical'.")
+        clauses.append(StockItem.alarm_status == STATUS_MAP[requested_status])
+
+    search = (args.get("search") or "").strip().lower()
+    if search:
+        clauses.append(search_index.search_filter(search))
+
+    for name in NUMERIC_RANGE_COLUMNS:
+        column = getattr(StockItem, name)
+        for suffix, compare in (("_min", column.__ge__), ("_max", column.__le__)):
+            raw = args.get(name + suffix)
+            if raw in (None, ""):
+                continue
+            try:
+                clauses.append(compare(float(raw)))
+            except ValueError:
+                raise ValueError(f"'{name}{suffix}' must be a number.")
+
+    for name in DATE_RANGE_COLUMNS:
+        column = getattr(StockItem, name)
+        for suffix, compare in (("_from", column.__ge__), ("_to", column.__le__)):
+            raw = args.get(name + suffix)
+            if raw in (None, ""):
+                continue
+            try:
+                clauses.append(compare(datetime.strptime(raw, "%Y-%m-%d").date()))
+            except ValueError:
+                raise ValueError(f"'{name}{suffix}' must be a date in YYYY-MM-DD format.")
+
+    return clauses
+
+
+def encode_cursor(item_id, direction):
+    """Return an opaque keyset cursor pointing next to `item_id`."""
+    raw = json.dumps({"id": item_id, "dir": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Decode a cursor from encode_cursor(); an empty token means the first page."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        cursor = {"id": int(data["id"]), "dir": data["dir"]}
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if cursor["dir"] not in ("next", "prev"):
+        raise ValueError("Invalid cursor.")
+    return cursor
+
+
+def estimate_counter(args):
+    """The dashboard counter that answers a listing's total, or None if it is filtered."""
+    filtered = any(
+        args.get(key)
+        for key in args
+        if key not in ("warehouse", "status", "cursor", "limit", "page", "exact_total", "fields", "sort")
+    )
+    if filtered or not summary.summary_enabled():
+        return None
+    status = (args.get("status") or "").strip().lower()
+    key = {"normal": "normal_stock", "low": "low_stock", "critical": "critical_stock"}
+    return key[status] if status else "total_items"
+
+
+def estimate_total(args, query):
+    """
+    Cheap stand-in for query.count() on cursor pages.
+
+    Unfiltered and status-only listings read the dashboard summary counters
+    of their warehouse; anything else counts at most ESTIMATE_CAP matching rows.
+    """
+    counter = estimate_counter(args)
+    if counter is not None:
+        return summary.get_metrics(warehouses.from_args(args))[counter]
+
+    return query.order_by(None).limit(ESTIMATE_CAP).count()
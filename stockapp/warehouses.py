@@ -0,0 +1,83 @@
+"""
+Warehouse scoping.
+
+Every item belongs to one warehouse (stock_items.warehouse, a short
+code); item codes are unique per warehouse, and the movement ledger,
+dashboard counters and analytics rollups carry the warehouse too.
+
+A request picks its warehouse with `?warehouse=<code>` (DEFAULT_WAREHOUSE
+when absent, so a single-site deployment never has to send it). It is a
+query parameter rather than a header so cached responses are keyed by
+it. Reads accept `warehouse=*` for every warehouse at once; dashboard
+metrics and analytics then add up the per-warehouse counter and rollup
+rows instead of scanning stock_items. Writes always target one warehouse.
+
+WAREHOUSES (comma-separated codes) restricts the accepted codes; empty
+accepts any well-formed code.
+"""
+import re
+
+from flask import current_app, g, has_app_context
+
+from .models import StockItem
+
+ALL = "*"
+CODE_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,19}$")
+
+
+def default_warehouse():
+    if has_app_context():
+        return current_app.config.get("DEFAULT_WAREHOUSE", "main")
+    return "main"
+
+
+def allowed_warehouses():
+    """Configured warehouse codes, or an empty tuple when any code is accepted."""
+    raw = current_app.config.get("WAREHOUSES", "")
+    return tuple(code.strip() for code in raw.split(",") if code.strip())
+
+
+def parse(raw, allow_all=True):
+    """
+    Turn a `warehouse` value into a code, or None for every warehouse.
+
+    Empty means DEFAULT_WAREHOUSE. Raises ValueError with a user-facing
+    message for a malformed or unknown code, or for "*" when `allow_all`
+    is off.
+    """
+    raw = (raw or "").strip()
+    if not raw:
+        return default_warehouse()
+    if raw == ALL:
+        if not allow_all:
+            raise ValueError("Writes need one warehouse, not 'warehouse=*'.")
+        return None
+    if not CODE_PATTERN.match(raw):
+        raise ValueError("Invalid warehouse. Use up to 20 letters, digits, '.', '_' or '-'.")
+    allowed = allowed_warehouses()
+    if allowed and raw not in allowed:
+        raise ValueError(f"Unknown warehouse '{raw}'.")
+    return raw
+
+
+def current():
+    """The warehouse of the current request (None: all), else DEFAULT_WAREHOUSE."""
+    if has_app_context() and "warehouse" in g:
+        return g.warehouse
+    return default_warehouse()
+
+
+def from_args(args):
+    """The warehouse a set of query args (or a batch filter) addresses."""
+    if args.get("warehouse"):
+        return parse(args.get("warehouse"))
+    return current()
+
+
+def scope_filters(warehouse):
+    """Filter clauses limiting stock_items to `warehouse` (none for all)."""
+    return [] if warehouse is None else [StockItem.warehouse == warehouse]
+
+
+def in_scope(item, warehouse):
+    return warehouse is None or item.warehouse == warehouse
@@ -0,0 +1,85 @@
+"""
+Shared fixtures: a fresh app on a throwaway SQLite file per test.
+
+A file rather than an in-memory database, so background jobs (which
+run on their own threads and connections) see the same data. Tests
+override settings by defining an `app_config` fixture returning a dict.
+"""
+import time
+
+import pytest
+
+from config import Config
+from stockapp import create_app, db, thresholds
+
+
+@pytest.fixture
+def app_config():
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, app_config):
+    settings = {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'stock.db'}",
+        "DATABASE_REPLICA_URLS": "",
+        "CACHE_BACKEND": "memory",
+        "EVENTS_BACKEND": "",
+        "EMBEDDED_MODE": False,
+        "SYNC_JOURNAL_ENABLED": False,
+        "SYNC_CENTRAL_URL": "",
+        "SYNC_COMPACT_INTERVAL_SECONDS": 0,
+        "IMPORT_DIR": str(tmp_path / "imports"),
+        **app_config,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(Config, name, value, raising=False)
+    # compiled rules are cached per process, not per app
+    thresholds.invalidate()
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all(bind_key=None)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def add_items(client):
+    """POST items (dicts) to /api/add as a JSON array; returns the response."""
+    def add(*items, **query):
+        return client.post("/api/add", json=list(items), query_string=query)
+    return add
+
+
+@pytest.fixture
+def find_item(client):
+    """The /api/inventory entry of an item_code (None when not listed)."""
+    def find(item_code, warehouse=None):
+        query = {"search": item_code, "limit": 100}
+        if warehouse:
+            query["warehouse"] = warehouse
+        items = client.get("/api/inventory", query_string=query).get_json()["items"]
+        return next((item for item in items if item["item_code"] == item_code), None)
+    return find
+
+
+@pytest.fixture
+def wait_for_job(client):
+    """Poll /api/jobs/<id> until the job finishes or fails; returns its status."""
+    def wait(job, timeout=10):
+        deadline = time.monotonic() + timeout
+        while True:
+            status = client.get(f"/api/jobs/{job['id']}").get_json()
+            if status["status"] in ("finished", "failed") or time.monotonic() > deadline:
+                return status
+            time.sleep(0.02)
+    return wait
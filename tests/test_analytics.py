@@ -0,0 +1,70 @@
+from datetime import date
+
+from stockapp import analytics
+
+
+def series(client, **query):
+    return client.get("/api/analytics/timeseries", query_string=query).get_json()
+
+
+def test_rollups_follow_the_ledger(app, client, add_items):
+    add_items(
+        {"item_code": "TS-1", "inward_qty": 10, "inward_unit_price": 2, "inward_date": "2024-03-04"},
+        {"item_code": "TS-2", "inward_qty": 5, "inward_unit_price": 1, "inward_date": "2024-03-06",
+         "outward_qty": 2, "outward_unit_price": 3, "outward_date": "2024-03-20"},
+    )
+    weeks = series(client, period="week", **{"from": "2024-03-04", "to": "2024-03-24"})
+    assert [point["period_start"] for point in weeks["points"]] == ["2024-03-04", "2024-03-11", "2024-03-18"]
+    assert [(point["inward_qty"], point["outward_qty"]) for point in weeks["points"]] == [(15, 0), (0, 0), (0, 2)]
+    assert weeks["totals"] == {
+        "inward_qty": 15, "inward_value": 25, "outward_qty": 2, "outward_value": 6, "margin": -19, "movements": 3,
+    }
+
+    # the ledger-backed reads give the same series
+    app.config["ANALYTICS_ROLLUPS_ENABLED"] = False
+    with app.app_context():
+        assert analytics.timeseries("week", date(2024, 3, 4), date(2024, 3, 24), "main") == weeks
+
+
+def test_deleting_an_item_keeps_past_periods(app, client, add_items, find_item):
+    add_items({"item_code": "TS-3", "inward_qty": 10, "inward_unit_price": 2, "inward_date": "2024-01-15",
+               "outward_qty": 4, "outward_unit_price": 5, "outward_date": "2024-02-01"})
+    months = {"period": "month", "from": "2024-01-01", "to": "2024-02-29"}
+    before = series(client, **months)
+    client.delete(f"/api/delete/{find_item('TS-3')['id']}")
+
+    assert series(client, **months) == before
+    today = date.today().isoformat()
+    point = series(client, **{"from": today, "to": today})["points"][0]
+    # the 6 left on hand were not issued: nothing goes out today
+    assert (point["outward_qty"], point["outward_value"], point["movements"]) == (0, 0, 0)
+
+
+def test_deleting_an_item_leaves_the_period_outward_totals(client, add_items, find_item):
+    today = date.today().isoformat()
+    add_items({"item_code": "TS-4", "inward_qty": 10, "inward_unit_price": 2, "inward_date": today,
+               "outward_qty": 3, "outward_unit_price": 5, "outward_date": today})
+    month = {"period": "month", "from": today, "to": today}
+    before = series(client, **month)["totals"]
+    assert (before["outward_qty"], before["outward_value"], before["margin"]) == (3, 15, -5)
+
+    client.delete(f"/api/delete/{find_item('TS-4')['id']}")
+    after = series(client, **month)["totals"]
+    assert (after["outward_qty"], after["outward_value"], after["margin"]) == (3, 15, -5)
+
+
+def test_rebuild_matches_incremental_rollups(app, client, add_items, find_item):
+    add_items(*[{"item_code": f"RB-{n}", "inward_qty": n + 1, "inward_unit_price": 1.5,
+                 "inward_date": f"2024-0{n + 1}-10"} for n in range(4)])
+    client.patch(f"/api/update/{find_item('RB-2')['id']}", json={"outward_qty": 1})
+    query = {"period": "month", "from": "2024-01-01", "to": date.today().isoformat()}
+    incremental = series(client, **query)
+    with app.app_context():
+        assert analytics.rebuild_rollups() > 0
+        assert analytics.timeseries("month", date(2024, 1, 1), date.today(), "main") == incremental
+
+
+def test_range_validation(client):
+    assert client.get("/api/analytics/timeseries?period=hour").status_code == 400
+    assert client.get("/api/analytics/timeseries?from=2024-05-01&to=2024-04-01").status_code == 400
+    assert client.get("/api/analytics/timeseries?from=1900-01-01&to=2024-01-01").status_code == 400
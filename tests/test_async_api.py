@@ -0,0 +1,155 @@
+import asyncio
+import json
+import threading
+
+from stockapp import db, thresholds
+from stockapp.async_api import RequestBody, create_asgi_app
+from stockapp.models import AlarmThreshold
+
+
+def call(asgi_app, method, path, chunks=(), headers=()):
+    """Run one HTTP request through the ASGI app; returns (status, headers, body, messages received)."""
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": b"", "http_version": "1.1",
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+    }
+    messages = [{"type": "http.request", "body": chunk, "more_body": n < len(chunks) - 1}
+                for n, chunk in enumerate(chunks)] or [{"type": "http.request", "body": b""}]
+    received, sent = [], []
+    done = None
+
+    async def receive():
+        if len(received) < len(messages):
+            received.append(messages[len(received)])
+            return received[-1]
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    async def main():
+        nonlocal done
+        done = asyncio.Event()
+        await asyncio.wait_for(asgi_app(scope, receive, send), 10)
+
+    asyncio.run(main())
+    start = sent[0]
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return start["status"], dict(start["headers"]), body, len(received)
+
+
+def test_chunked_ndjson_body_reaches_flask(app, find_item):
+    lines = [json.dumps({"item_code": f"AS-{n}", "inward_qty": n}).encode() + b"\n" for n in range(50)]
+    # split mid-line, with no Content-Length (a chunked upload)
+    data = b"".join(lines)
+    chunks = [data[start:start + 97] for start in range(0, len(data), 97)]
+
+    status, _, body, _ = call(
+        create_asgi_app(app), "POST", "/api/add", chunks, headers=[("content-type", "application/x-ndjson")]
+    )
+    assert status == 201
+    assert json.loads(body)["inserted"] == 50
+    assert find_item("AS-49")["inward_qty"] == 49
+
+
+def test_a_view_that_ignores_the_body_still_answers(app):
+    status, _, body, _ = call(create_asgi_app(app), "DELETE", "/api/delete/999", [b"x" * 10] * 5)
+    assert status == 404
+
+
+def test_request_body_pulls_one_message_per_read():
+    pulled = []
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        messages = iter([
+            {"type": "http.request", "body": b"abc", "more_body": True},
+            {"type": "http.request", "body": b"defg", "more_body": True},
+            {"type": "http.request", "body": b"", "more_body": False},
+        ])
+
+        async def receive():
+            pulled.append(True)
+            return next(messages)
+
+        body = RequestBody(receive, loop)
+        reads = []
+
+        def reader():
+            reads.append((body.read(2), len(pulled)))
+            reads.append((body.read(10), len(pulled)))
+            reads.append((body.read(10), len(pulled)))
+            reads.append((body.read(10), len(pulled)))
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        while thread.is_alive():
+            await asyncio.sleep(0.01)
+        return reads
+
+    assert asyncio.run(main()) == [(b"ab", 1), (b"c", 1), (b"defg", 2), (b"", 3)]
+
+
+def test_disconnect_mid_body_stops_the_reader():
+    async def main():
+        loop = asyncio.get_running_loop()
+        messages = iter([{"type": "http.request", "body": b"abc", "more_body": True}, {"type": "http.disconnect"}])
+
+        async def receive():
+            return next(messages)
+
+        body = RequestBody(receive, loop)
+        errors = []
+
+        def reader():
+            try:
+                body.read()
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        while thread.is_alive():
+            await asyncio.sleep(0.01)
+        return errors
+
+    assert asyncio.run(main()) == ["ClientDisconnected"]
+
+
+def test_native_reads_match_the_flask_views(app, client, add_items):
+    add_items({"item_code": "NR-1", "inward_qty": 10, "outward_qty": 7}, {"item_code": "NR-2", "inward_qty": 3})
+    # each side builds its own body (no shared cache entry)
+    app.config["CACHE_ENABLED"] = False
+    asgi_app = create_asgi_app(app)
+    for path in ("/api/inventory", "/api/dashboard-metrics", "/api/item/1"):
+        status, headers, body, _ = call(asgi_app, "GET", path)
+        flask_response = client.get(path)
+        assert status == 200
+        assert json.loads(body) == flask_response.get_json()
+        assert headers[b"etag"].decode() == flask_response.headers["ETag"]
+
+
+def test_item_reads_agree_under_a_changed_rule(app, client, add_items):
+    add_items({"item_code": "NR-3", "inward_qty": 10, "outward_qty": 4},
+              {"item_code": "NR-4", "inward_qty": 10, "outward_qty": 4})
+    with app.app_context():
+        # a rule saved whose reclassify job has not run yet
+        db.session.add(AlarmThreshold(scope="default", low_ratio=0.5))
+        db.session.commit()
+    thresholds.invalidate()
+    asgi_app = create_asgi_app(app)
+
+    # whichever side fills the shared cache entry first, both serve the stored row
+    for item_id, asgi_first in ((1, True), (2, False)):
+        path = f"/api/item/{item_id}"
+        if not asgi_first:
+            flask_response = client.get(path)
+        status, headers, body, _ = call(asgi_app, "GET", path)
+        if asgi_first:
+            flask_response = client.get(path)
+        assert json.loads(body) == flask_response.get_json()
+        assert json.loads(body)["alarm_status"] == "Low Stock"
+        assert headers[b"etag"].decode() == flask_response.headers["ETag"] == '"1"'
@@ -0,0 +1,55 @@
+import random
+
+import numpy as np
+
+from stockapp import batch
+from stockapp.models import StockItem
+from stockapp.thresholds import Ruleset
+
+
+def test_round2_matches_builtin_round():
+    rng = random.Random(7)
+    values = [rng.uniform(-1e6, 1e6) for _ in range(5000)]
+    # near-ties where scaling by 100 crosses the .5 boundary
+    values += [0.125, 0.135, 1.005, 2.675, 1.115, 8.345, -0.125, -2.675, 1e-9, 0.0]
+    values += [round(rng.uniform(0, 1000), 2) + 0.005 for _ in range(2000)]
+    assert batch.round2(values).tolist() == [round(value, 2) for value in values]
+
+
+def test_round2_keeps_shape():
+    assert batch.round2(np.array([[1.005, 2.675]])).shape == (1, 2)
+
+
+def test_compute_derived_matches_compute_fields():
+    rng = random.Random(11)
+    ruleset = Ruleset()
+    rows = [
+        {
+            "item_code": f"P-{n}",
+            "inward_qty": rng.choice([None, 0, rng.uniform(0, 500), rng.randint(0, 500)]),
+            "inward_unit_price": rng.choice([None, rng.uniform(0, 99.99)]),
+            "outward_qty": rng.choice([None, 0, rng.uniform(0, 500)]),
+            "outward_unit_price": rng.choice([None, rng.uniform(0, 99.99)]),
+        }
+        for n in range(2000)
+    ]
+    expected = []
+    for row in rows:
+        item = StockItem(**row)
+        item.compute_fields(ruleset=ruleset)
+        expected.append({name: getattr(item, name) for name in batch.DERIVED_COLUMNS})
+
+    computed = batch.compute_rows([dict(row) for row in rows], ruleset=ruleset)
+    assert [{name: row[name] for name in batch.DERIVED_COLUMNS} for row in computed] == expected
+
+
+def test_compute_frame_fills_derived_columns():
+    import pandas as pd
+
+    frame = pd.DataFrame({
+        "inward_qty": [10.0, 10.0, None], "inward_unit_price": [1.005, 2.0, 1.0],
+        "outward_qty": [3.0, 9.0, 0.0], "outward_unit_price": [0.0, 0.0, 0.0],
+    })
+    batch.compute_frame(frame)
+    assert frame["inward_total_price"].tolist() == [round(10 * 1.005, 2), 20.0, 0.0]
+    assert frame["alarm_status"].tolist() == ["Low Stock", "Critical", "Normal"]
@@ -0,0 +1,63 @@
+def ids_of(find_item, *codes):
+    return [find_item(code)["id"] for code in codes]
+
+
+def test_patch_ids_with_shared_values(app, client, add_items, find_item):
+    app.config["BULK_CHUNK_SIZE"] = 2
+    add_items(*[{"item_code": f"BE-{n}", "inward_qty": 10, "inward_unit_price": 1} for n in range(3)])
+    client.get("/api/dashboard-metrics")
+    ids = ids_of(find_item, "BE-0", "BE-1", "BE-2")
+
+    response = client.patch("/api/items", json={"ids": ids + [999], "set": {"outward_qty": 9, "uom": "kg"}})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body["updated"], body["not_found"]) == (3, 1)
+
+    item = find_item("BE-1")
+    assert (item["uom"], item["balance_stock_qty"], item["alarm_status"], item["version"]) == ("kg", 1, "Critical", 2)
+    assert client.get("/api/dashboard-metrics").get_json()["critical_stock"] == 3
+    assert len(client.get(f"/api/item/{ids[0]}/movements").get_json()["items"]) == 2
+
+
+def test_patch_per_id_edits(client, add_items, find_item):
+    add_items(*[{"item_code": f"PI-{n}", "inward_qty": 10} for n in (1, 2, 3)])
+    first, second, third = ids_of(find_item, "PI-1", "PI-2", "PI-3")
+    body = client.patch("/api/items", json={"items": [
+        {"id": first, "inward_qty": 20},
+        {"id": second, "item_code": "PI-2b"},
+        {"id": third, "inward_qty": "many"},
+        {"inward_qty": 1},
+    ]}).get_json()
+    assert (body["updated"], body["invalid"]) == (2, 2)
+    assert find_item("PI-1")["inward_qty"] == 20
+    assert find_item("PI-2b")["id"] == second
+    assert find_item("PI-3")["inward_qty"] == 10
+
+
+def test_patch_by_filter(client, add_items, find_item):
+    add_items(
+        {"item_code": "FI-1", "inward_qty": 10, "outward_qty": 9},
+        {"item_code": "FI-2", "inward_qty": 10},
+    )
+    body = client.patch("/api/items", json={"filter": {"status": "critical"}, "set": {"po_number": "PO-7"}}).get_json()
+    assert body["updated"] == 1
+    assert (find_item("FI-1")["po_number"], find_item("FI-2")["po_number"]) == ("PO-7", None)
+
+
+def test_delete_ids_and_filter(client, add_items, find_item):
+    add_items(*[{"item_code": f"DE-{n}", "inward_qty": n} for n in range(4)])
+    client.get("/api/dashboard-metrics")
+    body = client.delete("/api/items", json={"ids": ids_of(find_item, "DE-0", "DE-1") + [999]}).get_json()
+    assert (body["deleted"], body["not_found"]) == (2, 1)
+
+    body = client.delete("/api/items", json={"filter": {"search": "DE-3"}}).get_json()
+    assert body["deleted"] == 1
+    assert client.get("/api/dashboard-metrics").get_json()["total_items"] == 1
+
+
+def test_batch_validation(client, add_items):
+    add_items({"item_code": "BV-1"})
+    assert client.patch("/api/items", json={"ids": [1], "set": {"balance_stock_qty": 1}}).status_code == 400
+    assert client.patch("/api/items", json={"ids": [1], "set": {"item_code": "X"}}).status_code == 400
+    assert client.patch("/api/items", json={"filter": {}, "set": {"uom": "kg"}}).status_code == 400
+    assert client.delete("/api/items", json={"ids": "all"}).status_code == 400
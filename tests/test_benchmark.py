@@ -0,0 +1,57 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import benchmark
+from randomDataGenerator import generate_items
+
+ROOT = Path(__file__).parent.parent
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert [benchmark.percentile(values, f) for f in (0.5, 0.95, 0.99, 1.0)] == [50, 95, 99, 100]
+    assert benchmark.percentile([7], 0.99) == 7 and benchmark.percentile([], 0.5) is None
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    def report(p95, rps):
+        return {"scenarios": {"metrics": {"latency_ms": {"p95": p95}, "throughput_rps": rps}}}
+
+    assert benchmark.compare(report(11, 95), report(10, 100), 0.2) == []
+    assert benchmark.compare(report(13, 70), report(10, 100), 0.2) == [
+        "metrics: p95 10 ms -> 13 ms", "metrics: throughput 100 -> 70 req/s",
+    ]
+
+
+def test_dataset_is_reproducible():
+    assert list(generate_items(20, seed=3)) == list(generate_items(20, seed=3))
+    assert list(generate_items(20, seed=3)) != list(generate_items(20, seed=4))
+
+
+def test_end_to_end_run_writes_a_report(tmp_path):
+    output = tmp_path / "run.json"
+    subprocess.run(
+        [sys.executable, "benchmark.py", "--rows", "40", "--requests", "6", "--concurrency", "2",
+         "--warmup", "1", "--db", str(tmp_path / "bench.db"), "--output", str(output)],
+        cwd=ROOT, check=True, capture_output=True, timeout=120,
+    )
+    report = json.loads(output.read_text())
+    assert report["seed"]["rows"] == 40 and report["meta"]["seed"] == 42
+    assert set(report["scenarios"]) == set(benchmark.SCENARIOS)
+    for name, stats in report["scenarios"].items():
+        assert stats["requests"] == 6, name
+        assert "exception" not in stats["status_codes"], name
+
+    # against a baseline with 100x the throughput the run fails
+    baseline = tmp_path / "baseline.json"
+    for scenario in report["scenarios"].values():
+        scenario["throughput_rps"] *= 100
+    baseline.write_text(json.dumps(report))
+    result = subprocess.run(
+        [sys.executable, "benchmark.py", "--rows", "40", "--requests", "6", "--scenarios", "metrics",
+         "--db", str(tmp_path / "bench.db"), "--reuse-db", "--baseline", str(baseline)],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 1 and "REGRESSION metrics: throughput" in result.stderr
@@ -0,0 +1,94 @@
+import json
+
+from sqlalchemy import insert
+
+from stockapp import batch, bulk, db
+from stockapp.models import StockItem, StockMovement
+
+
+def test_ndjson_is_imported_in_chunks(app, client):
+    app.config["BULK_CHUNK_SIZE"] = 3
+    lines = [json.dumps({"item_code": f"ND-{n}", "inward_qty": n}) for n in range(10)]
+    lines.insert(4, json.dumps({"item_code": "ND-bad", "inward_qty": "lots"}))
+    response = client.post("/api/add", data="\n".join(lines), content_type="application/x-ndjson")
+
+    body = response.get_json()
+    assert response.status_code == 201
+    assert (body["inserted"], body["invalid"]) == (10, 1)
+    assert body["results"] == [{
+        "index": 4, "item_code": "ND-bad", "status": "invalid", "error": "'inward_qty' must be a number.",
+    }]
+
+
+def test_duplicates_within_and_across_chunks(app, add_items):
+    app.config["BULK_CHUNK_SIZE"] = 2
+    body = add_items(
+        {"item_code": "DUP-1"}, {"item_code": "DUP-1"},  # same chunk
+        {"item_code": "DUP-2"}, {"item_code": "DUP-1"},  # a later chunk
+    ).get_json()
+    assert (body["inserted"], body["duplicate"]) == (2, 2)
+    assert [(result["index"], result["error"]) for result in body["results"]] == [
+        (1, "Duplicate item_code in request."),
+        (3, "Duplicate item_code. Must be unique."),
+    ]
+
+
+def test_all_duplicates_is_a_conflict(add_items):
+    add_items({"item_code": "ONCE"})
+    assert add_items({"item_code": "ONCE"}).status_code == 409
+
+
+def test_skip_reports_rows_lost_to_a_concurrent_insert(app, monkeypatch):
+    compute_rows = batch.compute_rows
+
+    def racing_compute_rows(rows, ruleset=None):
+        # another writer commits RACE-1 after the existence check
+        db.session.execute(insert(StockItem.__table__), [{"warehouse": "main", "item_code": "RACE-1"}])
+        db.session.commit()
+        monkeypatch.setattr(batch, "compute_rows", compute_rows)
+        return compute_rows(rows, ruleset=ruleset)
+
+    with app.test_request_context():
+        monkeypatch.setattr(batch, "compute_rows", racing_compute_rows)
+        importer = bulk.BulkImporter(on_conflict="skip", report_all=True)
+        importer.run([{"item_code": "RACE-1", "inward_qty": 5}, {"item_code": "RACE-2", "inward_qty": 5}])
+
+        assert importer.counts["inserted"] == 1 and importer.counts["skipped"] == 1
+        assert {result["item_code"]: result["status"] for result in importer.results} == {
+            "RACE-1": "skipped", "RACE-2": "inserted",
+        }
+        # the other writer's row is left as it wrote it
+        assert db.session.get(StockItem, 1).inward_qty != 5
+
+
+def test_update_counts_rows_lost_to_a_concurrent_insert_as_updated(app, client, monkeypatch):
+    client.get("/api/dashboard-metrics")
+    compute_rows = batch.compute_rows
+
+    def racing_compute_rows(rows, ruleset=None):
+        # another writer imports RACE-1 after the existence check
+        monkeypatch.setattr(batch, "compute_rows", compute_rows)
+        bulk.BulkImporter().run([{"item_code": "RACE-1", "inward_qty": 3, "inward_unit_price": 1}])
+        return compute_rows(rows, ruleset=ruleset)
+
+    with app.test_request_context():
+        monkeypatch.setattr(batch, "compute_rows", racing_compute_rows)
+        importer = bulk.BulkImporter(on_conflict="update", report_all=True)
+        importer.run([
+            {"item_code": "RACE-1", "inward_qty": 5, "inward_unit_price": 1},
+            {"item_code": "RACE-2", "inward_qty": 5, "inward_unit_price": 1},
+        ])
+
+        assert importer.counts["inserted"] == 1 and importer.counts["updated"] == 1
+        assert {result["item_code"]: result["status"] for result in importer.results} == {
+            "RACE-1": "updated", "RACE-2": "inserted",
+        }
+        item = db.session.execute(db.select(StockItem).filter_by(item_code="RACE-1")).scalar_one()
+        assert (item.inward_qty, item.version) == (5, 2)
+        # one opening movement, then the edit's
+        assert [(m.source, m.direction, m.qty) for m in db.session.scalars(
+            db.select(StockMovement).filter_by(item_id=item.id).order_by(StockMovement.id)
+        )] == [("opening", "in", 3), ("edit", "in", 2)]
+
+    metrics = client.get("/api/dashboard-metrics").get_json()
+    assert (metrics["total_items"], metrics["total_value"]) == (2, 10.0)
@@ -0,0 +1,65 @@
+from sqlalchemy import text
+
+from config import Config
+from stockapp import create_app, db
+
+
+def test_item_etag_and_conditional_get(client, add_items, find_item):
+    add_items({"item_code": "ET-1", "inward_qty": 10})
+    item_id = find_item("ET-1")["id"]
+
+    response = client.get(f"/api/item/{item_id}")
+    assert response.status_code == 200
+    assert response.get_etag()[0] == "1"
+    assert client.get(f"/api/item/{item_id}", headers={"If-None-Match": '"1"'}).status_code == 304
+
+    client.patch(f"/api/update/{item_id}", json={"outward_qty": 3})
+    response = client.get(f"/api/item/{item_id}", headers={"If-None-Match": '"1"'})
+    assert response.status_code == 200
+    assert response.get_json()["balance_stock_qty"] == 7 and response.get_etag()[0] == "2"
+
+
+def test_threshold_change_is_not_hidden_by_a_304(client, add_items, find_item, wait_for_job):
+    add_items({"item_code": "ET-2", "inward_qty": 10, "outward_qty": 3, "uom": "box"})
+    item_id = find_item("ET-2")["id"]
+    etag = client.get(f"/api/item/{item_id}").headers["ETag"]
+
+    job = client.post("/api/thresholds", json={"scope": "uom", "match_value": "box", "low_ratio": 0.5})
+    wait_for_job(job.get_json()["job"])
+
+    response = client.get(f"/api/item/{item_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["alarm_status"] == "Normal"
+
+
+def test_get_serves_the_stored_row(app, client, add_items, find_item):
+    add_items({"item_code": "ET-3", "inward_qty": 10})
+    item_id = find_item("ET-3")["id"]
+    with app.app_context():
+        db.session.execute(text("UPDATE stock_items SET alarm_status = 'Stored' WHERE item_code = 'ET-3'"))
+        db.session.commit()
+    assert client.get(f"/api/item/{item_id}").get_json()["alarm_status"] == "Stored"
+
+
+def test_writes_invalidate_cached_pages(client, add_items):
+    add_items({"item_code": "PG-1", "inward_qty": 1})
+    first = client.get("/api/inventory")
+    assert client.get("/api/inventory", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    add_items({"item_code": "PG-2", "inward_qty": 1})
+    second = client.get("/api/inventory", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert {row["item_code"] for row in second.get_json()["items"]} == {"PG-1", "PG-2"}
+
+
+def test_workers_without_a_shared_backend_never_serve_stale_pages(app, monkeypatch):
+    monkeypatch.setattr(Config, "CACHE_BACKEND", "")
+    first, second = create_app().test_client(), create_app().test_client()
+    first.post("/api/add", json=[{"item_code": "NB-1", "inward_qty": 1}])
+    assert second.get("/api/inventory").get_json()["items"][0]["inward_qty"] == 1
+
+    first.patch("/api/update/1", json={"inward_qty": 5})
+    response = second.get("/api/inventory")
+    assert response.get_json()["items"][0]["inward_qty"] == 5
+    # still conditional
+    assert second.get("/api/inventory", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
@@ -0,0 +1,79 @@
+from sqlalchemy import text
+
+from stockapp import db, ledger
+
+
+def test_stale_if_match_is_412_and_stale_version_409(client, add_items, find_item):
+    add_items({"item_code": "OC-1", "inward_qty": 10})
+    item_id = find_item("OC-1")["id"]
+    assert client.patch(f"/api/update/{item_id}", json={"outward_qty": 1, "version": 1}).status_code == 200
+
+    response = client.patch(f"/api/update/{item_id}", json={"outward_qty": 2}, headers={"If-Match": '"1"'})
+    assert response.status_code == 412
+    assert response.get_json()["item"]["version"] == 2 and response.get_etag()[0] == "2"
+
+    response = client.patch(f"/api/update/{item_id}", json={"outward_qty": 2, "version": 1})
+    assert response.status_code == 409
+    assert client.delete(f"/api/delete/{item_id}", headers={"If-Match": '"1"'}).status_code == 412
+    assert find_item("OC-1")["outward_qty"] == 1
+
+
+def test_increment_bumps_the_version_once(client, add_items, find_item):
+    add_items({"item_code": "OC-2", "inward_qty": 10})
+    item_id = find_item("OC-2")["id"]
+
+    response = client.patch(f"/api/update/{item_id}", json={"increment": {"outward_qty": 2}},
+                            headers={"If-Match": '"1"'})
+    assert response.status_code == 200
+    item = response.get_json()["item"]
+    assert (item["version"], item["balance_stock_qty"], response.get_etag()[0]) == (2, 8, "2")
+
+    # the ETag of that response is good for the next conditional edit
+    response = client.patch(f"/api/update/{item_id}", json={"uom": "kg", "increment": {"outward_qty": 1, "inward_qty": 5}},
+                            headers={"If-Match": response.headers["ETag"]})
+    assert response.status_code == 200
+    item = response.get_json()["item"]
+    assert (item["version"], item["uom"], item["balance_stock_qty"]) == (3, "kg", 12)
+    assert find_item("OC-2")["version"] == 3
+
+
+def concurrent_edit(monkeypatch, item_code, sql):
+    """Commit `sql` from "another request" just before the next posting's UPDATE."""
+    post_movement = ledger.post_movement
+
+    def racing_post_movement(*args, **kwargs):
+        monkeypatch.setattr(ledger, "post_movement", post_movement)
+        db.session.execute(text(sql + f" WHERE item_code = '{item_code}'"))
+        db.session.commit()
+        return post_movement(*args, **kwargs)
+
+    monkeypatch.setattr(ledger, "post_movement", racing_post_movement)
+
+
+def test_unconditional_increment_retries_a_lost_race(client, add_items, find_item, monkeypatch):
+    add_items({"item_code": "OC-3", "inward_qty": 10})
+    item_id = find_item("OC-3")["id"]
+    concurrent_edit(monkeypatch, "OC-3", "UPDATE stock_items SET outward_qty = 3, version = version + 1")
+
+    response = client.patch(f"/api/update/{item_id}", json={"increment": {"outward_qty": 2}})
+    assert response.status_code == 200
+    item = find_item("OC-3")
+    assert (item["outward_qty"], item["balance_stock_qty"], item["version"]) == (5, 5, 3)
+
+
+def test_conditional_increment_loses_a_race_with_409(client, add_items, find_item, monkeypatch):
+    add_items({"item_code": "OC-4", "inward_qty": 10})
+    item_id = find_item("OC-4")["id"]
+    concurrent_edit(monkeypatch, "OC-4", "UPDATE stock_items SET outward_qty = 3, version = version + 1")
+
+    response = client.patch(f"/api/update/{item_id}", json={"increment": {"outward_qty": 2}, "version": 1})
+    assert response.status_code == 409
+    assert (response.get_json()["item"]["outward_qty"], response.get_json()["item"]["version"]) == (3, 2)
+
+
+def test_posted_movement_bumps_once(client, add_items, find_item):
+    add_items({"item_code": "OC-5", "inward_qty": 10})
+    item_id = find_item("OC-5")["id"]
+    response = client.post(f"/api/item/{item_id}/movements", json={"direction": "out", "qty": 9})
+    assert response.get_json()["item"]["version"] == 2
+    assert response.get_json()["item"]["alarm_status"] == "Critical"
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import insert
+
+from stockapp import db, engines
+from stockapp.models import StockItem
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {
+        "DATABASE_REPLICA_URLS": f"sqlite:///{tmp_path / 'replica.db'}, sqlite:///{tmp_path / 'missing' / 'replica.db'}",
+        "REPLICA_LAG_SECONDS": 0,
+        "CACHE_ENABLED": False,
+    }
+
+
+@pytest.fixture
+def replica(app):
+    """The first replica, holding one row the primary does not have."""
+    with app.app_context():
+        engine = db.engines["replica_0"]
+        db.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(insert(StockItem.__table__), [{"warehouse": "main", "item_code": "ON-REPLICA"}])
+    return engine
+
+
+def codes(client):
+    return [item["item_code"] for item in client.get("/api/inventory").get_json()["items"]]
+
+
+def test_engine_options():
+    config = {"DB_POOL_SIZE": 3, "DB_MAX_OVERFLOW": 1}
+    assert engines.engine_options("postgresql://db/stock", config)["pool_size"] == 3
+    assert "pool_size" not in engines.engine_options("sqlite:///stock.db", config)
+
+
+def test_reads_go_to_a_healthy_replica(app, client, replica):
+    assert codes(client) == ["ON-REPLICA"]
+    with app.app_context():
+        routing = engines.pool_stats()["routing"]
+    assert routing["reads"]["replica"] == 1
+
+
+def test_dead_replicas_are_skipped(app, client, add_items, replica):
+    add_items({"item_code": "ON-PRIMARY"})
+    # round-robin: the second request starts at the unreachable replica
+    assert codes(client) == ["ON-REPLICA"]
+    assert codes(client) == ["ON-REPLICA"]
+    app.extensions["stockapp_replicas"].mark_down("replica_0")
+    assert codes(client) == ["ON-PRIMARY"]
+
+    stats = client.get("/api/stats/pool").get_json()
+    assert stats["routing"]["reads"] == {"replica": 2, "primary": 1, "fallback": 1}
+    assert [entry["available"] for entry in stats["routing"]["replicas"]] == [False, False]
+    assert {"primary", "replica_0", "replica_1"} <= set(stats["engines"])
+
+
+def test_reads_stay_on_the_primary_after_a_local_write(app, client, add_items, replica):
+    app.extensions["stockapp_replicas"].lag_seconds = 60
+    add_items({"item_code": "ON-PRIMARY"})
+    assert codes(client) == ["ON-PRIMARY"]
+
+
+def test_writes_in_a_replica_request_use_the_primary(app, replica):
+    with app.test_request_context():
+        app.extensions["stockapp_replicas"].route(db.session)
+        assert db.session.execute(db.select(StockItem.item_code)).scalars().all() == ["ON-REPLICA"]
+        db.session.add(StockItem(item_code="WRITTEN"))
+        db.session.commit()
+        assert db.session.execute(db.select(StockItem.item_code)).scalars().all() == ["WRITTEN"]
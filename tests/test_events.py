@@ -0,0 +1,56 @@
+import json
+
+from stockapp.events import Broadcaster
+
+
+def frames(stream, count):
+    """The next `count` SSE frames of a stream, parsed to (id, event, data)."""
+    parsed = []
+    for frame in stream:
+        if isinstance(frame, bytes):
+            frame = frame.decode()
+        if not frame.startswith("id:"):
+            continue
+        fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+        parsed.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+        if len(parsed) == count:
+            return parsed
+    return parsed
+
+
+def test_replay_after_last_event_id():
+    broadcaster = Broadcaster(replay_size=10, heartbeat=0.01)
+    for n in range(3):
+        broadcaster.publish("items", json.dumps({"n": n}))
+    assert frames(broadcaster.stream(1), 2) == [(2, "items", {"n": 1}), (3, "items", {"n": 2})]
+
+
+def test_reset_when_events_were_evicted():
+    broadcaster = Broadcaster(replay_size=2, heartbeat=0.01)
+    for n in range(5):
+        broadcaster.publish("items", json.dumps({"n": n}))
+    assert frames(broadcaster.stream(1), 1) == [(5, "reset", {})]
+    # an id from before a restart cannot be replayed either
+    assert frames(broadcaster.stream(99), 1) == [(5, "reset", {})]
+
+
+def test_writes_publish_item_and_metric_events(client, add_items, find_item):
+    client.get("/api/dashboard-metrics")
+    add_items({"item_code": "EV-1", "inward_qty": 10, "inward_unit_price": 2})
+    item_id = find_item("EV-1")["id"]
+    client.delete(f"/api/delete/{item_id}")
+
+    response = client.get("/api/events", headers={"Last-Event-ID": "0"}, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    events = frames(response.response, 4)
+    response.close()
+
+    assert [event for _, event, _ in events] == ["items", "metrics", "items", "metrics"]
+    assert events[0][2]["action"] == "created" and events[0][2]["ids"] == [item_id]
+    assert events[1][2] == {"warehouse": "main", "total_items": 1, "normal_stock": 1, "total_value": 20.0}
+    assert events[2][2]["action"] == "deleted"
+    assert events[3][2]["total_items"] == -1
+
+
+def test_invalid_last_event_id(client):
+    assert client.get("/api/events", headers={"Last-Event-ID": "soon"}).status_code == 400
@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+
+from stockapp import export
+
+
+def test_csv_export_covers_every_batch(app, client, add_items):
+    app.config["EXPORT_BATCH_SIZE"] = 2
+    add_items(*[{"item_code": f"EX-{n}", "inward_qty": 10, "inward_date": "2024-05-01"} for n in range(5)])
+    response = client.get("/api/export?format=csv")
+    assert response.status_code == 200 and response.mimetype == "text/csv"
+    assert "attachment;" in response.headers["Content-Disposition"]
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["item_code"] for row in rows] == [f"EX-{n}" for n in range(5)]
+    assert rows[0]["inward_date"] == "2024-05-01"
+    assert list(rows[0]) == list(export.EXPORT_COLUMNS)
+
+
+def test_export_applies_inventory_filters(client, add_items):
+    add_items(
+        {"item_code": "FL-1", "inward_qty": 10, "outward_qty": 9},
+        {"item_code": "FL-2", "inward_qty": 10},
+    )
+    body = client.get("/api/export?format=ndjson&status=critical").get_data(as_text=True)
+    assert [json.loads(line)["item_code"] for line in body.splitlines()] == ["FL-1"]
+
+
+def test_ndjson_export_can_be_imported_again(app, client, add_items):
+    add_items({"item_code": "RT-1", "inward_qty": 4, "inward_unit_price": 2.5, "inward_date": "2024-01-31"})
+    exported = [json.loads(line) for line in client.get("/api/export?format=ndjson").get_data(as_text=True).splitlines()]
+    for row in exported:
+        row.pop("id")
+        row["item_code"] = "RT-2"
+
+    assert client.post("/api/add", json=exported).status_code == 201
+    copied = json.loads(client.get("/api/export?format=ndjson&search=RT-2").get_data(as_text=True))
+    assert (copied["inward_total_price"], copied["inward_date"]) == (10.0, "2024-01-31")
+
+
+def test_xlsx_export(client, add_items):
+    from openpyxl import load_workbook
+
+    add_items({"item_code": "XL-1", "inward_qty": 3})
+    response = client.get("/api/export?format=xlsx")
+    assert response.status_code == 200
+    sheet = load_workbook(io.BytesIO(response.get_data())).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0] == export.EXPORT_COLUMNS and rows[1][2] == "XL-1"
+
+
+def test_invalid_format(client):
+    assert client.get("/api/export?format=pdf").status_code == 400
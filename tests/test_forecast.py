@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from stockapp import db, forecast
+from stockapp.models import StockForecast
+
+
+def test_forecast_grades():
+    usage, days, risk = forecast.forecast_arrays(
+        [0, 100, 100, 100, 100, 5], [10, 0, 900, 90, 9, -3], window_days=90, lead_days=14,
+    )
+    assert usage.tolist() == [10 / 90, 0, 10, 1, 0.1, 0]
+    assert np.isnan(days[1]) and days[[0, 2, 3, 4]].tolist() == [0, 10, 100, 1000]
+    assert risk.tolist() == ["stockout", "none", "high", "low", "low", "none"]
+
+
+def test_postings_refresh_the_forecast(client, add_items, find_item):
+    add_items({"item_code": "FC-1", "inward_qty": 100}, {"item_code": "FC-2", "inward_qty": 100})
+    assert find_item("FC-1")["stockout_risk"] == "none"
+
+    item_id = find_item("FC-1")["id"]
+    client.post(f"/api/item/{item_id}/movements", json={"direction": "out", "qty": 90})
+    item = find_item("FC-1")
+    # 90 out over 90 days: 1 a day, 10 left -> 10 days, inside the 14 day lead time
+    assert (item["daily_usage"], item["days_to_stockout"], item["stockout_risk"]) == (1, 10, "high")
+
+    # a movement older than the window does not count
+    old = (date.today() - timedelta(days=200)).isoformat()
+    client.post(f"/api/item/{find_item('FC-2')['id']}/movements", json={"direction": "out", "qty": 50, "date": old})
+    assert find_item("FC-2")["stockout_risk"] == "none"
+
+    ordered = client.get("/api/inventory?sort=stockout_risk&fields=item_code").get_json()["items"]
+    assert [item["item_code"] for item in ordered] == ["FC-1", "FC-2"]
+
+
+def test_recompute_job_and_delete(app, client, add_items, find_item, wait_for_job):
+    add_items(*[{"item_code": f"FJ-{n}", "inward_qty": 10, "outward_qty": n} for n in range(5)])
+    with app.app_context():
+        db.session.execute(db.delete(StockForecast))
+        db.session.commit()
+        assert forecast.recompute_forecasts(chunk_size=2) == 5
+
+    job = client.post("/api/jobs/forecast", json={"as_of": "2030-01-01"}).get_json()["job"]
+    assert wait_for_job(job)["changed"] == 5
+
+    client.delete(f"/api/delete/{find_item('FJ-1')['id']}")
+    with app.app_context():
+        assert db.session.query(StockForecast).count() == 4
+
+
+def test_sort_validation(client):
+    assert client.get("/api/inventory?sort=price").status_code == 400
+    assert client.get("/api/inventory?sort=stockout_risk&cursor=").status_code == 400
@@ -0,0 +1,56 @@
+import io
+import os
+
+from stockapp import imports
+
+
+def upload(client, filename, data, **query):
+    return client.post(
+        "/api/import", query_string=query,
+        data={"file": (io.BytesIO(data), filename)}, content_type="multipart/form-data",
+    )
+
+
+def test_csv_import_job(app, client, find_item, wait_for_job):
+    app.config["BULK_CHUNK_SIZE"] = 2
+    sheet = "Item Code,Inward Qty,Inward-Unit Price\nIM-1,10,1.5\nIM-2,lots,1\nIM-3,4,\n1001,1,1\n"
+    response = upload(client, "stock.csv", sheet.encode())
+    assert response.status_code == 202
+
+    job = wait_for_job(response.get_json()["job"])
+    assert (job["status"], job["processed"], job["changed"], job["failed"]) == ("finished", 4, 3, 1)
+    assert [result["item_code"] for result in job["results"]] == ["IM-2"]
+    assert find_item("IM-1")["inward_total_price"] == 15.0
+    # integral cells keep codes like 1001 as written
+    assert find_item("1001")["item_code"] == "1001"
+    assert os.listdir(app.config["IMPORT_DIR"]) == []
+
+
+def test_xlsx_import_job_with_update(client, add_items, find_item, wait_for_job):
+    from openpyxl import Workbook
+
+    add_items({"item_code": "XI-1", "inward_qty": 10, "uom": "kg"})
+    workbook = Workbook()
+    workbook.active.append(["item_code", "outward_qty"])
+    workbook.active.append(["XI-1", 4])
+    workbook.active.append([None, None])
+    workbook.active.append(["XI-2", 0])
+    data = io.BytesIO()
+    workbook.save(data)
+
+    job = wait_for_job(upload(client, "stock.xlsx", data.getvalue(), on_conflict="update").get_json()["job"])
+    assert (job["status"], job["processed"], job["changed"]) == ("finished", 2, 2)
+    assert (find_item("XI-1")["balance_stock_qty"], find_item("XI-1")["uom"]) == (6, "kg")
+
+
+def test_rejected_uploads(client):
+    assert client.post("/api/import").status_code == 400
+    assert upload(client, "stock.pdf", b"%PDF").status_code == 400
+    assert upload(client, "stock.csv", b"item_code\n", on_conflict="merge").status_code == 400
+
+
+def test_header_and_format_detection():
+    assert imports.header_key(" Inward-Unit  Price ") == "inward_unit_price"
+    assert imports.detect_format("a.XLSX") == "xlsx"
+    assert imports.detect_format("upload.bin", "csv") == "csv"
+    assert imports.detect_format("a.ods") is None
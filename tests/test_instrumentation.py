@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {
+        "INSTRUMENTATION_ENABLED": True,
+        "PROFILE_DIR": str(tmp_path / "profiles"),
+        "PROFILE_TOKEN": "let-me-see",
+        "PROFILE_SLOW_MS": 0,
+        "PROFILE_SAMPLE_RATE": 0.0,
+    }
+
+
+def timing(response):
+    return dict(
+        (part.split(";")[0], part) for part in response.headers["Server-Timing"].split(", ")
+    )
+
+
+def test_server_timing_header(client, add_items):
+    add_items({"item_code": "IN-1"})
+    timings = timing(client.get("/api/item/1"))
+    assert set(timings) == {"db", "hydrate", "serialize", "total"}
+    assert 'desc="1 rows"' in timings["hydrate"]
+    assert "queries" in timings["db"]
+
+
+def test_metrics_endpoint(client, add_items):
+    add_items({"item_code": "IN-2"})
+    client.get("/api/item/1")
+    client.get("/api/item/999")
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'stockapp_requests_total{endpoint="main.get_single_item",method="GET",status="200"} 1' in text
+    assert 'stockapp_requests_total{endpoint="main.get_single_item",method="GET",status="404"} 1' in text
+    assert 'stockapp_request_duration_seconds_count{endpoint="main.get_single_item"} 2' in text
+    assert 'stockapp_db_pool_peak_checked_out{engine="primary"}' in text
+
+
+def test_profile_on_request_with_token(app, client, tmp_path):
+    client.get("/api/dashboard-metrics")
+    assert not (tmp_path / "profiles").exists()
+
+    client.get("/api/dashboard-metrics", headers={"X-Profile": "let-me-see"})
+    names = sorted(path.suffix for path in (tmp_path / "profiles").iterdir())
+    assert names == [".json", ".prof"]
+    assert "stockapp_profiles_written_total 1" in client.get("/metrics").get_data(as_text=True)
+
+
+def test_stack_profiler(app, client, tmp_path):
+    app.extensions["stockapp_instrumentation"]["profiler"].kind = "stack"
+    client.get("/api/inventory", headers={"X-Profile": "let-me-see"})
+    assert sorted(path.suffix for path in (tmp_path / "profiles").iterdir()) == [".folded", ".json"]
+
+
+@pytest.mark.parametrize("app_config", [{}])
+def test_metrics_disabled_by_default(client):
+    assert client.get("/metrics").status_code == 404
+    assert "Server-Timing" not in client.get("/api/inventory").headers
@@ -0,0 +1,72 @@
+from datetime import date
+
+from stockapp import db, ledger
+from stockapp.models import BalanceSnapshot, StockMovement
+
+
+def movements(app, item_id):
+    with app.app_context():
+        return [
+            (movement.direction, movement.qty, movement.movement_date, movement.source, movement.balance_after)
+            for movement in db.session.execute(
+                db.select(StockMovement).filter_by(item_id=item_id).order_by(StockMovement.id)
+            ).scalars()
+        ]
+
+
+def test_opening_uses_item_dates_and_edits_are_dated_today(app, client, add_items, find_item):
+    add_items({"item_code": "LG-1", "inward_qty": 10, "inward_date": "2024-03-01"})
+    item_id = find_item("LG-1")["id"]
+    client.patch(f"/api/update/{item_id}", json={"inward_qty": 12, "outward_qty": 5, "outward_date": "2024-03-05"})
+
+    assert movements(app, item_id) == [
+        ("in", 10, date(2024, 3, 1), "opening", 10),
+        ("in", 2, date.today(), "edit", 12),
+        ("out", 5, date.today(), "edit", 7),
+    ]
+    with app.app_context():
+        # a correction does not rewrite a day that was already reported
+        assert ledger.balance_as_of(item_id, date(2024, 3, 31))["balance_stock_qty"] == 10
+        assert ledger.balance_as_of(item_id, date.today())["balance_stock_qty"] == 7
+
+
+def test_posted_movements_add_up(app, client, add_items, find_item):
+    add_items({"item_code": "LG-2", "inward_qty": 10, "inward_unit_price": 2})
+    item_id = find_item("LG-2")["id"]
+    response = client.post(f"/api/item/{item_id}/movements", json={"direction": "in", "qty": 10, "unit_price": 4})
+    assert response.status_code == 201
+    item = response.get_json()["item"]
+    assert (item["inward_qty"], item["inward_unit_price"], item["balance_stock_qty"]) == (20, 3, 20)
+
+    client.post(f"/api/item/{item_id}/movements", json={"direction": "out", "qty": 15, "date": "2030-01-01"})
+    page = client.get(f"/api/item/{item_id}/movements?limit=2").get_json()
+    assert [row["balance_after"] for row in page["items"]] == [5, 20]
+    assert client.get(f"/api/item/{item_id}/movements?before={page['next_before']}").get_json()["items"][0]["source"] == "opening"
+
+
+def test_balance_as_of_uses_snapshot_plus_tail(app, client, add_items, find_item, wait_for_job):
+    add_items({"item_code": "LG-3", "inward_qty": 10, "inward_date": "2024-01-01"})
+    item_id = find_item("LG-3")["id"]
+    for day, direction, qty in (("2024-01-05", "out", 3), ("2024-02-10", "in", 6)):
+        client.post(f"/api/item/{item_id}/movements", json={"direction": direction, "qty": qty, "date": day})
+
+    job = client.post("/api/jobs/snapshot", json={"as_of": "2024-01-31"}).get_json()["job"]
+    assert wait_for_job(job)["changed"] == 1
+
+    balance = client.get(f"/api/item/{item_id}/balance?as_of=2024-02-15").get_json()
+    assert (balance["balance_stock_qty"], balance["tail_movements"]) == (13, 1)
+    assert client.get(f"/api/item/{item_id}/balance?as_of=2024-01-04").get_json()["balance_stock_qty"] == 10
+
+    # a back-dated movement drops the snapshot it makes stale
+    client.post(f"/api/item/{item_id}/movements", json={"direction": "out", "qty": 1, "date": "2024-01-20"})
+    with app.app_context():
+        assert db.session.execute(db.select(BalanceSnapshot).filter_by(item_id=item_id)).first() is None
+    assert client.get(f"/api/item/{item_id}/balance?as_of=2024-01-31").get_json()["balance_stock_qty"] == 6
+
+
+def test_movement_validation(client, add_items, find_item):
+    add_items({"item_code": "LG-4"})
+    item_id = find_item("LG-4")["id"]
+    assert client.post(f"/api/item/{item_id}/movements", json={"direction": "sideways", "qty": 1}).status_code == 400
+    assert client.post(f"/api/item/{item_id}/movements", json={"direction": "in", "qty": 0}).status_code == 400
+    assert client.get(f"/api/item/{item_id}/balance?as_of=yesterday").status_code == 400
@@ -0,0 +1,55 @@
+from sqlalchemy import text
+
+from stockapp import batch, db, recompute
+from stockapp.models import StockItem
+
+
+def drift(app, sql):
+    """Edit rows behind the app's back (like a manual SQL fix)."""
+    with app.app_context():
+        db.session.execute(text(sql))
+        db.session.commit()
+
+
+def test_recompute_fixes_drifted_rows_only(app, client, add_items, find_item):
+    add_items(*[{"item_code": f"RC-{n}", "inward_qty": 10, "inward_unit_price": 1} for n in range(4)])
+    client.get("/api/dashboard-metrics")
+    drift(app, "UPDATE stock_items SET outward_qty = 9 WHERE item_code IN ('RC-1', 'RC-2')")
+
+    with app.app_context():
+        assert recompute.recompute_derived(chunk_size=1) == (2, 2)
+        assert recompute.recompute_derived() == (0, 0)
+
+    assert find_item("RC-1")["alarm_status"] == "Critical"
+    assert find_item("RC-1")["balance_stock_qty"] == 1
+    assert find_item("RC-1")["version"] == 2 and find_item("RC-0")["version"] == 1
+    assert client.get("/api/dashboard-metrics").get_json()["critical_stock"] == 2
+
+
+def test_recompute_skips_rows_edited_meanwhile(app, add_items, monkeypatch):
+    add_items(*[{"item_code": f"RR-{n}", "inward_qty": 10} for n in range(3)])
+    drift(app, "UPDATE stock_items SET outward_qty = 9")
+    compute_derived = batch.compute_derived
+
+    def racing_compute_derived(*args, **kwargs):
+        # a user edit of RR-1 commits between the chunk read and the write
+        db.session.execute(text(
+            "UPDATE stock_items SET outward_qty = 0, balance_stock_qty = 10, alarm_status = 'Normal', "
+            "version = version + 1 WHERE item_code = 'RR-1'"
+        ))
+        db.session.commit()
+        monkeypatch.setattr(batch, "compute_derived", compute_derived)
+        return compute_derived(*args, **kwargs)
+
+    with app.app_context():
+        monkeypatch.setattr(batch, "compute_derived", racing_compute_derived)
+        assert recompute.recompute_derived() == (3, 2)
+        item = db.session.execute(db.select(StockItem).filter_by(item_code="RR-1")).scalar_one()
+        assert (item.alarm_status, item.balance_stock_qty, item.version) == ("Normal", 10, 2)
+
+
+def test_recompute_job_endpoint(app, client, add_items, wait_for_job):
+    add_items({"item_code": "JOB-1", "inward_qty": 10})
+    drift(app, "UPDATE stock_items SET alarm_status = NULL")
+    status = wait_for_job(client.post("/api/jobs/recompute", json={"all": True}).get_json()["job"])
+    assert (status["status"], status["processed"], status["changed"]) == ("finished", 1, 1)
@@ -0,0 +1,100 @@
+import shutil
+from pathlib import Path
+
+from flask_migrate import Migrate, upgrade
+from sqlalchemy import text
+
+from config import Config
+from stockapp import create_app, db
+from stockapp.models import SearchTrigram
+
+ALEMBIC_INI = """
+[alembic]
+
+[loggers]
+keys = root
+
+[handlers]
+keys = console
+
+[formatters]
+keys = generic
+
+[logger_root]
+level = WARN
+handlers = console
+
+[handler_console]
+class = StreamHandler
+args = (sys.stderr,)
+formatter = generic
+
+[formatter_generic]
+format = %(levelname)s %(message)s
+"""
+
+# stock_items as it was before the first migration
+BASELINE_TABLE = (
+    "CREATE TABLE stock_items (id INTEGER PRIMARY KEY, item_code VARCHAR(50) NOT NULL UNIQUE, "
+    "item_description VARCHAR(255), inward_invoice_no VARCHAR(100), inward_date DATE, uom VARCHAR(10), "
+    "inward_qty FLOAT, inward_unit_price FLOAT, inward_total_price FLOAT, outward_qty FLOAT, "
+    "balance_stock_qty FLOAT, alarm_status VARCHAR(20), outward_invoice_no VARCHAR(100), "
+    "outward_date DATE, outward_unit_price FLOAT, outward_total_price FLOAT, "
+    "eway_bill_number VARCHAR(100), vehicle_number VARCHAR(50), po_number VARCHAR(100))"
+)
+
+
+def codes(client, term):
+    items = client.get("/api/inventory", query_string={"search": term}).get_json()["items"]
+    return sorted(item["item_code"] for item in items)
+
+
+def test_search_follows_writes(client, add_items, find_item):
+    add_items(
+        {"item_code": "BOLT-M8", "item_description": "Hex bolt"},
+        {"item_code": "NUT-M8", "item_description": "Hex nut", "po_number": "PO-77"},
+    )
+    assert codes(client, "hex") == ["BOLT-M8", "NUT-M8"]
+    assert codes(client, "po-77") == ["NUT-M8"]
+    # 1-2 character terms use the padded prefix scan
+    assert codes(client, "m8") == ["BOLT-M8", "NUT-M8"]
+
+    client.put(f"/api/update/{find_item('NUT-M8')['id']}", json={"item_description": "Wing nut"})
+    assert codes(client, "hex") == ["BOLT-M8"]
+    assert codes(client, "wing") == ["NUT-M8"]
+
+    client.delete(f"/api/delete/{find_item('BOLT-M8')['id']}")
+    assert codes(client, "hex") == []
+
+
+def test_reindex_matches_incremental_index(app, add_items):
+    add_items(*[{"item_code": f"IDX-{n}", "item_description": f"part {n}"} for n in range(5)])
+    with app.app_context():
+        postings = set(db.session.execute(text("SELECT gram, item_id FROM stock_search_trigrams")).all())
+        from stockapp.search import rebuild_index
+        assert rebuild_index(chunk_size=2) == 5
+        assert set(db.session.execute(text("SELECT gram, item_id FROM stock_search_trigrams")).all()) == postings
+
+
+def test_upgrade_indexes_existing_items(tmp_path, monkeypatch):
+    migrations = tmp_path / "migrations"
+    shutil.copytree(Path(__file__).parent.parent / "migrations", migrations, ignore=shutil.ignore_patterns("__pycache__"))
+    (migrations / "alembic.ini").write_text(ALEMBIC_INI)
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'old.db'}")
+    monkeypatch.setattr(Config, "DATABASE_REPLICA_URLS", "")
+    app = create_app()
+    Migrate(app, db, directory=str(migrations))
+
+    with app.app_context():
+        db.session.execute(text(BASELINE_TABLE))
+        db.session.execute(text(
+            "INSERT INTO stock_items (item_code, item_description, inward_qty, outward_qty) "
+            "VALUES ('OLD-1', 'Copper washer', 10, 0), ('OLD-2', 'Steel washer', 5, 1)"
+        ))
+        db.session.commit()
+        upgrade(revision="8b41e0c2d5a7")
+        assert db.session.query(SearchTrigram).count() > 0
+        upgrade()
+
+    assert codes(app.test_client(), "washer") == ["OLD-1", "OLD-2"]
+    assert codes(app.test_client(), "copper") == ["OLD-1"]
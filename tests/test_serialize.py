@@ -0,0 +1,61 @@
+import json
+import random
+
+from stockapp import db, serialize, thresholds
+from stockapp.models import AlarmThreshold, StockItem
+from stockapp.thresholds import get_ruleset
+
+
+def test_pages_match_compute_fields(app, client, add_items):
+    client.post("/api/thresholds", json={"scope": "uom", "match_value": "kg", "critical_qty": 5, "low_qty": 20})
+    rng = random.Random(5)
+    add_items(*[
+        {
+            "item_code": f"SR-{n}",
+            "inward_qty": rng.choice([0, rng.uniform(0, 100)]),
+            "inward_unit_price": rng.choice([0, round(rng.uniform(0, 50), 3)]),
+            "outward_qty": rng.uniform(0, 100),
+            "outward_unit_price": round(rng.uniform(0, 50), 3),
+            "uom": rng.choice(["kg", "box", None]),
+            "inward_date": "2024-02-29",
+        }
+        for n in range(300)
+    ])
+    with app.app_context():
+        ruleset = get_ruleset()
+        rows = db.session.execute(serialize.item_select(None).order_by(StockItem.id)).all()
+        items = db.session.execute(db.select(StockItem).order_by(StockItem.id)).scalars().all()
+        # what jsonify(compute_fields()) sends, forecast fields aside
+        expected = [json.loads(app.json.dumps(item.compute_fields(ruleset=ruleset))) for item in items]
+        db.session.rollback()
+
+        served = json.loads(app.json.dumps(serialize.serialize_rows(rows, None)))
+    assert [{key: item[key] for key in expected[0]} for item in served] == expected
+
+
+def test_pages_serve_the_stored_status_they_filter_on(app, client, add_items):
+    add_items({"item_code": "ST-1", "inward_qty": 10, "outward_qty": 4})
+    with app.app_context():
+        # a rule saved whose reclassify job has not run yet
+        db.session.add(AlarmThreshold(scope="default", low_ratio=0.5))
+        thresholds.bump_version()
+        db.session.commit()
+
+    items = client.get("/api/inventory", query_string={"status": "low"}).get_json()["items"]
+    assert [(item["item_code"], item["alarm_status"]) for item in items] == [("ST-1", "Low Stock")]
+    assert client.get("/api/inventory", query_string={"status": "normal"}).get_json()["items"] == []
+
+
+def test_fields_projection(client, add_items):
+    add_items({"item_code": "FP-1", "inward_qty": 10, "outward_qty": 9, "inward_unit_price": 2})
+    items = client.get("/api/inventory?fields=alarm_status,inward_total_price").get_json()["items"]
+    assert items == [{"id": 1, "alarm_status": "Critical", "inward_total_price": 20.0}]
+
+    items = client.get("/api/inventory?cursor=&fields=item_code").get_json()["items"]
+    assert items == [{"id": 1, "item_code": "FP-1"}]
+    assert client.get("/api/inventory?fields=item_code,colour").status_code == 400
+
+
+def test_empty_page(app):
+    with app.app_context():
+        assert serialize.serialize_rows([], ("id", "alarm_status")) == []
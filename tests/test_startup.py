@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from stockapp import db, startup
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    # in a directory of its own, so a test can take the database away
+    (tmp_path / "data").mkdir()
+    return {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'data' / 'stock.db'}"}
+
+
+def test_healthz_and_readyz(client):
+    assert client.get("/healthz").get_json() == {"status": "ok"}
+    response = client.get("/readyz")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body["status"], body["database"]) == ("ready", "ok")
+    assert body["startup"]["import_to_ready_ms"] > 0 and body["startup"]["preloaded"] is False
+
+
+def test_readyz_reports_an_unreachable_database(app, client, tmp_path):
+    with app.app_context():
+        db.engine.dispose()
+    (tmp_path / "data").rename(tmp_path / "gone")
+
+    assert client.get("/healthz").status_code == 200
+    response = client.get("/readyz")
+    body = response.get_json()
+    assert response.status_code == 503
+    assert body["status"] == "unavailable" and "unable to open database file" in body["database"]
+
+    # and recovers once the database is back
+    (tmp_path / "gone").rename(tmp_path / "data")
+    assert client.get("/readyz").status_code == 200
+
+
+def test_preload_warms_the_app_and_empties_the_pools(app):
+    with app.app_context():
+        db.session.execute(db.select(1))
+        db.session.remove()
+        assert db.engine.pool.checkedin() == 1
+
+    assert startup.preload(app) is app
+    with app.app_context():
+        assert db.engine.pool.checkedin() == 0
+        stats = startup.startup_stats()
+    assert stats["preloaded"] is True and stats["preload_ms"] >= 0
+    assert {"pandas", "openpyxl"} <= set(sys.modules)
+
+
+def test_importing_the_app_does_not_connect_or_load_migrations(tmp_path):
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'missing' / 'stock.db'}"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, app; print('flask_migrate' in sys.modules, 'pandas' in sys.modules)"],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True, timeout=60,
+    )
+    assert result.stdout.split() == ["False", "False"]
@@ -0,0 +1,44 @@
+from stockapp import db, summary
+
+
+def metrics(client, **query):
+    return client.get("/api/dashboard-metrics", query_string=query).get_json()
+
+
+def test_counters_follow_add_update_delete(client, add_items, find_item):
+    add_items(
+        {"item_code": "SUM-1", "inward_qty": 10, "inward_unit_price": 2},
+        {"item_code": "SUM-2", "inward_qty": 10, "outward_qty": 9, "inward_unit_price": 1},
+    )
+    assert metrics(client) == {
+        "total_items": 2, "normal_stock": 1, "low_stock": 0, "critical_stock": 1, "total_value": 30.0,
+    }
+
+    item = find_item("SUM-1")
+    client.put(f"/api/update/{item['id']}", json={"outward_qty": 3})
+    assert metrics(client)["low_stock"] == 1
+
+    client.delete(f"/api/delete/{find_item('SUM-2')['id']}")
+    assert metrics(client) == {
+        "total_items": 1, "normal_stock": 0, "low_stock": 1, "critical_stock": 0, "total_value": 20.0,
+    }
+
+
+def test_summary_matches_aggregate_across_slots(app, client, add_items):
+    client.get("/api/dashboard-metrics")  # builds the summary
+    for n in range(10):
+        # one write per request, each landing on a random counter slot
+        add_items({"item_code": f"SLOT-{n}", "inward_qty": 10, "outward_qty": n, "inward_unit_price": 1.5})
+    with app.app_context():
+        built = db.session.execute(summary.counters_query()).one()
+        assert built[0] == app.config["METRICS_SUMMARY_SLOTS"]
+        assert summary.get_metrics() == summary.format_metrics(summary.aggregate_metrics())
+        assert summary.rebuild_summary() == summary.aggregate_metrics()
+
+
+def test_unbuilt_summary_rebuilds_on_read(app, client, add_items):
+    add_items({"item_code": "LATE-1", "inward_qty": 5, "inward_unit_price": 1})
+    with app.app_context():
+        db.session.query(summary.InventorySummary).delete()
+        db.session.commit()
+    assert metrics(client)["total_items"] == 1
@@ -0,0 +1,247 @@
+import fcntl
+import gzip
+import json
+import os
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from config import Config
+from stockapp import create_app, db, sync
+from stockapp.models import StockItem, SyncJournal, SyncReceipt
+
+
+@pytest.fixture
+def app_config():
+    # the central server
+    return {"SYNC_JOURNAL_ENABLED": True, "SYNC_PULL_LAG_SECONDS": 0}
+
+
+def push(client, *changes, terminal="dock-1", **query):
+    response = client.post(
+        "/api/sync/push", query_string=query,
+        data=gzip.compress(json.dumps({"terminal": terminal, "changes": list(changes)}).encode()),
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json", "Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200, response.data
+    return json.loads(gzip.decompress(response.data))["results"]
+
+
+def upsert(ref, seq, central_id=None, base=None, **row):
+    return {"ref": ref, "seq": seq, "op": "upsert", "id": central_id, "base": base, "row": row}
+
+
+def test_push_creates_and_replays_are_no_ops(app, client, find_item):
+    created = push(client, upsert(1, 1, item_code="SY-1", inward_qty=10))
+    assert created[0]["status"] == "applied" and created[0]["row"]["inward_qty"] == 10
+    central_id, version = created[0]["id"], created[0]["row"]["version"]
+
+    edit = upsert(1, 2, central_id, {"version": version, "inward_qty": 10, "outward_qty": 0},
+                  item_code="SY-1", inward_qty=10, outward_qty=4)
+    assert push(client, edit)[0]["status"] == "applied"
+    # the response was lost: the terminal sends the same change again
+    replayed = push(client, edit)[0]
+    assert (replayed["status"], replayed["id"]) == ("applied", central_id)
+    assert find_item("SY-1")["outward_qty"] == 4
+    assert find_item("SY-1")["version"] == version + 1
+
+
+def test_concurrent_edits_are_merged(app, client, find_item):
+    created = push(client, upsert(1, 1, item_code="MG-1", inward_qty=10, uom="box"))[0]
+    base = {"version": created["row"]["version"], "inward_qty": 10, "outward_qty": 0}
+    # edited centrally meanwhile: 2 issued, uom changed
+    client.put(f"/api/update/{created['id']}", json={"outward_qty": 2, "uom": "kg"})
+
+    merged = push(client, upsert(1, 2, created["id"], base, item_code="MG-1", inward_qty=15, outward_qty=3,
+                                 uom="pcs"))[0]
+    assert merged["status"] == "merged"
+    assert (merged["row"]["inward_qty"], merged["row"]["outward_qty"], merged["row"]["uom"]) == (15, 5, "kg")
+    assert find_item("MG-1")["balance_stock_qty"] == 10
+
+
+def test_terminal_policy_takes_the_terminal_fields(app, client):
+    app.config["SYNC_CONFLICT_POLICY"] = "terminal"
+    created = push(client, upsert(1, 1, item_code="TP-1", inward_qty=10, uom="box"))[0]
+    client.put(f"/api/update/{created['id']}", json={"outward_qty": 2, "uom": "kg"})
+    base = {"version": created["row"]["version"], "inward_qty": 10, "outward_qty": 0}
+    row = push(client, upsert(1, 2, created["id"], base, item_code="TP-1", inward_qty=10, outward_qty=1,
+                              uom="pcs"))[0]["row"]
+    assert (row["outward_qty"], row["uom"]) == (3, "pcs")
+
+
+def test_rejected_changes_get_no_receipt(app, client, find_item):
+    created = push(client, upsert(1, 1, item_code="RJ-1", inward_qty=10))[0]
+    base = {"version": created["row"]["version"], "inward_qty": 10, "outward_qty": 0}
+
+    rejected = push(client, upsert(1, 2, created["id"], base, item_code="RJ-1", inward_qty=10, outward_qty="lots"))
+    assert (rejected[0]["status"], rejected[0]["error"]) == ("invalid", "'outward_qty' must be a number.")
+    bad_create = push(client, upsert(2, 1, item_code="RJ-2", inward_qty="many"))
+    assert bad_create[0]["status"] == "invalid"
+    with app.app_context():
+        assert {(r.item_ref, r.seq) for r in db.session.scalars(db.select(SyncReceipt))} == {(1, 1)}
+
+    # corrected and pushed again under the same seqs: applied, not dropped as replays
+    fixed = push(client, upsert(1, 2, created["id"], base, item_code="RJ-1", inward_qty=10, outward_qty=3),
+                 upsert(2, 1, item_code="RJ-2", inward_qty=5))
+    assert [result["status"] for result in fixed] == ["applied", "applied"]
+    assert find_item("RJ-1")["outward_qty"] == 3 and find_item("RJ-2")["inward_qty"] == 5
+
+
+def test_updates_lost_to_a_concurrent_delete_are_retried(app, monkeypatch):
+    with app.test_request_context():
+        results = sync.apply_push("dock-1", [upsert(1, 1, item_code="GN-1", inward_qty=10)])
+        central_id, version = results[0]["id"], results[0]["row"]["version"]
+        update_items = sync.batch_edit.update_items
+
+        def racing_update_items(data):
+            # another writer deletes the item after apply_push read it
+            db.session.execute(db.delete(StockItem).where(StockItem.id == central_id))
+            db.session.commit()
+            monkeypatch.setattr(sync.batch_edit, "update_items", update_items)
+            return update_items(data)
+
+        monkeypatch.setattr(sync.batch_edit, "update_items", racing_update_items)
+        base = {"version": version, "inward_qty": 10, "outward_qty": 0}
+        results = sync.apply_push("dock-1", [upsert(1, 2, central_id, base, item_code="GN-1", inward_qty=12)])
+        assert results[0]["status"] == "retry"
+        assert db.session.get(SyncReceipt, ("dock-1", 1)).seq == 1
+
+
+def test_push_rejects_malformed_batches(client):
+    assert client.post("/api/sync/push", json={"terminal": "t", "changes": "x"}).status_code == 400
+    assert client.post("/api/sync/push", json={"changes": []}).status_code == 400
+    assert client.post("/api/sync/push", json={"terminal": "t", "changes": [{"op": "upsert"}]}).status_code == 400
+
+
+def journal(app):
+    with app.app_context():
+        return sorted(db.session.execute(db.select(SyncJournal.item_id, SyncJournal.seq)).all())
+
+
+def test_compaction_keeps_the_newest_entry_per_item(app, client, add_items, find_item):
+    add_items({"item_code": "CJ-1", "inward_qty": 1}, {"item_code": "CJ-2", "inward_qty": 1})
+    item_id = find_item("CJ-1")["id"]
+    for qty in (2, 3):
+        client.put(f"/api/update/{item_id}", json={"inward_qty": qty})
+    newest = journal(app)[-1]
+    assert len(journal(app)) == 4
+
+    result = app.test_cli_runner().invoke(args=["compact-sync-journal"])
+    assert "Removed 2 superseded journal entries." in result.output
+    assert [entry.item_id for entry in journal(app)] == sorted([item_id, find_item("CJ-2")["id"]])
+    assert newest in journal(app)
+
+    client.put(f"/api/update/{item_id}", json={"inward_qty": 4})
+    with app.app_context():
+        sync.Compactor(app).step()
+    assert len(journal(app)) == 2
+    pulled = client.get("/api/sync/pull", query_string={"since": 0}).get_json()
+    assert {entry["row"]["item_code"]: entry["row"]["inward_qty"] for entry in pulled["changes"]} == {
+        "CJ-1": 4, "CJ-2": 1,
+    }
+
+
+# -------------------------------
+# Terminal <-> central
+# -------------------------------
+def build_app(monkeypatch, **settings):
+    for name, value in settings.items():
+        monkeypatch.setattr(Config, name, value, raising=False)
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all(bind_key=None)
+    return app
+
+
+@pytest.fixture
+def central_url(app):
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.port}"
+    server.shutdown()
+
+
+@pytest.fixture
+def terminal(app, central_url, tmp_path, monkeypatch):
+    # journaled like an embedded terminal, but with no background loop
+    terminal = build_app(
+        monkeypatch, SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'terminal.db'}",
+        SYNC_CENTRAL_URL=central_url, SYNC_TERMINAL_ID="dock-1",
+    )
+    yield terminal
+    with terminal.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def item(app, code):
+    with app.app_context():
+        row = db.session.execute(db.select(StockItem).filter_by(item_code=code)).scalar_one_or_none()
+        return row and (row.inward_qty, row.outward_qty, row.uom)
+
+
+def flask_sync(terminal):
+    result = terminal.test_cli_runner().invoke(args=["sync"])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_terminal_and_central_converge(app, client, terminal):
+    local = terminal.test_client()
+    local.post("/api/add", json=[{"item_code": "T-1", "inward_qty": 10, "uom": "box"}])
+    client.post("/api/add", json=[{"item_code": "C-1", "inward_qty": 7}])
+
+    assert "Pushed 1 items, applied 1 central changes." in flask_sync(terminal)
+    assert item(app, "T-1") == (10, 0, "box") and item(terminal, "C-1") == (7, 0, None)
+    assert local.get("/api/sync/status").get_json()["pending_items"] == 0
+
+    # both sides issue stock while apart: the issues add up on both
+    with terminal.app_context():
+        terminal_id = db.session.execute(db.select(StockItem.id).filter_by(item_code="T-1")).scalar_one()
+    with app.app_context():
+        central_id = db.session.execute(db.select(StockItem.id).filter_by(item_code="T-1")).scalar_one()
+    local.put(f"/api/update/{terminal_id}", json={"outward_qty": 3})
+    client.put(f"/api/update/{central_id}", json={"outward_qty": 2, "uom": "kg"})
+    flask_sync(terminal)
+    assert item(app, "T-1") == item(terminal, "T-1") == (10, 5, "kg")
+
+
+def test_sync_loop_starts_on_the_first_request_and_syncs_alone(app, tmp_path, monkeypatch):
+    started = []
+    monkeypatch.setattr(sync.Syncer, "loop", lambda self: started.append(os.getpid()))
+
+    def threads():
+        return [thread for thread in threading.enumerate() if thread.name == "stockapp-sync"]
+
+    terminal = build_app(
+        monkeypatch, EMBEDDED_MODE=True, EMBEDDED_DATABASE_PATH=str(tmp_path / "terminal.db"),
+        SYNC_CENTRAL_URL="http://central.invalid",
+    )
+    # building the app (a preloading master) starts nothing
+    assert threads() == [] and started == []
+
+    syncer = terminal.extensions["stockapp_sync"]["syncer"]
+    assert syncer.lock_path() == f"{tmp_path / 'terminal.db'}.sync.lock"
+    with open(syncer.lock_path(), "a") as other_process:
+        fcntl.flock(other_process, fcntl.LOCK_EX)
+        terminal.test_client().get("/healthz")
+        [thread] = threads()
+        # another process holds the terminal's lock: this one waits
+        thread.join(0.2)
+        assert thread.is_alive() and started == []
+        fcntl.flock(other_process, fcntl.LOCK_UN)
+        thread.join()
+    assert started == [os.getpid()]
+
+    terminal.test_client().get("/healthz")
+    assert threads() == [] and len(started) == 1
+    # a worker forked from a preloaded master (another pid) starts its own
+    syncer._pid = None
+    terminal.test_client().get("/healthz")
+    for thread in threads():
+        thread.join()
+    assert len(started) == 2
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import numpy as np
+from sqlalchemy import literal_column, select, text
+
+from stockapp import db
+from stockapp.thresholds import Ruleset
+
+
+def rule(scope, match_value=None, **levels):
+    return SimpleNamespace(
+        scope=scope, match_value=match_value,
+        **{field: levels.get(field) for field in ("critical_ratio", "low_ratio", "critical_qty", "low_qty")},
+    )
+
+
+RULES = [
+    rule("default", critical_ratio=0.5, low_ratio=0.7),
+    rule("uom", "kg", critical_qty=2, low_qty=4),
+    rule("category", "fasteners", critical_ratio=0.1, low_ratio=0.2),
+    rule("item", "SPECIAL", critical_qty=50, low_qty=60),
+]
+
+CASES = [
+    # (balance, inward_qty, item_code, category, uom)
+    (5, 10, "A", None, None),
+    (6, 10, "A", None, None),
+    (8, 10, "A", None, None),
+    (3, 10, "A", None, "kg"),
+    (1, 10, "A", None, "kg"),
+    (1.5, 10, "A", "fasteners", "kg"),
+    (55, 100, "SPECIAL", "fasteners", "kg"),
+    (0, 0, "ZERO", None, None),
+]
+
+
+def test_most_specific_rule_wins():
+    ruleset = Ruleset(RULES)
+    assert [ruleset.classify(*case) for case in CASES] == [
+        "Low Stock", "Low Stock", "Normal", "Low Stock", "Critical", "Low Stock", "Low Stock", "Normal",
+    ]
+
+
+def test_batch_and_sql_agree_with_classify(app):
+    ruleset = Ruleset(RULES)
+    expected = [ruleset.classify(*case) for case in CASES]
+    columns = list(zip(*CASES))
+    batched = ruleset.classify_batch(
+        np.array(columns[0], dtype=float), np.array(columns[1], dtype=float),
+        list(columns[2]), list(columns[3]), list(columns[4]),
+    )
+    assert batched.tolist() == expected
+
+    with app.app_context():
+        sql = [
+            db.session.execute(select(ruleset.sql_alarm(
+                literal_column(str(balance)), literal_column(str(inward_qty)),
+                item_code=literal_column(repr(code)),
+                category=literal_column(repr(category) if category else "NULL"),
+                uom=literal_column(repr(uom) if uom else "NULL"),
+            ))).scalar()
+            for balance, inward_qty, code, category, uom in CASES
+        ]
+    assert sql == expected
+
+
+def test_saving_a_rule_reclassifies_covered_items(client, add_items, find_item, wait_for_job):
+    add_items(
+        {"item_code": "TH-1", "inward_qty": 10, "outward_qty": 3, "uom": "box"},
+        {"item_code": "TH-2", "inward_qty": 10, "outward_qty": 3, "uom": "kg"},
+    )
+    assert find_item("TH-1")["alarm_status"] == "Low Stock"
+
+    response = client.post("/api/thresholds", json={"scope": "uom", "match_value": "box", "low_ratio": 0.5})
+    assert response.status_code == 201
+    assert wait_for_job(response.get_json()["job"])["changed"] == 1
+    assert find_item("TH-1")["alarm_status"] == "Normal"
+    assert find_item("TH-2")["alarm_status"] == "Low Stock"
+
+    rule_id = response.get_json()["rule"]["id"]
+    wait_for_job(client.delete(f"/api/thresholds/{rule_id}").get_json()["job"])
+    assert find_item("TH-1")["alarm_status"] == "Low Stock"
+
+
+def test_rule_validation(client):
+    assert client.post("/api/thresholds", json={"scope": "planet"}).status_code == 400
+    assert client.post("/api/thresholds", json={"scope": "uom"}).status_code == 400
+    assert client.post("/api/thresholds", json={"scope": "default", "low_ratio": -1}).status_code == 400
+
+
+def test_a_rule_saved_by_another_process_applies_to_the_next_write(app, add_items, find_item):
+    add_items({"item_code": "XP-1", "inward_qty": 10, "outward_qty": 4})
+    assert find_item("XP-1")["alarm_status"] == "Low Stock"
+    with app.app_context():
+        # another worker's rule change: this process's cache is not told
+        db.session.execute(text("INSERT INTO alarm_thresholds (scope, low_ratio) VALUES ('default', 0.5)"))
+        db.session.execute(text("UPDATE alarm_threshold_version SET version = version + 1"))
+        db.session.commit()
+
+    add_items({"item_code": "XP-2", "inward_qty": 10, "outward_qty": 4})
+    assert find_item("XP-2")["alarm_status"] == "Normal"
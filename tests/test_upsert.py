@@ -0,0 +1,48 @@
+def test_update_merges_only_supplied_fields(client, add_items, find_item):
+    add_items({"item_code": "UP-1", "inward_qty": 10, "inward_unit_price": 2, "uom": "kg", "po_number": "PO-1"})
+    response = add_items(
+        {"item_code": "UP-1", "outward_qty": 3},
+        {"item_code": "UP-2", "inward_qty": 4},
+        on_conflict="update",
+    )
+    body = response.get_json()
+    assert response.status_code == 201
+    assert (body["inserted"], body["updated"], body["skipped"]) == (1, 1, 0)
+    assert body["message"] == "1 items added successfully. 1 updated, 0 skipped."
+
+    item = find_item("UP-1")
+    assert (item["uom"], item["po_number"], item["inward_qty"]) == ("kg", "PO-1", 10)
+    # derived columns are re-derived from the merged quantities
+    assert (item["balance_stock_qty"], item["inward_total_price"], item["alarm_status"]) == (7, 20, "Low Stock")
+
+
+def test_skip_leaves_existing_rows(client, add_items, find_item):
+    add_items({"item_code": "SK-1", "inward_qty": 10})
+    response = add_items({"item_code": "SK-1", "inward_qty": 99}, on_conflict="skip")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body["inserted"], body["updated"], body["skipped"]) == (0, 0, 1)
+    assert find_item("SK-1")["inward_qty"] == 10
+
+
+def test_single_add_with_on_conflict(client, add_items):
+    add_items({"item_code": "ONE", "inward_qty": 1})
+    response = client.post("/api/add?on_conflict=update", json={"item_code": "ONE", "inward_qty": 6})
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "updated"
+    assert response.get_json()["item"]["inward_qty"] == 6
+
+    response = client.post("/api/add?on_conflict=skip", json={"item_code": "TWO"})
+    assert response.status_code == 201 and response.get_json()["status"] == "inserted"
+
+
+def test_upsert_keeps_the_dashboard_in_step(client, add_items):
+    client.get("/api/dashboard-metrics")
+    add_items({"item_code": "MT-1", "inward_qty": 10, "inward_unit_price": 1})
+    add_items({"item_code": "MT-1", "outward_qty": 9}, on_conflict="update")
+    metrics = client.get("/api/dashboard-metrics").get_json()
+    assert (metrics["total_items"], metrics["critical_stock"], metrics["total_value"]) == (1, 1, 10.0)
+
+
+def test_invalid_on_conflict(client):
+    assert client.post("/api/add?on_conflict=replace", json=[{"item_code": "X"}]).status_code == 400
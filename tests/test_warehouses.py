@@ -0,0 +1,79 @@
+import pytest
+
+
+@pytest.fixture
+def app_config():
+    return {"WAREHOUSES": "main,pune"}
+
+
+def test_item_codes_are_unique_per_warehouse(add_items, find_item):
+    assert add_items({"item_code": "WH-1", "inward_qty": 10}).status_code == 201
+    assert add_items({"item_code": "WH-1", "inward_qty": 4}, warehouse="pune").status_code == 201
+    assert add_items({"item_code": "WH-1"}, warehouse="pune").status_code == 409
+
+    assert find_item("WH-1")["inward_qty"] == 10
+    assert find_item("WH-1", warehouse="pune")["inward_qty"] == 4
+
+
+def find_all(client, **query):
+    return client.get("/api/inventory", query_string={"limit": 100, **query}).get_json()["items"]
+
+
+def test_reads_are_scoped_and_star_reads_all(client, add_items):
+    add_items({"item_code": "RD-1", "inward_qty": 1})
+    add_items({"item_code": "RD-2", "inward_qty": 1}, warehouse="pune")
+
+    assert [item["item_code"] for item in find_all(client)] == ["RD-1"]
+    assert [item["item_code"] for item in find_all(client, warehouse="pune")] == ["RD-2"]
+    assert sorted((item["warehouse"], item["item_code"]) for item in find_all(client, warehouse="*")) == [
+        ("main", "RD-1"), ("pune", "RD-2"),
+    ]
+
+
+def test_other_warehouse_items_are_not_found(client, add_items, find_item):
+    add_items({"item_code": "NF-1", "inward_qty": 1}, warehouse="pune")
+    item_id = find_item("NF-1", warehouse="pune")["id"]
+
+    assert client.get(f"/api/item/{item_id}").status_code == 404
+    assert client.put(f"/api/update/{item_id}", json={"outward_qty": 1}).status_code == 404
+    assert client.delete(f"/api/delete/{item_id}").status_code == 404
+    assert client.post(f"/api/item/{item_id}/movements", json={"direction": "in", "qty": 1}).status_code == 404
+    assert client.get(f"/api/item/{item_id}", query_string={"warehouse": "pune"}).status_code == 200
+    assert client.get(f"/api/item/{item_id}", query_string={"warehouse": "*"}).status_code == 200
+
+
+def test_writes_need_one_known_warehouse(client, add_items):
+    assert add_items({"item_code": "X"}, warehouse="*").status_code == 400
+    assert add_items({"item_code": "X"}, warehouse="delhi").status_code == 400
+    assert client.get("/api/inventory", query_string={"warehouse": "bad code"}).status_code == 400
+    assert client.get("/api/inventory", query_string={"warehouse": "delhi"}).status_code == 400
+
+
+def test_metrics_per_warehouse_and_in_total(client, add_items):
+    client.get("/api/dashboard-metrics")
+    add_items({"item_code": "MW-1", "inward_qty": 10, "inward_unit_price": 1})
+    add_items(
+        {"item_code": "MW-2", "inward_qty": 10, "outward_qty": 9, "inward_unit_price": 2},
+        {"item_code": "MW-3", "inward_qty": 10, "inward_unit_price": 3},
+        warehouse="pune",
+    )
+
+    assert client.get("/api/dashboard-metrics").get_json()["total_items"] == 1
+    pune = client.get("/api/dashboard-metrics", query_string={"warehouse": "pune"}).get_json()
+    assert (pune["total_items"], pune["critical_stock"], pune["total_value"]) == (2, 1, 50.0)
+
+    body = client.get("/api/warehouses").get_json()
+    assert sorted(body["warehouses"]) == ["main", "pune"]
+    assert body["total"] == client.get("/api/dashboard-metrics", query_string={"warehouse": "*"}).get_json()
+    assert (body["total"]["total_items"], body["total"]["total_value"]) == (3, 60.0)
+
+
+def test_analytics_are_scoped(client, add_items):
+    add_items({"item_code": "AN-1", "inward_qty": 10, "inward_date": "2024-03-04"})
+    add_items({"item_code": "AN-2", "inward_qty": 5, "inward_date": "2024-03-05"}, warehouse="pune")
+
+    def inward(warehouse):
+        query = {"period": "month", "from": "2024-03-01", "to": "2024-03-31", "warehouse": warehouse}
+        return client.get("/api/analytics/timeseries", query_string=query).get_json()["totals"]["inward_qty"]
+
+    assert (inward("main"), inward("pune"), inward("*")) == (10, 5, 15)
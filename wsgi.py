@@ -0,0 +1,14 @@
+"""
+WSGI entry point for gunicorn with --preload:
+
+    gunicorn --preload --workers 4 -k gthread --threads 32 wsgi:app
+
+The master builds the app once and warms it (startup.preload(): the
+lazily imported modules and the compiled templates), then forks; every
+worker starts with all of that already in memory and an empty
+connection pool. Without --preload, or for `flask`, use app.py.
+"""
+from stockapp import create_app
+from stockapp.startup import preload
+
+app = preload(create_app())